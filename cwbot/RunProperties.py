@@ -1,4 +1,5 @@
 import os
+from collections import namedtuple
 from configObj.configobj import ConfigObj
 from configObj.validate import Validator
 from StringIO import StringIO
@@ -7,6 +8,29 @@ class PropertyError(Exception):
     def __init__(self, args):
         super(PropertyError, self).__init__(args)
 
+# Immutable lookup tables built from admin.ini. byUid maps each admin's uid to
+# a frozenset of permissions (including "*"); byPermission maps each
+# permission to a frozenset of uids; admins is the frozenset of all admin uids.
+_PermissionIndex = namedtuple("_PermissionIndex", 
+                              ["byUid", "byPermission", "admins"])
+
+_noPermissions = frozenset()
+
+
+def _buildPermissionIndex(admins):
+    byUid = {}
+    byPermission = {}
+    for uid, perms in admins.items():
+        if len(perms) > 0:
+            byUid[uid] = frozenset(perms + ["*"])
+        for p in set(perms):
+            byPermission.setdefault(p, set()).add(uid)
+    return _PermissionIndex(
+            byUid, 
+            dict((p, frozenset(uids)) for p,uids in byPermission.items()),
+            frozenset(admins.keys()))
+
+
 class RunProperties(object):
     """ This object holds the global variables for the bot, including its
     login information, list of administrators, and the current debug mode. 
@@ -45,8 +69,11 @@ class RunProperties(object):
         self.clan = None
         self.rolloverWait = 8
         self.connection = None
+        # if True, each session gets a kol.RequestEngine
+        self.requestEngine = False
         self._admins = None
         self._groups = None
+        self._permissionIndex = _buildPermissionIndex({})
         self._adminFile = adminFile
         self._loginFile = loginFile
         self._loadUserNamePassword(altLogin)
@@ -55,21 +82,18 @@ class RunProperties(object):
 
         
     def getAdmins(self, permissionName="*"):
-        """ Get a list of all users with the specified permission (or, if
-        the permission is "*", all users with any permission) """
-        a = set()
-        for uid,p in self._admins.items():
-            if permissionName == "*" or permissionName.lower() in p:
-                a.add(uid)
-        return a
+        """ Get a frozenset of all users with the specified permission (or, 
+        if the permission is "*", all users listed in admin.ini) """
+        index = self._permissionIndex
+        if permissionName == "*":
+            return index.admins
+        return index.byPermission.get(permissionName.lower(), _noPermissions)
 
         
     def getPermissions(self, uid):
-        """ Get a list of all permissions belonging to a user. """
-        perms = self._admins.get(uid, set([]))
-        if len(perms) > 0:
-            perms.append("*")
-        return set(perms)
+        """ Get a frozenset of all permissions belonging to a user. Users with
+        any permission also have the "*" permission. """
+        return self._permissionIndex.byUid.get(uid, _noPermissions)
 
 
     def refresh(self):
@@ -130,6 +154,8 @@ class RunProperties(object):
             if uid != "0":
                 print("Added administrator {} with permissions {}."
                       .format(uid, ','.join(permissions)))
+        # replace the whole index at once, so readers never see a partial one
+        self._permissionIndex = _buildPermissionIndex(self._admins)
         if len(admins) < 2:
             c.validate(Validator(), copy=True)
 
@@ -0,0 +1,101 @@
+from collections import defaultdict
+from cwbot.common import logQueries
+
+
+class EventList(tuple):
+    """ An immutable sequence of raid log events that have already been 
+    matched against an event database (i.e., each event has a 'db-match' 
+    dict). On creation, each event is assigned a frozen match signature (the 
+    frozenset of its db-match items), and the signatures are indexed by each 
+    db column value. This allows eventDbMatch and eventFilter to look up 
+    events instead of scanning the whole list. Like the frozen raid log it
+    is built from, an EventList is shared without copying. """
+
+    def __new__(cls, events=()):
+        return super(EventList, cls).__new__(cls, events)
+
+
+    def __init__(self, events=()):
+        signatures = {}
+        self._positions = defaultdict(list) # signature -> event positions
+        self._signaturesByItem = defaultdict(set) # (column, value) -> sigs
+        self._positionsByText = None # event text -> event positions
+        self._filterCache = {}
+        self._aggregates = {}
+        for i, e in enumerate(self):
+            dbm = e['db-match']
+            sig = signatures.get(id(dbm))
+            if sig is None:
+                sig = frozenset(dbm.items())
+                signatures[id(dbm)] = sig
+                for item in sig:
+                    self._signaturesByItem[item].add(sig)
+            self._positions[sig].append(i)
+
+
+    def __copy__(self):
+        return self
+
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+    def _eventsAt(self, positions):
+        return (self[i] for i in sorted(positions))
+
+
+    def dbMatch(self, *categoryDicts):
+        """ Get a generator of the events whose db-match contains all of the
+        items in any of the dictionaries passed in. """
+        matchingSigs = set()
+        for d in categoryDicts:
+            sigs = None
+            for item in d.items():
+                itemSigs = self._signaturesByItem.get(item)
+                if not itemSigs:
+                    sigs = set()
+                    break
+                sigs = itemSigs if sigs is None else sigs & itemSigs
+            matchingSigs.update(self._positions.keys()
+                                if sigs is None else sigs)
+        positions = set()
+        for sig in matchingSigs:
+            positions.update(self._positions[sig])
+        return self._eventsAt(positions)
+
+
+    def filter(self, regex):
+        """ Get a generator of the events whose event text matches the
+        compiled regex. Results are cached for each regex. """
+        positions = self._filterCache.get(regex.pattern)
+        if positions is None:
+            if self._positionsByText is None:
+                byText = defaultdict(list)
+                for i, e in enumerate(self):
+                    byText[e['event']].append(i)
+                self._positionsByText = byText
+            positions = []
+            for txt, textPositions in self._positionsByText.items():
+                if regex.search(txt) is not None:
+                    positions.extend(textPositions)
+            self._filterCache[regex.pattern] = positions
+        return self._eventsAt(positions)
+
+
+    def aggregate(self, queries):
+        """ Get a dict of query -> result for the given aggregate queries
+        (see cwbot.common.logQueries). Queries are evaluated over this 
+        list's signature and text indexes, and the results are cached. """
+        missing = [q for q in queries if q not in self._aggregates]
+        if missing:
+            if (any(q.matchesText for q in missing) 
+                    and self._positionsByText is None):
+                byText = defaultdict(list)
+                for i, e in enumerate(self):
+                    byText[e['event']].append(i)
+                self._positionsByText = byText
+            self._aggregates.update(logQueries.evaluateGroups(
+                    self, self._positions, self._positionsByText, missing,
+                    self._signaturesByItem))
+        return dict((q, self._aggregates[q]) for q in queries)
@@ -0,0 +1,37 @@
+class FrozenDict(dict):
+    """ A read-only dict. Since it cannot be modified, it can be shared
+    between threads without copying; copy.copy and copy.deepcopy return the
+    object itself. """
+
+    def _readOnly(self, *args, **kwargs):
+        raise TypeError("{} is read-only".format(self.__class__.__name__))
+
+    __setitem__ = _readOnly
+    __delitem__ = _readOnly
+    clear = _readOnly
+    pop = _readOnly
+    popitem = _readOnly
+    setdefault = _readOnly
+    update = _readOnly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+def freeze(obj):
+    """ Get a read-only version of obj, where dicts are converted to
+    FrozenDicts and lists to tuples, recursively. Objects that are already
+    frozen are returned as-is, so freezing a frozen object is cheap. """
+    if isinstance(obj, FrozenDict):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k,v in obj.items())
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
@@ -0,0 +1,127 @@
+""" Aggregate queries over raid log events. Dungeon modules declare their
+queries up front (see BaseDungeonModule.aggregateQueries), and the dungeon
+manager evaluates the queries of all its modules together each time the raid
+log is refreshed.
+
+A query matches either event text or db-match values:
+    a string is a regex that is searched for in the event text;
+    a dict matches events whose db-match contains all of its items;
+    a tuple of dicts matches events that match any of the dicts.
+Queries are hashable values, so equal queries made by different modules are
+evaluated only once.
+"""
+import re
+from collections import namedtuple, defaultdict
+
+__compiled = {}
+
+
+def _normalize(match):
+    if isinstance(match, basestring):
+        return match
+    if isinstance(match, dict):
+        match = (match,)
+    return tuple(frozenset(d.items()) for d in match)
+
+
+class _Query(namedtuple("_Query", ["match"])):
+    __slots__ = ()
+
+    def __new__(cls, match):
+        return super(_Query, cls).__new__(cls, _normalize(match))
+
+    # queries of different types with the same match are different queries
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self.match))
+
+    @property
+    def matchesText(self):
+        return isinstance(self.match, basestring)
+
+    def addAll(self, result, events):
+        for e in events:
+            result = self.add(result, e)
+        return result
+
+    def finish(self, result):
+        return result
+
+
+class SumTurns(_Query):
+    """ Total turns of the matching events. """
+    __slots__ = ()
+    def initial(self):
+        return 0
+    def add(self, total, event):
+        return total + event['turns']
+    def addAll(self, total, events):
+        return total + sum(e['turns'] for e in events)
+
+
+class AnyEvent(_Query):
+    """ True if any event matches. """
+    __slots__ = ()
+    def initial(self):
+        return False
+    def add(self, _found, _event):
+        return True
+    def addAll(self, _found, _events):
+        # groups are never empty
+        return True
+
+
+def _regex(pattern):
+    regex = __compiled.get(pattern)
+    if regex is None:
+        regex = __compiled.setdefault(pattern, re.compile(pattern))
+    return regex
+
+
+def _matchingSignatures(bySignature, signaturesByItem, match):
+    result = set()
+    for m in match:
+        sigs = set(bySignature)
+        for item in m:
+            itemSigs = signaturesByItem.get(item, frozenset())
+            sigs &= itemSigs
+            if not sigs:
+                break
+        result.update(sigs)
+    return result
+
+
+def evaluateGroups(events, bySignature, byText, queries, 
+                   signaturesByItem=None):
+    """ Evaluate several queries over events that are already grouped. 
+    bySignature maps the frozenset of each distinct db-match's items to the
+    positions of its events; byText maps each distinct event text to the 
+    positions of its events (it is only used by text queries, so it may be
+    None if there are none). signaturesByItem maps each db-match item to
+    the signatures that contain it; it is built from bySignature if it is
+    not given. Returns a dict of query -> result. """
+    if signaturesByItem is None:
+        signaturesByItem = defaultdict(set)
+        for sig in bySignature:
+            for item in sig:
+                signaturesByItem[item].add(sig)
+    results = {}
+    for q in set(queries):
+        r = q.initial()
+        if q.matchesText:
+            regex = _regex(q.match)
+            groups = (positions for txt,positions in byText.items()
+                      if regex.search(txt) is not None)
+        else:
+            groups = (bySignature[sig] for sig in 
+                      _matchingSignatures(bySignature, signaturesByItem,
+                                          q.match))
+        for positions in groups:
+            r = q.addAll(r, (events[i] for i in positions))
+        results[q] = q.finish(r)
+    return results
@@ -12,9 +12,17 @@ overwrite_config = boolean(default=True)
     
     # channel list. The first channel is the "main" channel
     channels = string(default="clan,hobopolis,slimetube")
+    
+    # number of threads for requests made in the background
+    request_threads = integer(min=1,max=32,default=4)
 
 [director]
     mail_check_interval = integer(min=300,max=1800,default=300)
+    
+    # processed kmails and the state they changed are saved together, after
+    # this many kmails or milliseconds, or when the inbox is empty
+    kmail_commit_count = integer(min=1,default=25)
+    kmail_commit_ms = integer(min=0,default=1000)
 
 # There may be multiple managers, each set with different options.
 # this means that the configuration below should be TWO LEVELS deep. 
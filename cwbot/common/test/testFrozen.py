@@ -0,0 +1,60 @@
+import copy
+import pickle
+import unittest
+from cwbot.common.frozen import FrozenDict, freeze
+
+
+class Test(unittest.TestCase):
+    """ Frozen raid logs cannot be modified, and are shared instead of 
+    copied. """
+
+    def testFrozenDictIsReadOnly(self):
+        d = FrozenDict({'a': 1})
+        self.assertRaises(TypeError, d.__setitem__, 'b', 2)
+        self.assertRaises(TypeError, d.__delitem__, 'a')
+        self.assertRaises(TypeError, d.clear)
+        self.assertRaises(TypeError, d.pop, 'a')
+        self.assertRaises(TypeError, d.popitem)
+        self.assertRaises(TypeError, d.setdefault, 'b', 2)
+        self.assertRaises(TypeError, d.update, {'b': 2})
+        self.assertEqual(d, {'a': 1})
+
+    def testCopiesAreShared(self):
+        d = FrozenDict({'a': 1})
+        self.assertIs(copy.copy(d), d)
+        self.assertIs(copy.deepcopy(d), d)
+        self.assertIs(copy.deepcopy({'x': d})['x'], d)
+
+    def testPickle(self):
+        d = freeze({'a': [{'b': 1}]})
+        d2 = pickle.loads(pickle.dumps(d))
+        self.assertIsInstance(d2, FrozenDict)
+        self.assertEqual(d2, d)
+        self.assertRaises(TypeError, d2.__setitem__, 'c', 3)
+
+    def testFreezeIsRecursive(self):
+        log = {'hoid': 5, 
+               'events': [{'event': 'defeated hobo', 'turns': 1}]}
+        frozen = freeze(log)
+        self.assertIsInstance(frozen, FrozenDict)
+        self.assertIsInstance(frozen['events'], tuple)
+        self.assertIsInstance(frozen['events'][0], FrozenDict)
+        self.assertRaises(TypeError, frozen['events'][0].__setitem__, 
+                          'turns', 2)
+        self.assertEqual(frozen, 
+                         {'hoid': 5, 
+                          'events': ({'event': 'defeated hobo', 
+                                      'turns': 1},)})
+
+    def testFreezeCopiesMutableObjects(self):
+        log = {'events': [{'turns': 1}]}
+        frozen = freeze(log)
+        log['events'][0]['turns'] = 2
+        log['events'].append({'turns': 3})
+        self.assertEqual(frozen, {'events': ({'turns': 1},)})
+
+    def testFrozenObjectsAreNotCopied(self):
+        frozen = freeze({'events': [{'turns': 1}]})
+        self.assertIs(freeze(frozen), frozen)
+        wrapper = freeze({'log': frozen})
+        self.assertIs(wrapper['log'], frozen)
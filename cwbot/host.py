@@ -0,0 +1,235 @@
+""" Run several bots from one host process.
+
+Each bot runs in its own child process (see cwbot.main), with its own run
+folder, login, database and logs. Before the children are started, the host
+loads the static data that every bot needs: the item, skill and quest
+databases, the adventure list, the compiled pyKol patterns and the cwbot
+code itself. On platforms that fork (Linux, OS X), the children share this
+data with the host copy-on-write instead of each loading its own copy. On
+Windows, each child loads its own copy, as if it were run from cwbot.py.
+
+Children communicate with the host the same way cwbot runs under the Win32
+service: the host sends "stop" to shut a bot down, and a bot that exits
+sends "restart" or "stop" back. Bots that ask to restart are started again.
+A bot that exits without sending either has crashed; it is restarted after
+a delay, which doubles each time it crashes soon after starting.
+"""
+import sys
+import os
+import gc
+import time
+import signal
+import logging
+import argparse
+import multiprocessing
+
+_log = logging.getLogger("cwbot.host")
+
+
+def preloadSharedData():
+    """ Load the static databases and code that all bots use. """
+    import cwbot.main #@UnusedImport
+    from kol.database import ItemDatabase, SkillDatabase, QuestDatabase
+    from kol.data import Adventures #@UnusedImport
+    from kol.manager import PatternManager
+    ItemDatabase.init()
+    SkillDatabase.init()
+    QuestDatabase.init()
+    PatternManager.precompileAll()
+
+    # collect garbage now, so that the collector does not need to touch
+    # (and un-share) the preloaded objects in every child later
+    gc.collect()
+
+
+def memoryUsage(pid):
+    """ Get a dict with the resident set size ('rss') and proportional set
+    size ('pss', which divides shared pages between the processes that share
+    them) of a process, in kB. Values that the platform does not report are
+    None. """
+    result = {'rss': None, 'pss': None}
+    for fileName, key, field in [('status', 'rss', 'VmRSS:'),
+                                 ('smaps_rollup', 'pss', 'Pss:')]:
+        try:
+            with open('/proc/{}/{}'.format(pid, fileName)) as f:
+                for line in f:
+                    if line.startswith(field):
+                        result[key] = int(line.split()[1])
+                        break
+        except (IOError, OSError):
+            pass
+    return result
+
+
+def _runBot(path, connection, debug, requestEngine):
+    # cwbot.main reads its run folder and options from the command line
+    sys.argv = ([sys.argv[0], path] + (['--debug'] if debug else []) +
+                (['--request-engine'] if requestEngine else []))
+    import cwbot.main
+    cwbot.main.main(path, connection)
+
+
+class BotProcess(object):
+    """ A bot running in a child process of the host. """
+    fastCrashSeconds = 300  # a crash this soon after starting doubles the
+                            # restart delay
+    minCrashDelay = 60
+    maxCrashDelay = 2 * 60 * 60
+    
+    def __init__(self, path, debug, requestEngine=False):
+        self.path = path
+        self._debug = debug
+        self._requestEngine = requestEngine
+        self.process = None
+        self.connection = None
+        self.startTime = None
+        self.restartTime = None # when to restart a crashed bot
+        self.crashDelay = self.minCrashDelay
+
+    def start(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection, c = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_runBot,
+                                               args=(self.path, c,
+                                                     self._debug,
+                                                     self._requestEngine),
+                                               name=self.path)
+        self.startTime = time.time()
+        self.restartTime = None
+        self.process.start()
+        # the child has its own copy of its end of the pipe; closing ours
+        # means that recv() sees EOF if the child dies without a message
+        c.close()
+        _log.info("Started bot in {} (pid {}) in {:.2f} seconds."
+                  .format(self.path, self.process.pid,
+                          time.time() - self.startTime))
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.connection.send("stop")
+            except Exception:
+                pass
+
+    def lastMessage(self):
+        """ Get the last message sent by the bot (None if none). """
+        msg = None
+        try:
+            while self.connection.poll():
+                msg = self.connection.recv()
+        except (EOFError, IOError):
+            pass
+        return msg
+
+    def scheduleRestart(self):
+        """ Set the time to restart the bot after a crash. """
+        if time.time() - self.startTime < self.fastCrashSeconds:
+            delay = self.crashDelay
+            self.crashDelay = min(self.maxCrashDelay, self.crashDelay * 2)
+        else:
+            delay = self.crashDelay = self.minCrashDelay
+        self.restartTime = time.time() + delay
+        return delay
+
+
+class BotHost(object):
+    """ Runs a BotProcess for each run folder until all of them stop. """
+    def __init__(self, paths, debug=False, memoryReportInterval=3600,
+                 requestEngine=False):
+        self._bots = [BotProcess(os.path.abspath(p), debug, requestEngine) 
+                      for p in paths]
+        self._memoryReportInterval = memoryReportInterval
+        self._stopping = False
+
+    def stopAll(self, *_args):
+        self._stopping = True
+        for bot in self._bots:
+            bot.stop()
+
+    def reportMemory(self):
+        for bot in self._bots:
+            if bot.process is not None and bot.process.is_alive():
+                usage = memoryUsage(bot.process.pid)
+                _log.info("{} (pid {}): RSS {} kB, PSS {} kB"
+                          .format(bot.path, bot.process.pid,
+                                  usage['rss'], usage['pss']))
+
+    def run(self):
+        start = time.time()
+        preloadSharedData()
+        _log.info("Loaded shared data in {:.2f} seconds."
+                  .format(time.time() - start))
+        signal.signal(signal.SIGTERM, self.stopAll)
+        for bot in self._bots:
+            bot.start()
+
+        lastReport = time.time()
+        running = list(self._bots)
+        try:
+            while running:
+                time.sleep(1)
+                if time.time() - lastReport >= self._memoryReportInterval:
+                    lastReport = time.time()
+                    self.reportMemory()
+                for bot in list(running):
+                    if bot.restartTime is not None:
+                        # waiting to restart after a crash
+                        if self._stopping:
+                            running.remove(bot)
+                        elif time.time() >= bot.restartTime:
+                            _log.info("Restarting bot in {}"
+                                      .format(bot.path))
+                            bot.start()
+                        continue
+                    if bot.process.is_alive():
+                        continue
+                    bot.process.join()
+                    msg = bot.lastMessage()
+                    if self._stopping or msg == "stop":
+                        _log.info("Bot in {} stopped.".format(bot.path))
+                        running.remove(bot)
+                    elif msg == "restart":
+                        _log.info("Restarting bot in {}".format(bot.path))
+                        bot.start()
+                    else:
+                        delay = bot.scheduleRestart()
+                        _log.warning("Bot in {} crashed (exit code {}); "
+                                     "restarting in {} seconds."
+                                     .format(bot.path, 
+                                             bot.process.exitcode, delay))
+        except KeyboardInterrupt:
+            # the children receive the interrupt too, and shut down
+            # themselves
+            self.stopAll()
+            for bot in running:
+                if bot.restartTime is None:
+                    bot.process.join()
+        _log.info("All bots stopped.")
+
+
+def _parse():
+    p = argparse.ArgumentParser(description="Run several bots in one host.")
+    p.add_argument('--debug', action='store_true', help="Run in debug mode")
+    p.add_argument('--memory-report', type=int, default=3600,
+                   metavar='SECONDS', dest='memoryReport',
+                   help="log memory usage of each bot this often")
+    p.add_argument('--request-engine', action='store_true',
+                   dest='requestEngine',
+                   help="send each bot's chats from coroutines on a request "
+                        "engine")
+    p.add_argument('paths', nargs='+', metavar='path',
+                   help="run path of each bot")
+    return p.parse_args()
+
+
+def main():
+    parsed = _parse()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s host: %(message)s",
+                                           "%H:%M"))
+    _log.addHandler(console)
+    _log.setLevel(logging.INFO)
+    _log.propagate = False
+    BotHost(parsed.paths, parsed.debug, parsed.memoryReport,
+            parsed.requestEngine).run()
@@ -7,7 +7,7 @@ from kol.request.OpenChatRequest import OpenChatRequest
 from kol.util import ChatUtils
 from cwbot.util.tryRequest import tryRequest
 import Queue
-from MessageDispatcher import MessageDispatcher
+from MessageDispatcher import MessageDispatcher, AsyncMessageDispatcher
 
 MAX_CHAT_LENGTH = 200
 
@@ -28,6 +28,9 @@ class ChatManager(object):
     need the return value (to get KoL responses, e.g., for a /who chat), use
     waitForReply=True. The function will block until the chat is sent and
     return the response chats in a list (normal pyKol operation). 
+    
+    If the session has a RequestEngine (see kol.RequestEngine), chats are
+    sent by coroutines on the engine instead of by a thread per target.
     """
 
     _entityRegex = re.compile(r'&#(\d+);?')
@@ -42,7 +45,10 @@ class ChatManager(object):
         r = OpenChatRequest(self.session)
         data = tryRequest(r)
         self.currentChannel = data["currentChannel"]
-        self._dispatcher = MessageDispatcher(session)
+        if getattr(session, 'engine', None) is not None:
+            self._dispatcher = AsyncMessageDispatcher(session)
+        else:
+            self._dispatcher = MessageDispatcher(session)
         self._dispatcher.daemon = True
         self._dispatcher.start()
 
@@ -0,0 +1,117 @@
+import time
+
+from cwbot.locks import InventoryLock
+from cwbot.util.tryRequest import tryRequest
+from cwbot.kolextra.request.GetDisplayCaseRequest import GetDisplayCaseRequest
+from cwbot.kolextra.request.AddItemsToDisplayCaseRequest import \
+                                            AddItemsToDisplayCaseRequest
+from cwbot.kolextra.request.TakeItemsFromDisplayCaseRequest import \
+                                            TakeItemsFromDisplayCaseRequest
+
+
+class DisplayCaseManager(object):
+    """This class keeps a cached model of the bot's display case, so that
+    stock checks do not need to download managecollection.php every time.
+
+    The model is updated locally whenever items are added or taken through
+    this manager. Since KoL does not report failures for display case
+    operations, the model is reconciled with the server after it is older
+    than the time-to-live (in seconds), or after any request fails.
+    The display case is first downloaded when it is needed.
+    """
+    __lock = InventoryLock.lock
+
+    def __init__(self, session, ttl=600):
+        "Initializes the DisplayCaseManager with a particular KoL session."
+        with self.__lock:
+            self.session = session
+            self._ttl = ttl
+            self.__items = {}
+            self._lastRefresh = None
+            session.displayCaseManager = self
+
+    @classmethod
+    def forSession(cls, session):
+        """ Get the session's DisplayCaseManager, creating one if the
+        session does not have one yet. """
+        with cls.__lock:
+            manager = getattr(session, 'displayCaseManager', None)
+            if manager is None:
+                manager = cls(session)
+            return manager
+
+    def refreshDisplayCase(self):
+        """ Download the display case and replace the cached model. """
+        with self.__lock:
+            self._lastRefresh = None
+            r = GetDisplayCaseRequest(self.session)
+            data = tryRequest(r)
+            self.__items = {}
+            for item in data.get('items', []):
+                self.__items[item['id']] = item['quantity']
+            self._lastRefresh = time.time()
+
+    def invalidate(self):
+        """ Mark the model as stale. It is refreshed on the next access. """
+        with self.__lock:
+            self._lastRefresh = None
+
+    def _reconcile(self):
+        if (self._lastRefresh is None or
+                time.time() - self._lastRefresh > self._ttl):
+            self.refreshDisplayCase()
+
+    def displayCase(self):
+        """ Get a map of (item-id, quantity) pairs that represents the
+        bot's display case. """
+        with self.__lock:
+            self._reconcile()
+            return dict(self.__items)
+
+    def quantity(self, iid):
+        """ Get the number of a single item in the display case. """
+        with self.__lock:
+            self._reconcile()
+            return self.__items.get(iid, 0)
+
+    def addItems(self, iidQtyDict):
+        """ Move items from inventory to the display case. iidQtyDict
+        is a dict of (item-id, quantity) pairs. """
+        itemList = [{'id': iid, 'quantity': qty}
+                    for iid,qty in iidQtyDict.items() if qty > 0]
+        if not itemList:
+            return
+        with self.__lock:
+            self._reconcile()
+            try:
+                tryRequest(AddItemsToDisplayCaseRequest(self.session,
+                                                        itemList))
+            except:
+                self.invalidate()
+                raise
+            for item in itemList:
+                iid = item['id']
+                self.__items[iid] = self.__items.get(iid, 0) + item['quantity']
+
+    def takeItems(self, iidQtyDict):
+        """ Move items from the display case to inventory. iidQtyDict
+        is a dict of (item-id, quantity) pairs. """
+        itemList = [{'id': iid, 'quantity': qty}
+                    for iid,qty in iidQtyDict.items() if qty > 0]
+        if not itemList:
+            return
+        with self.__lock:
+            self._reconcile()
+            try:
+                tryRequest(TakeItemsFromDisplayCaseRequest(self.session,
+                                                           itemList))
+            except:
+                self.invalidate()
+                raise
+            for item in itemList:
+                iid = item['id']
+                remaining = self.__items.get(iid, 0) - item['quantity']
+                if remaining > 0:
+                    self.__items[iid] = remaining
+                else:
+                    self.__items.pop(iid, None)
@@ -1,4 +1,4 @@
-import copy
+from collections import defaultdict
 
 from cwbot.locks import InventoryLock
 from kol.request.InventoryRequest import InventoryRequest
@@ -12,6 +12,14 @@ class InventoryManager(object):
     This is mostly for compatibility with the mailHandler.
     
     Reserved items are held in inventory (as opposed to the closet or the DC).
+    
+    The reservation table is mirrored in memory, so that availability can be
+    checked without reading the table. Reservations made through this class
+    are written through to the database and then applied to the mirror. The
+    mailHandler also changes reservations inside its own transactions (the
+    ...WithDbCursor methods), which may be rolled back; so, before the mirror
+    is used, it is reloaded if any other connection has committed to the
+    database since it was loaded.
     """
     __lock = InventoryLock.lock
     
@@ -22,43 +30,96 @@ class InventoryManager(object):
             self.__items = {}
             self._db = db
             self._name = self._db.createInventoryReservationTable()
+            self._con = self._db.getDbConnection(isolation_level="IMMEDIATE",
+                                                 check_same_thread=False)
+            self._ledger = {} # (iid, reservedBy, reserveInfo) -> qty
+            self._reservedTotals = defaultdict(int) # iid -> qty
+            self._dataVersion = None
             session.inventoryManager = self
             self.refreshInventory()
-            self.reserveItems({}, "a", "b") # check DB integrity
+            self._checkLedger()
+            
+    def close(self):
+        """ Close the connection to the reservation table. The manager
+        cannot be used afterwards. """
+        with self.__lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+            
+    def _dbDataVersion(self):
+        return self._con.execute("PRAGMA data_version").fetchone()[0]
+            
+    def _loadLedger(self):
+        self._dataVersion = self._dbDataVersion()
+        self._ledger = {}
+        self._reservedTotals = defaultdict(int)
+        c = self._con.execute("SELECT iid,reserved,reservedBy,reserveInfo "
+                              "FROM {}".format(self._name))
+        for row in c.fetchall():
+            key = (row['iid'], row['reservedBy'], row['reserveInfo'])
+            self._ledger[key] = self._ledger.get(key, 0) + row['reserved']
+            self._reservedTotals[row['iid']] += row['reserved']
+            
+    def _syncLedger(self):
+        if self._dataVersion != self._dbDataVersion():
+            self._loadLedger()
+            
+    def _applyToLedger(self, iidQtyDict, reserveName, reserveInfo):
+        for iid,qty in iidQtyDict.items():
+            key = (iid, reserveName, reserveInfo)
+            newQty = self._ledger.get(key, 0) + qty
+            if newQty == 0:
+                self._ledger.pop(key, None)
+            else:
+                self._ledger[key] = newQty
+            self._reservedTotals[iid] += qty
+            if self._reservedTotals[iid] == 0:
+                del self._reservedTotals[iid]
+            
+    def _checkLedger(self):
+        """ Check the integrity of the reservation table at startup. """
+        with self._con:
+            self._con.execute("DELETE FROM {} WHERE reserved=0"
+                              .format(self._name))
+        self._loadLedger()
+        for (iid, reserveName, reserveInfo),qty in self._ledger.items():
+            if qty < 0:
+                raise Exception("FATAL ERROR: "
+                                "Inventory database in invalid "
+                                "state: negative reservation of "
+                                "item {} by {}:{}"
+                                .format(iid, reserveName, reserveInfo))
 
     def refreshInventory(self):
         """ Refresh the inventory list. """
         with self.__lock:
             self.__items = {}
-            r = InventoryRequest(self.session)
+            # only quantities are needed here; callers that need item
+            # details can look them up in the ItemDatabase
+            r = InventoryRequest(self.session, quantitiesOnly=True)
+            # do not reuse a result that another caller got a moment ago
+            r.forceRefresh = True
             data = tryRequest(r)
-            for item in data["items"]:
-                self.__items[item["id"]] = item["quantity"]
+            self.__items = data["quantities"]
             
     def inventory(self):
         """ Get a map of (item-id, quantity) pairs that represents the bot's
         inventory. Reserved items are NOT INCLUDED in this total! """
         with self.__lock:
-            itemCopy = copy.deepcopy(self.__items)
-            con = self._db.getDbConnection(isolation_level="IMMEDIATE")
-            try:
-                c = con.cursor()
-                c.execute("SELECT * FROM {}".format(self._name))
-                for row in c.fetchall():
-                    iid = row['iid']
-                    qty = row['reserved']
-                    inInventory = itemCopy.get(iid, 0)
-                    itemCopy[iid] = inInventory - qty
-                    if inInventory == qty:
-                        del itemCopy[iid]
-            finally:
-                con.close()
+            self._syncLedger()
+            itemCopy = dict(self.__items)
+            for iid,qty in self._reservedTotals.items():
+                inInventory = itemCopy.get(iid, 0)
+                itemCopy[iid] = inInventory - qty
+                if inInventory == qty:
+                    del itemCopy[iid]
             return itemCopy
 
     def completeInventory(self):
         """ Works like .inventory(), but includes reserved items. """
         with self.__lock:
-            itemCopy = copy.deepcopy(self.__items)
+            itemCopy = dict(self.__items)
             return itemCopy
 
     def reserveItem(self, iid, qty, reserveName, reserveInfo):
@@ -83,14 +144,12 @@ class InventoryManager(object):
         and reserveInfo is an integer that can be used to group reservations.
         """
         with self.__lock:
-            con = self._db.getDbConnection(isolation_level="IMMEDIATE")
-            try:
-                with con:
-                    c = con.cursor()
-                    self.reserveItemsWithDbCursor(iidQtyDict, reserveName, 
-                                                  reserveInfo, c)
-            finally:
-                    con.close()
+            self._syncLedger()
+            with self._con:
+                c = self._con.cursor()
+                self.reserveItemsWithDbCursor(iidQtyDict, reserveName, 
+                                              reserveInfo, c)
+            self._applyToLedger(iidQtyDict, reserveName, reserveInfo)
 
 
     def reserved(self, reserveName=None, reserveInfo=None):
@@ -100,34 +159,13 @@ class InventoryManager(object):
         reserveInfo value are returned. If both are specified, the
         reservations are filtered by both criteria. """
         with self.__lock:
-            con = self._db.getDbConnection(isolation_level="IMMEDIATE")
-            try:
-                with con:
-                    c = con.cursor()
-                    if reserveName is None and reserveInfo is None:
-                        c.execute("SELECT iid,sum(reserved) AS reservations"
-                                  "FROM {} GROUP BY iid"
-                                  .format(self._names))
-                    elif reserveName is None:
-                        c.execute("SELECT iid,sum(reserved) AS reservations"
-                                  "FROM {} WHERE reserveInfo=? GROUP BY iid"
-                                  .format(self._names), (reserveInfo,))
-                    elif reserveInfo is None:
-                        c.execute("SELECT iid,sum(reserved) AS reservations"
-                                  "FROM {} WHERE reservedBy=? GROUP BY iid"
-                                  .format(self._names), (reserveName,))
-                    else:
-                        c.execute("SELECT iid,sum(reserved) AS reservations"
-                                  "FROM {} "
-                                  "WHERE reservedBy=? AND reserveInfo=? "
-                                  "GROUP BY iid"
-                                  .format(self._names), 
-                                  (reserveName, reserveInfo))
-                        
-                    return dict((row['iid'], row['reservations']) 
-                                for row in c.fetchall())
-            finally:
-                con.close()
+            self._syncLedger()
+            result = defaultdict(int)
+            for (iid, name, info),qty in self._ledger.items():
+                if ((reserveName is None or name == reserveName) and
+                        (reserveInfo is None or info == reserveInfo)):
+                    result[iid] += qty
+            return dict((iid, qty) for iid,qty in result.items() if qty != 0)
 
 
     def reserveItemsWithDbCursor(self, iidQtyDict, reserveName, 
@@ -138,21 +176,33 @@ class InventoryManager(object):
         reserveInfo. That is, if the same item is reserved twice, the total
         quantity will only be combined if reserveName and reserveInfo match.
         Otherwise, a new row will be added to the database. """
-        for iid,qty in iidQtyDict.items():
-            cursor.execute("UPDATE {} SET reserved = reserved + ? "
+        if not iidQtyDict:
+            return
+        cursor.execute("SELECT iid FROM {} "
+                       "WHERE reservedBy=? AND reserveInfo=?"
+                       .format(self._name), (reserveName, reserveInfo))
+        existing = set(row[0] for row in cursor.fetchall())
+        cursor.executemany("UPDATE {} SET reserved = reserved + ? "
                            "WHERE iid=? AND reservedBy=? AND reserveInfo=?"
-                           .format(self._name), (qty,iid,reserveName, 
-                                                 reserveInfo))
-            if cursor.rowcount == 0:
-                cursor.execute("INSERT INTO "
-                               "{}(iid,reserved,reservedBy,reserveInfo) "
-                               "VALUES(?,?,?,?)"
-                               .format(self._name), (iid,qty,reserveName,
-                                                     reserveInfo))
-        cursor.execute("DELETE FROM {} WHERE reserved=0"
-                  .format(self._name))
-        cursor.execute("SELECT * FROM {} WHERE reserved < 0 LIMIT 1"
-                  .format(self._name))
+                           .format(self._name), 
+                           [(qty, iid, reserveName, reserveInfo)
+                            for iid,qty in iidQtyDict.items() 
+                            if iid in existing])
+        cursor.executemany("INSERT INTO "
+                           "{}(iid,reserved,reservedBy,reserveInfo) "
+                           "VALUES(?,?,?,?)"
+                           .format(self._name), 
+                           [(iid, qty, reserveName, reserveInfo)
+                            for iid,qty in iidQtyDict.items() 
+                            if iid not in existing])
+        # only the rows for this reservation have changed
+        cursor.execute("DELETE FROM {} "
+                       "WHERE reservedBy=? AND reserveInfo=? AND reserved=0"
+                       .format(self._name), (reserveName, reserveInfo))
+        cursor.execute("SELECT * FROM {} "
+                       "WHERE reservedBy=? AND reserveInfo=? AND reserved < 0 "
+                       "LIMIT 1"
+                       .format(self._name), (reserveName, reserveInfo))
         badRequest = cursor.fetchone()
         if badRequest is not None:
             iid = badRequest['iid']
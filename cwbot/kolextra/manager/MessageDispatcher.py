@@ -1,8 +1,9 @@
 import logging
 import Queue
 import threading
-from cwbot.util.tryRequest import tryRequest
+from cwbot.util.tryRequest import tryRequest, tryRequestAsync
 from kol.request.SendChatRequest import SendChatRequest
+from kol.RequestEngine import AsyncQueue
 import time
 from time import sleep
 import copy
@@ -21,6 +22,8 @@ class MessageThread(threading.Thread):
     a ReferenceError exception.
     """
     
+    # minimum time between chats sent to the same target
+    throttleSeconds = 1.75
     
     def __init__(self, session, timeout, targetName=uuid.uuid4()):
         self._session = session
@@ -31,7 +34,6 @@ class MessageThread(threading.Thread):
         self.__lock = threading.RLock()
         self.__messageQueue = Queue.Queue()
         self._lastTarget = None
-        self.throttleSeconds = 1.75
         uid = "MessageThread-{}".format(targetName)
         super(MessageThread, self).__init__(name=uid)
         
@@ -244,4 +246,124 @@ class MessageDispatcher(threading.Thread):
         newChat["replyQueue"] = replyQueue
         self._messageQueue.put(newChat)        
         
-        
\ No newline at end of file
+        
+
+class AsyncMessageDispatcher(object):
+    """ A replacement for the MessageDispatcher that sends chats with 
+    coroutines on the session's RequestEngine (see kol.RequestEngine) 
+    instead of a thread per channel/recipient. Each target gets a sender 
+    coroutine that throttles and closes itself like a MessageThread, but 
+    waiting between chats does not hold a thread. The interface is the same
+    as the MessageDispatcher's. """
+    
+    def __init__(self, session):
+        self._session = session
+        self._engine = session.engine
+        self._senders = {} # target -> (AsyncQueue, Future)
+        self._lock = threading.Lock()
+        self._closing = False
+        self._log = logging.getLogger("chat")
+        self.daemon = True
+        
+        
+    def start(self):
+        pass
+    
+    
+    def close(self):
+        """ Stop the senders after they have sent the chats in their 
+        queues. """
+        self._log.info("Stopping chat senders...")
+        with self._lock:
+            self._closing = True
+            senders = self._senders.values()
+        for queue, _future in senders:
+            queue.put(None)
+        for _queue, future in senders:
+            try:
+                future.result()
+            except Exception:
+                self._log.exception("Error in chat sender")
+    
+    
+    def dispatch(self, chat, replyQueue=None):
+        """ Send a chat. See MessageDispatcher.dispatch. """
+        newChat = copy.deepcopy(chat)
+        newChat["replyQueue"] = replyQueue
+        target = self._getTarget(newChat)
+        with self._lock:
+            if self._closing:
+                self._log.warning("Chat dispatched after close: {}"
+                                  .format(newChat["text"]))
+                if replyQueue is not None:
+                    replyQueue.put([])
+                return
+            if target not in self._senders:
+                self._log.debug("Opening new sender for target {}."
+                                .format(target))
+                timeout = 5 if "recipient" in newChat else 300
+                queue = AsyncQueue(self._engine)
+                future = self._engine.spawn(self._send(target, queue, 
+                                                       timeout))
+                self._senders[target] = (queue, future)
+            self._senders[target][0].put(newChat)
+            
+            
+    def _getTarget(self, chat):
+        if "recipient" in chat:
+            return chat.get("recipient", None)
+        return chat.get("channel", None)
+    
+    
+    def _closeSender(self, target, queue):
+        """ Remove the sender for target if its queue is empty. Returns 
+        True if it was removed. """
+        with self._lock:
+            if not queue.empty():
+                return False
+            del self._senders[target]
+            return True
+        
+        
+    def _send(self, target, queue, timeout):
+        """ Coroutine that sends the chats in queue to target. """
+        while True:
+            try:
+                newChat = yield queue.get(timeout)
+            except Queue.Empty:
+                newChat = None
+            if newChat is None:
+                if self._closeSender(target, queue):
+                    break
+                continue
+            
+            replyQueue = newChat.get("replyQueue", None)
+            chats = []
+            try:
+                r = SendChatRequest(self._session, newChat["text"])
+                data = yield self._engine.spawn(
+                        tryRequestAsync(r, numTries=8, initialDelay=1, 
+                                        scaleFactor=1.25))
+                self._log.debug("({})> {}".format(target, newChat["text"]))
+                chats.extend(data["chatMessages"])
+            except Exception:
+                self._log.exception("E({})> {}"
+                                    .format(target, newChat["text"]))
+                r = SendChatRequest(self._session, 
+                                    "Error sending chat/PM to {}, "
+                                    "see error log".format(target))
+                yield self._engine.spawn(
+                        tryRequestAsync(r, nothrow=True, numTries=2))
+                with self._lock:
+                    # give up on enqueued messages
+                    del self._senders[target]
+                return
+            finally:
+                if replyQueue is not None:
+                    replyQueue.put(chats)
+            yield self._engine.sleep(MessageThread.throttleSeconds)
+            if not self._session.isConnected:
+                with self._lock:
+                    del self._senders[target]
+                break
+        self._log.debug("Closed chat sender for target {}.".format(target))
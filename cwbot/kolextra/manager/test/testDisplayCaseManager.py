@@ -0,0 +1,87 @@
+import unittest
+from cwbot.kolextra.manager import DisplayCaseManager as dcm
+from cwbot.kolextra.request.GetDisplayCaseRequest import GetDisplayCaseRequest
+from cwbot.kolextra.request.AddItemsToDisplayCaseRequest import \
+                                            AddItemsToDisplayCaseRequest
+
+
+class _Session(object):
+    serverURL = "http://127.0.0.1/"
+    pwd = "0"
+
+
+class _Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class Test(unittest.TestCase):
+    """ The display case model is refreshed when it is stale, and updated
+    locally by add/take in between. """
+
+    def setUp(self):
+        self.server = {1: 5, 2: 1}
+        self.requests = []
+        self.failing = False
+        self.clock = _Clock()
+        self._oldTryRequest = dcm.tryRequest
+        self._oldTime = dcm.time
+        dcm.tryRequest = self._tryRequest
+        dcm.time = self.clock
+
+    def tearDown(self):
+        dcm.tryRequest = self._oldTryRequest
+        dcm.time = self._oldTime
+
+    def _tryRequest(self, r):
+        self.requests.append(type(r))
+        if self.failing:
+            raise IOError("request failed")
+        if isinstance(r, GetDisplayCaseRequest):
+            return {'items': [{'id': iid, 'quantity': qty}
+                              for iid,qty in self.server.items()]}
+        return {}
+
+    def _refreshes(self):
+        return self.requests.count(GetDisplayCaseRequest)
+
+    def testLazyAndShared(self):
+        s = _Session()
+        m = dcm.DisplayCaseManager.forSession(s)
+        self.assertEqual(self._refreshes(), 0)
+        self.assertIs(dcm.DisplayCaseManager.forSession(s), m)
+        self.assertEqual(m.displayCase(), {1: 5, 2: 1})
+        self.assertEqual(m.quantity(1), 5)
+        self.assertEqual(self._refreshes(), 1)
+
+    def testOptimisticUpdate(self):
+        m = dcm.DisplayCaseManager(_Session(), ttl=600)
+        m.displayCase()
+        m.addItems({1: 2, 3: 4})
+        m.takeItems({2: 1})
+        self.assertEqual(m.displayCase(), {1: 7, 3: 4})
+        self.assertEqual(self._refreshes(), 1)
+        self.assertIn(AddItemsToDisplayCaseRequest, self.requests)
+
+    def testTtl(self):
+        m = dcm.DisplayCaseManager(_Session(), ttl=600)
+        m.displayCase()
+        self.server[1] = 9
+        self.clock.now += 599
+        self.assertEqual(m.quantity(1), 5)
+        self.clock.now += 2
+        self.assertEqual(m.quantity(1), 9)
+        self.assertEqual(self._refreshes(), 2)
+
+    def testFailureInvalidates(self):
+        m = dcm.DisplayCaseManager(_Session(), ttl=600)
+        m.displayCase()
+        self.failing = True
+        self.assertRaises(IOError, m.addItems, {1: 1})
+        self.failing = False
+        self.server[1] = 6
+        self.assertEqual(m.quantity(1), 6)
+        self.assertEqual(self._refreshes(), 2)
@@ -5,7 +5,7 @@ from cwbot.locks import InventoryLock
 class AddItemsToDisplayCaseRequest(GenericRequest):
     """Adds items to the player's display case. There is no notification of
     failure (KoL limitation). """
-    __lock = InventoryLock.lock
+    lock = InventoryLock.lock
 
     def __init__(self, session, items):
         super(AddItemsToDisplayCaseRequest, self).__init__(session)
@@ -22,6 +22,6 @@ class AddItemsToDisplayCaseRequest(GenericRequest):
 
 
     def doRequest(self):
-        with self.__lock:
+        with self.lock:
             super(AddItemsToDisplayCaseRequest, self).doRequest()
             
\ No newline at end of file
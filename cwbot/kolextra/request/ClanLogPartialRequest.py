@@ -2,6 +2,7 @@ from cwbot.kolextra.request.GenericPartialRequest import GenericPartialRequest
 from kol.manager import PatternManager
 from kol.util import Report
 
+import re
 from datetime import datetime
 
 CLAN_LOG_UNKNOWN = 0
@@ -16,119 +17,127 @@ CLAN_LOG_MEAT_SPENT_ARMY = 8
 CLAN_LOG_CHANGED_RANK = 9
 CLAN_LOG_CHANGED_TITLE = 10
 
+
+def _number(s):
+    return int(s.replace(',', ''))
+
+
+# Each action type, the pattern that recognizes it, and the entry fields
+# that are read from the pattern's groups: (entry key, group, conversion).
+# Actions are tried in this order.
+_actions = [
+    (CLAN_LOG_FAX, 'clanLogFax', [('monster', 'monsterName', None)]),
+    (CLAN_LOG_ATTACK, 'clanLogAttack', [('clanName', 'clanName', None)]),
+    (CLAN_LOG_WHITELISTED_PLAYER, 'clanLogWhitelistAdd',
+     [('targetUserName', 'userName', None),
+      ('targetUserId', 'userId', _number)]),
+    (CLAN_LOG_JOINED_ANOTHER_CLAN, 'clanLogPlayerJoinedAnotherClan', []),
+    (CLAN_LOG_WHITELISTED_IN, 'clanLogPlayerJoinedClanWhitelist', []),
+    (CLAN_LOG_STASH_ADD, 'clanLogStashItemAdd',
+     [('itemName', 'itemName', None), ('quantity', 'quantity', _number)]),
+    (CLAN_LOG_STASH_REMOVE, 'clanLogStashItemRemove',
+     [('itemName', 'itemName', None), ('quantity', 'quantity', _number)]),
+    (CLAN_LOG_MEAT_SPENT_ARMY, 'clanLogMeatSpentArmy',
+     [('meat', 'meat', _number)]),
+    (CLAN_LOG_CHANGED_RANK, 'clanLogChangedRank',
+     [('targetUserName', 'userName', None),
+      ('targetUserId', 'userId', _number)]),
+    (CLAN_LOG_CHANGED_TITLE, 'clanLogChangedTitle',
+     [('targetUserName', 'userName', None),
+      ('targetUserId', 'userId', _number),
+      ('clanTitle', 'clanTitle', None)]),
+]
+
+_groupPattern = re.compile(r'\(\?P<(\w+)>')
+__classifiers = {}
+__dates = {}
+_maxDates = 10000
+
+
+def _classifier(types):
+    """ Get a (regex, actions) tuple for the given action types (None for
+    all types). The regex is an alternation of the action patterns; each
+    alternative is a group named after the action, and the action's own
+    groups are prefixed with its name. actions maps each alternative's name
+    to (type, [(entry key, group, conversion)...]). """
+    key = None if types is None else frozenset(types)
+    classifier = __classifiers.get(key)
+    if classifier is None:
+        alternatives = []
+        actions = {}
+        for i, (logType, patternId, fields) in enumerate(_actions):
+            if types is not None and logType not in types:
+                continue
+            name = "a{}".format(i)
+            pattern = PatternManager.getOrCompilePattern(patternId).pattern
+            pattern = _groupPattern.sub(r'(?P<{}_\1>'.format(name), pattern)
+            alternatives.append("(?P<{}>{})".format(name, pattern))
+            actions[name] = (logType,
+                             [(k, "{}_{}".format(name, group), convert)
+                              for k, group, convert in fields])
+        regex = re.compile("|".join(alternatives)) if alternatives else None
+        classifier = __classifiers.setdefault(key, (regex, actions))
+    return classifier
+
+
+def _parseDate(date):
+    """ Parse a clan log date. Dates are given to the minute, so many entries
+    share a date, and each date is only parsed once. """
+    result = __dates.get(date)
+    if result is None:
+        if len(__dates) >= _maxDates:
+            __dates.clear()
+        result = datetime.strptime(date, "%m/%d/%y, %I:%M%p")
+        __dates[date] = result
+    return result
+
+
 class ClanLogPartialRequest(GenericPartialRequest):
     """Retrieves the clan activity log -- but stops after receiving fax data
-    for the first fax"""
+    for the first fax. If types is given, only entries of those types
+    (e.g., [CLAN_LOG_FAX]) are returned; include CLAN_LOG_UNKNOWN to also
+    get entries that match no known action."""
 
-    def __init__(self, session):
+    def __init__(self, session, types=None):
         super(ClanLogPartialRequest, self).__init__(
-            session, 
+            session,
             [PatternManager.getOrCompilePattern('clanLogFax'),
              PatternManager.getOrCompilePattern('clanLogEntry')],
             5*1024)
         self.url = session.serverURL + "clan_log.php"
+        self.types = None if types is None else frozenset(types)
 
     def parseResponse(self):
         entries = []
         entryPattern = PatternManager.getOrCompilePattern('clanLogEntry')
+        keepUnknown = self.types is None or CLAN_LOG_UNKNOWN in self.types
+        # an entry is only unknown if it matches none of the actions, so
+        # all of them are tried if unknown entries are kept
+        regex, actions = _classifier(None if keepUnknown else self.types)
         for entryMatch in entryPattern.finditer(self.responseText):
+            action = entryMatch.group('action')
+            match = regex.match(action) if regex is not None else None
+            if match is None:
+                if not keepUnknown:
+                    continue
+            else:
+                logType, fields = actions[match.lastgroup]
+                if self.types is not None and logType not in self.types:
+                    continue
             entry = {}
-            date = entryMatch.group('date')
-            entry['date'] = datetime.strptime(date, "%m/%d/%y, %I:%M%p")
+            entry['date'] = _parseDate(entryMatch.group('date'))
             entry['userId'] = int(entryMatch.group('userId'))
             entry['userName'] = entryMatch.group('userName')
-            action = entryMatch.group('action')
-            foundAction = False
-            
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogFax')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_FAX
-                    entry['monster'] = match.group('monsterName')
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogAttack')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_ATTACK
-                    entry['clanName'] = match.group('clanName')
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogWhitelistAdd')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_WHITELISTED_PLAYER
-                    entry['targetUserName'] = match.group('userName')
-                    entry['targetUserId'] = int(match.group('userId'))
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogPlayerJoinedAnotherClan')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_JOINED_ANOTHER_CLAN
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogPlayerJoinedClanWhitelist')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_WHITELISTED_IN
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogStashItemAdd')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_STASH_ADD
-                    entry['itemName'] = match.group('itemName')
-                    entry['quantity'] = int(match.group('quantity').replace(',', ''))
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogStashItemRemove')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_STASH_REMOVE
-                    entry['itemName'] = match.group('itemName')
-                    entry['quantity'] = int(match.group('quantity').replace(',', ''))
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogMeatSpentArmy')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_MEAT_SPENT_ARMY
-                    entry['meat'] = int(match.group('meat').replace(',', ''))
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogChangedRank')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_CHANGED_RANK
-                    entry['targetUserName'] = match.group('userName')
-                    entry['targetUserId'] = int(match.group('userId'))
-
-            if foundAction == False:
-                pattern = PatternManager.getOrCompilePattern('clanLogChangedTitle')
-                match = pattern.match(action)
-                if match:
-                    foundAction = True
-                    entry['type'] = CLAN_LOG_CHANGED_RANK
-                    entry['targetUserName'] = match.group('userName')
-                    entry['targetUserId'] = int(match.group('userId'))
-                    entry['clanTitle'] = match.group('clanTitle')
-
-            if foundAction == False:
-                Report.error("request", "Unknown clan log action: %s" % action)
+            if match is not None:
+                entry['type'] = logType
+                for k, group, convert in fields:
+                    value = match.group(group)
+                    entry[k] = value if convert is None else convert(value)
+            else:
+                if self.types is None:
+                    Report.error("request",
+                                 "Unknown clan log action: %s" % action)
                 entry['type'] = CLAN_LOG_UNKNOWN
                 entry['action'] = action
-
             entries.append(entry)
-
         self.responseData["entries"] = entries
@@ -1,4 +1,5 @@
-from kol.request.GenericRequest import GenericRequest
+from cwbot.kolextra.request.GenericPartialRequest import \
+                                            GenericPartialRequest
 from kol.manager import PatternManager
 import re
 from datetime import datetime
@@ -8,13 +9,16 @@ def decomma(num_str):
     return "".join(num_str.split(","))
 
 
-class ClanRaidLogRequest(GenericRequest):
+class ClanRaidLogRequest(GenericPartialRequest):
     """
     This class retrieves a list of old raid logs that the clan has completed.
     In addition, it also returns information about any given raid instance.
     
     Modifications from pyKol: Also gets the Hobopolis id of the current
-    instance (required for HoboChannelManager).
+    instance (required for HoboChannelManager). Unless previousRuns is True,
+    the page is streamed and the download stops once the table of previous
+    runs is reached; only the current dungeons are parsed and the 
+    'previousRuns' entry is empty.
     """
 
     _drunkPattern = re.compile(r'(?:<blockquote>|<br>)([^<]*?)\s+\(#(\d+)\)\s+got the carriageman\s+([\d,]+)\s+sheet\(s\) drunker')
@@ -23,8 +27,18 @@ class ClanRaidLogRequest(GenericRequest):
     _idPatterns = {'hoid': re.compile(r'hoid:(\d+)'),
                    'slid': re.compile(r'slid:(\d+)'),
                    'dvid': re.compile(r'dvid:(\d+)')}
-    def __init__(self, session, raidId=None):
-        super(ClanRaidLogRequest, self).__init__(session)
+    # matches the header or the first row of the table of previous runs
+    _previousRunsPattern = re.compile(r'<b>Previous Clan Dungeon Runs:?</b>|' + PatternManager.getOrCompilePattern('dungeonPreviousRun').pattern)
+    _chunkSize = 16 * 1024
+
+    def __init__(self, session, raidId=None, previousRuns=False):
+        self.previousRuns = previousRuns or bool(raidId)
+        if self.previousRuns:
+            regexList = []
+        else:
+            regexList = [self._previousRunsPattern]
+        super(ClanRaidLogRequest, self).__init__(session, regexList, 
+                                                 self._chunkSize)
         self.url = session.serverURL + "clan_raidlogs.php"
         if raidId:
             self.url += "?viewlog={}".format(raidId)
@@ -35,6 +49,11 @@ class ClanRaidLogRequest(GenericRequest):
     def parseResponse(self):
         # If this is a request for a particular raid log, only retrieve information about it.
         txt = self.responseText
+        if not self.previousRuns:
+            # drop the (partially downloaded) table of previous runs
+            m = self._previousRunsPattern.search(txt)
+            if m is not None:
+                txt = txt[:m.start()]
         if self.raidId:
             index = txt.find('<b>Current Clan Dungeons:</b>')
             if index > 0:
@@ -114,6 +133,9 @@ class ClanRaidLogRequest(GenericRequest):
         # Retrieve a list of previous, completed runs.
         previousRuns = []
         dungeonPreviousRunPattern = PatternManager.getOrCompilePattern('dungeonPreviousRun')
+        if not self.previousRuns:
+            self.responseData["previousRuns"] = previousRuns
+            return
         for match in dungeonPreviousRunPattern.finditer(self.responseText):
             run = {}
 
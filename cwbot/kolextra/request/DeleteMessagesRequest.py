@@ -4,6 +4,7 @@ from cwbot.locks import KmailLock
 
 class DeleteMessagesRequest(GenericRequest):
     "A request used to delete messages. Modified to use KmailLock."
+    lock = KmailLock.lock
 
     def __init__(self, session, messagesToDelete, box="Inbox"):
         super(DeleteMessagesRequest, self).__init__(session)
@@ -16,6 +17,6 @@ class DeleteMessagesRequest(GenericRequest):
             self.requestData["sel%s" % msgId] = "1"
 
     def doRequest(self):
-        with KmailLock.lock:
+        with self.lock:
             return super(DeleteMessagesRequest, self).doRequest()
             
\ No newline at end of file
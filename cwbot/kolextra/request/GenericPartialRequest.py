@@ -1,20 +1,66 @@
 import kol.Error as Error
 from kol.util import Report
-import requests
+from kol.request.GenericRequest import reportResponseText
+import time
+
+
+class StreamMatcher(object):
+    """Incrementally searches a stream of chunks for a list of regexes.
+    Each regex only scans the data that arrived since its last scan, plus
+    the last `overlap` characters before it, so that matches spanning two
+    chunks are still found. Once a regex matches, it is not searched again.
+    
+    A match that spans two chunks is only found if it is at most `overlap`
+    characters long. A longer match is missed, so the stream is not stopped
+    early and the whole page is downloaded. The overlap should therefore be
+    longer than anything the regexes can match. With an overlap of 0, only
+    matches that lie within one chunk are found. """
+
+    def __init__(self, regexList, overlap):
+        self._unmatched = list(regexList)
+        self._overlap = overlap
+        self._tail = ""
+        self.chunks = []
+        self.length = 0
+
+    def feed(self, chunk):
+        """Add a chunk. Returns True once every regex has matched (always
+        False if the regexList is empty)."""
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        if not self._unmatched:
+            return False
+        window = self._tail + chunk
+        self._unmatched = [regex for regex in self._unmatched
+                           if regex.search(window) is None]
+        self._tail = window[-self._overlap:] if self._overlap else ""
+        return not self._unmatched
+
+    def text(self):
+        return "".join(self.chunks)
 
-import urllib
-from cStringIO import StringIO
 
 class GenericPartialRequest(object):
     """A generic request to a Kingdom of Loathing server. This request is 
-    modified to stop streaming data after a regex matches. """
+    modified to stop streaming data after all regexes in regexList have 
+    matched. If regexList is empty, the whole page is downloaded. 
+    
+    After the request, bytesReceived holds the number of bytes read, and
+    bytesSaved the number of bytes that were not downloaded (or None if the
+    server did not send a Content-Length).
+    
+    A regex match is only found across a chunk boundary if it is at most 
+    overlap characters long (see StreamMatcher)."""
 
-    def __init__(self, session, regexList, chunkSize):
+    def __init__(self, session, regexList, chunkSize, overlap=2048):
         self.session = session
         self.regexList = regexList
         self.requestData = {}
         self.skipParseResponse = False
         self.chunkSize = chunkSize
+        self.overlap = overlap
+        self.bytesReceived = None
+        self.bytesSaved = None
 
     def doRequest(self):
         """
@@ -23,31 +69,23 @@ class GenericPartialRequest(object):
         logged in when it actually isn't.
         """
 
-        Report.debug("request", "Requesting %s" % self.url)
+        Report.debug("request", "Requesting %s", args=(self.url,))
 
-        self.response = self.session.opener.opener.post(self.url, self.requestData, stream=True)
-        responseStr = StringIO()
+        t0 = time.time()
+        self.response = self.session.opener.stream(self.url, self.requestData)
+        matcher = StreamMatcher(self.regexList, self.overlap)
         try:
             for chunk in self.response.iter_content(self.chunkSize):
-                responseStr.write(chunk)
-                s = responseStr.getvalue()
-                
-                matched = True
-                for regex in self.regexList:
-                    if not regex.search(s):
-                        matched = False
-                        break
-
-                if matched:                    
+                if matcher.feed(chunk):
                     break
-
-            self.responseText = responseStr.getvalue()
-            responseStr.close()
+            self.responseText = matcher.text()
+            self._countBytes(matcher)
         finally:
             self.response.close()
+        self.session.opener.record(self.url, time.time() - t0, self.bytesReceived)
 
-        Report.debug("request", "Received response: %s" % self.url)
-        Report.debug("request", "Response Text: %s" % self.responseText)
+        Report.debug("request", "Received response: %s (%s bytes, %s bytes saved)", args=(self.url, self.bytesReceived, self.bytesSaved))
+        reportResponseText(self.responseText)
 
         if self.response.url.find("/maint.php") >= 0:
             self.session.isConnected = False
@@ -64,6 +102,20 @@ class GenericPartialRequest(object):
         if self.skipParseResponse == False and hasattr(self, "parseResponse"):
             self.parseResponse()
             if len(self.responseData) > 0:
-                Report.debug("request", "Parsed response data: %s" % self.responseData)
+                Report.debug("request", "Parsed response data: %s", args=(self.responseData,))
 
         return self.responseData
+
+    def _countBytes(self, matcher):
+        # compare the bytes read from the connection (which may be 
+        # compressed) to the Content-Length header
+        self.bytesReceived = matcher.length
+        try:
+            self.bytesReceived = self.response.raw.tell()
+        except AttributeError:
+            pass
+        contentLength = self.response.headers.get('content-length')
+        if contentLength is not None:
+            self.bytesSaved = max(0, int(contentLength) - self.bytesReceived)
+        else:
+            self.bytesSaved = None
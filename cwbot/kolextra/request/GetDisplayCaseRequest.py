@@ -5,7 +5,7 @@ from cwbot.locks import InventoryLock
 
 class GetDisplayCaseRequest(GenericRequest):
     "Get list of items in the player's display case."
-    __lock = InventoryLock.lock
+    lock = InventoryLock.lock
 
     def __init__(self, session):
         super(GetDisplayCaseRequest, self).__init__(session)
@@ -14,7 +14,7 @@ class GetDisplayCaseRequest(GenericRequest):
 
 
     def doRequest(self):
-        with self.__lock:
+        with self.lock:
             return super(GetDisplayCaseRequest, self).doRequest()
 
     
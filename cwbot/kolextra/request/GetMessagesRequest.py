@@ -12,6 +12,7 @@ class GetMessagesRequest(GenericRequest):
     This class is used to get a list of kmails from the server. Modified
     to use the KmailLock.
     """
+    lock = KmailLock.lock
 
     def __init__(self, session, box="Inbox", pageNumber=None, messagesPerPage=None, oldestFirst=None, allowUnknownItems=False):
         """
@@ -160,5 +161,5 @@ class GetMessagesRequest(GenericRequest):
 
 
     def doRequest(self):
-        with KmailLock.lock:
+        with self.lock:
             return super(GetMessagesRequest, self).doRequest()
@@ -6,6 +6,7 @@ from cwbot.locks import InventoryLock
 
 class OutfitEquipRequest(GenericRequest):
     """Equips an outfit"""
+    lock = InventoryLock.lock
     _cantEquip = re.compile(r'''You don't have sufficient|You put on part of an Outfit|Item <b>NOT</b> found''', re.IGNORECASE)
     _badNumber = re.compile(r'Invalid Custom Outfit selected|Invalid outfit selected', re.IGNORECASE)
     _missingItems = re.compile(r'''You don't have enough items from this outfit to properly equip it''', re.IGNORECASE)
@@ -22,7 +23,7 @@ class OutfitEquipRequest(GenericRequest):
 
 
     def doRequest(self):
-        with InventoryLock.lock:
+        with self.lock:
             super(OutfitEquipRequest, self).doRequest()
         self.responseData = {'result': self.responseText}
         if self._success.search(self.responseText) is not None:
@@ -4,6 +4,7 @@ from cwbot.locks import KmailLock
 
 class SaveMessagesRequest(GenericRequest):
     "A request used to save messages."
+    lock = KmailLock.lock
 
     def __init__(self, session, messagesToDelete, box="Inbox"):
         super(SaveMessagesRequest, self).__init__(session)
@@ -16,5 +17,5 @@ class SaveMessagesRequest(GenericRequest):
             self.requestData["sel%s" % msgId] = "1"
     
     def doRequest(self):
-        with KmailLock.lock:
+        with self.lock:
             return super(SaveMessagesRequest, self).doRequest()
@@ -10,6 +10,7 @@ _badPlayerId = re.compile(
 
 class SendMessageRequest(GenericRequest):
     """ Send a message. Modified to use KmailLock. """
+    lock = KmailLock.lock
     
     def __init__(self, session, message):
         super(SendMessageRequest, self).__init__(session)
@@ -59,5 +60,5 @@ class SendMessageRequest(GenericRequest):
             raise Error.Error("Unknown error", Error.REQUEST_FATAL)
 
     def doRequest(self):
-        with KmailLock.lock:
+        with self.lock:
             return super(SendMessageRequest, self).doRequest()
@@ -9,6 +9,7 @@ from cwbot.locks import InventoryLock
 
 class SpecialShopRequest(GenericRequest):
     """Uses a special shop or assembly item (such as the star chart)"""
+    lock = InventoryLock.lock
 
     _itemsRegex = re.compile(r'''javascript:descitem\(\d+\)'><b>([^<]+)</b>.*?whichrow=(\d+)''')
 
@@ -24,7 +25,7 @@ class SpecialShopRequest(GenericRequest):
             self.requestData["action"] = "buyitem" 
 
     def doRequest(self):
-        with InventoryLock.lock:
+        with self.lock:
             return super(SpecialShopRequest, self).doRequest()
 
     def parseResponse(self):
@@ -5,7 +5,7 @@ from cwbot.locks import InventoryLock
 class TakeItemsFromDisplayCaseRequest(GenericRequest):
     """Remove items from the player's display case. No error checking is 
     performed."""
-    __lock = InventoryLock.lock
+    lock = InventoryLock.lock
 
     def __init__(self, session, items):
         super(TakeItemsFromDisplayCaseRequest, self).__init__(session)
@@ -21,5 +21,5 @@ class TakeItemsFromDisplayCaseRequest(GenericRequest):
         print("Request: " + str(self.requestData))
 
     def doRequest(self):
-        with self.__lock:
+        with self.lock:
             super(TakeItemsFromDisplayCaseRequest, self).doRequest()
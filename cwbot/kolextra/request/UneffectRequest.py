@@ -6,6 +6,7 @@ from cwbot.locks import InventoryLock
 class UneffectRequest(GenericRequest):
     """Uses a soft green echo eyedrop antidote to remove any effect.
     Modified to use InventoryLock and does not throw. """
+    lock = InventoryLock.lock
 
     def __init__(self, session, effectId):
         super(UneffectRequest, self).__init__(session)
@@ -15,7 +16,7 @@ class UneffectRequest(GenericRequest):
         self.requestData["whicheffect"] = effectId
 
     def doRequest(self):
-        with InventoryLock.lock:
+        with self.lock:
             return super(UneffectRequest, self).doRequest()
 
     def parseResponse(self):
@@ -0,0 +1,114 @@
+import collections
+import datetime
+import hashlib
+import os
+import unittest
+import kol.test
+from kol.util import Report
+from cwbot.kolextra.request.ClanLogPartialRequest import \
+        ClanLogPartialRequest, CLAN_LOG_UNKNOWN, CLAN_LOG_FAX, \
+        CLAN_LOG_ATTACK, CLAN_LOG_WHITELISTED_PLAYER, \
+        CLAN_LOG_JOINED_ANOTHER_CLAN, CLAN_LOG_WHITELISTED_IN, \
+        CLAN_LOG_STASH_ADD, CLAN_LOG_STASH_REMOVE, \
+        CLAN_LOG_MEAT_SPENT_ARMY, CLAN_LOG_CHANGED_RANK, \
+        CLAN_LOG_CHANGED_TITLE
+
+
+_fixture = os.path.join(os.path.dirname(kol.test.__file__), "fixtures",
+                        "clan_log.php.html")
+
+
+class _Session(object):
+    serverURL = "http://127.0.0.1/"
+
+
+class Test(unittest.TestCase):
+    """ Clan log entries are classified by a single regex, and the types
+    argument filters them. The fixture has 2000 entries. """
+
+    @classmethod
+    def setUpClass(cls):
+        with open(_fixture) as f:
+            cls.page = f.read()
+
+    def setUp(self):
+        # do not print the errors reported for unknown actions
+        Report.removeOutputSection("*")
+
+    def tearDown(self):
+        Report.addOutputSection("*")
+
+    def parse(self, types=None):
+        r = ClanLogPartialRequest(_Session(), types)
+        r.responseText = self.page
+        r.responseData = {}
+        r.parseResponse()
+        return r.responseData['entries']
+
+    def countTypes(self, entries):
+        return dict(collections.Counter(e['type'] for e in entries))
+
+    def testAllEntries(self):
+        entries = self.parse()
+        self.assertEqual(len(entries), 2000)
+        self.assertEqual(self.countTypes(entries),
+                         {CLAN_LOG_UNKNOWN: 20,
+                          CLAN_LOG_FAX: 514,
+                          CLAN_LOG_ATTACK: 42,
+                          CLAN_LOG_WHITELISTED_PLAYER: 142,
+                          CLAN_LOG_JOINED_ANOTHER_CLAN: 18,
+                          CLAN_LOG_WHITELISTED_IN: 102,
+                          CLAN_LOG_STASH_ADD: 509,
+                          CLAN_LOG_STASH_REMOVE: 400,
+                          CLAN_LOG_MEAT_SPENT_ARMY: 60,
+                          CLAN_LOG_CHANGED_RANK: 118,
+                          CLAN_LOG_CHANGED_TITLE: 75})
+        # this matches the parser before the classifier was rewritten,
+        # except that "changed title" entries were CLAN_LOG_CHANGED_RANK
+        # and had no clanTitle
+        digest = hashlib.md5(repr([sorted(e.items()) for e in entries]))
+        self.assertEqual(digest.hexdigest(),
+                         "b1c3f65972cb1ed8ff21e8ab72ac2a8d")
+
+    def testEntries(self):
+        entries = self.parse()
+        self.assertEqual(entries[2],
+                         {'type': CLAN_LOG_FAX,
+                          'date': datetime.datetime(2023, 11, 14, 22, 11),
+                          'userName': "Player69", 'userId': 2002553,
+                          'monster': "Knob Goblin Elite Guard Captain"})
+        self.assertEqual(entries[5]['quantity'], 6)
+        self.assertEqual(entries[15],
+                         {'type': CLAN_LOG_CHANGED_TITLE,
+                          'date': datetime.datetime(2023, 11, 14, 17, 55),
+                          'userName': "Player52", 'userId': 2001924,
+                          'targetUserName': "Player72",
+                          'targetUserId': 2002664, 'clanTitle': "Faxbot"})
+        self.assertEqual(entries[52]['meat'], 70428)
+        self.assertEqual(entries[151],
+                         {'type': CLAN_LOG_UNKNOWN,
+                          'date': datetime.datetime(2023, 11, 12, 18, 41),
+                          'userName': "Player71", 'userId': 2002627,
+                          'action': "bought a clan VIP lounge key."})
+
+    def testTypes(self):
+        entries = self.parse()
+        faxes = self.parse([CLAN_LOG_FAX])
+        self.assertEqual(len(faxes), 514)
+        self.assertEqual(faxes,
+                         [e for e in entries if e['type'] == CLAN_LOG_FAX])
+        stash = self.parse([CLAN_LOG_STASH_ADD, CLAN_LOG_STASH_REMOVE])
+        self.assertEqual(self.countTypes(stash),
+                         {CLAN_LOG_STASH_ADD: 509, CLAN_LOG_STASH_REMOVE: 400})
+        self.assertEqual(self.parse([]), [])
+
+    def testUnknownType(self):
+        entries = self.parse()
+        unknown = self.parse([CLAN_LOG_UNKNOWN])
+        self.assertEqual(len(unknown), 20)
+        self.assertEqual(unknown,
+                         [e for e in entries if e['type'] == CLAN_LOG_UNKNOWN])
+        # entries of the other types are still recognized
+        titles = self.parse([CLAN_LOG_CHANGED_TITLE, CLAN_LOG_UNKNOWN])
+        self.assertEqual(self.countTypes(titles),
+                         {CLAN_LOG_UNKNOWN: 20, CLAN_LOG_CHANGED_TITLE: 75})
@@ -0,0 +1,122 @@
+import re
+import unittest
+from cwbot.kolextra.request.GenericPartialRequest import \
+                                    GenericPartialRequest, StreamMatcher
+
+
+class _Regex(object):
+    """ A regex that records the length of each text it searches. """
+    def __init__(self, pattern):
+        self._regex = re.compile(pattern)
+        self.searched = []
+
+    def search(self, text):
+        self.searched.append(len(text))
+        return self._regex.search(text)
+
+
+class _Response(object):
+    def __init__(self, text, contentLength):
+        self.text = text
+        self.url = "http://127.0.0.1/clan_log.php"
+        self.headers = {}
+        if contentLength:
+            self.headers['content-length'] = str(len(text))
+        self.raw = None
+        self.chunksRead = 0
+        self.closed = False
+
+    def iter_content(self, chunkSize):
+        for i in range(0, len(self.text), chunkSize):
+            self.chunksRead += 1
+            yield self.text[i:i + chunkSize]
+
+    def close(self):
+        self.closed = True
+
+
+class _Opener(object):
+    def __init__(self, response):
+        self.response = response
+        self.recorded = []
+
+    def stream(self, url, requestData):
+        return self.response
+
+    def record(self, url, seconds, numBytes):
+        self.recorded.append((url, numBytes))
+
+
+class _Session(object):
+    serverURL = "http://127.0.0.1/"
+    isConnected = True
+
+    def __init__(self, response):
+        self.opener = _Opener(response)
+
+
+class _Request(GenericPartialRequest):
+    def __init__(self, session, regexList, chunkSize, overlap=2048):
+        super(_Request, self).__init__(session, regexList, chunkSize, overlap)
+        self.url = session.serverURL + "clan_log.php"
+
+
+class Test(unittest.TestCase):
+    """ The stream is searched incrementally, and stops once every regex
+    has matched. """
+
+    def testMatchAcrossChunks(self):
+        matcher = StreamMatcher([re.compile("needle")], overlap=10)
+        self.assertFalse(matcher.feed("hay hay nee"))
+        self.assertTrue(matcher.feed("dle hay"))
+        self.assertEqual(matcher.text(), "hay hay needle hay")
+        self.assertEqual(matcher.length, 18)
+
+    def testMatchLongerThanOverlap(self):
+        # a match that spans chunks and is longer than the overlap is missed
+        matcher = StreamMatcher([re.compile("needle")], overlap=2)
+        self.assertFalse(matcher.feed("hay nee"))
+        self.assertFalse(matcher.feed("dle hay"))
+
+    def testNoOverlap(self):
+        regex = _Regex("needle")
+        matcher = StreamMatcher([regex], overlap=0)
+        for chunk in ["hay ", "hay ", "hay ", "nee", "dle"]:
+            self.assertFalse(matcher.feed(chunk))
+        # only the new chunk is searched each time
+        self.assertEqual(regex.searched, [4, 4, 4, 3, 3])
+        self.assertTrue(matcher.feed("a needle"))
+
+    def testOverlapLimitsSearch(self):
+        regex = _Regex("needle")
+        matcher = StreamMatcher([regex], overlap=2)
+        for chunk in ["hay ", "hay ", "hay "]:
+            matcher.feed(chunk)
+        self.assertEqual(regex.searched, [4, 6, 6])
+
+    def testEmptyRegexList(self):
+        matcher = StreamMatcher([], overlap=10)
+        self.assertFalse(matcher.feed("abc"))
+        self.assertFalse(matcher.feed("def"))
+        self.assertEqual(matcher.text(), "abcdef")
+
+    def testStopsEarly(self):
+        response = _Response("a" * 100 + "needle" + "b" * 1000, True)
+        session = _Session(response)
+        r = _Request(session, [re.compile("needle")], chunkSize=50)
+        r.doRequest()
+        self.assertEqual(response.chunksRead, 3)
+        self.assertTrue(response.closed)
+        self.assertEqual(r.responseText, response.text[:150])
+        self.assertEqual(r.bytesReceived, 150)
+        self.assertEqual(r.bytesSaved, len(response.text) - 150)
+        self.assertEqual(session.opener.recorded, [(r.url, 150)])
+
+    def testWholePage(self):
+        response = _Response("a" * 120, False)
+        r = _Request(_Session(response), [], chunkSize=50)
+        r.doRequest()
+        self.assertEqual(r.responseText, response.text)
+        self.assertEqual(r.bytesReceived, 120)
+        # no Content-Length, so the savings are unknown
+        self.assertIsNone(r.bytesSaved)
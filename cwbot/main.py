@@ -19,6 +19,7 @@ from cwbot.kolextra.manager.InventoryManager import InventoryManager
 from cwbot.util.tryRequest import tryRequest
 from cwbot.database import database
 from kol.Session import Session
+from kol.RequestEngine import RequestEngine
 import kol.Error
 from cwbot.sys.database import Database
 
@@ -26,10 +27,10 @@ exitEvent = threading.Event()
 databaseName = 'data/cwbot.db'
 
 
-def openSession(props):
+def openSession(props, engine=None):
     """ Log in to the KoL servers. """
     log = logging.getLogger()
-    s = Session()
+    s = Session(engine=engine)
     s.login(props.userName, props.password)
     log.info("Logged in.")
     return s
@@ -81,9 +82,14 @@ def loginLoop(myDb, props):
     successfulShutdown = False
     fastCrash = False
     cman = None
+    inv = None
+    engine = None
     try:
         loginWait = 60
-        s = openSession(props)
+        if props.requestEngine:
+            engine = RequestEngine()
+            engine.start()
+        s = openSession(props, engine)
         inv = createInventoryManager(s, myDb)
         cman = createChatManager(s)
         database.flush()
@@ -184,6 +190,12 @@ def loginLoop(myDb, props):
                 cman = None
             except:
                 log.exception("Error closing chat session.")
+        if inv is not None:
+            try:
+                inv.close()
+                inv = None
+            except:
+                log.exception("Error closing inventory manager.")
         if s is not None:
             try:
                 log.info("Closing session...")
@@ -191,6 +203,9 @@ def loginLoop(myDb, props):
             except:
                 log.exception("Error closing KoL session.")
             s = None
+        if engine is not None:
+            engine.stop(timeout=10)
+            engine = None
         log.info("----- Logged out. -----\n")
     return (loginWait, fastCrash)
 
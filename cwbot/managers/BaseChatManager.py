@@ -1,7 +1,21 @@
 import re
+import time
+import threading
+from collections import namedtuple
 from BaseManager import BaseManager
 from cwbot.util.textProcessing import stringToBool
 
+
+# "!COMMAND (ARGS)" or "!COMMAND ARGS" (discarding -hic- if present); 
+# ? may be used instead of ! for help queries
+_commandRegex = re.compile(
+        r'^(!|\?)([^\s(]+)\s*(?:\((.*)\)|(.*?)(\s*-hic-)?$)')
+
+
+# a module in the routing table, with the (lower-case) names of its commands
+_Route = namedtuple("_Route", ["entry", "commands"])
+
+
 class BaseChatManager(BaseManager):
     """
     Base class for any Manager that handles chats. The parseChat() method
@@ -24,6 +38,10 @@ class BaseChatManager(BaseManager):
     def __init__(self, parent, name, iData, config):
         "Initialize the BaseChatManager"
         self._respondToWhisper = None
+        self._routes = {}
+        self._allChatRoutes = []
+        self._commandStats = {}
+        self._statsLock = threading.Lock()
         super(BaseChatManager, self).__init__(parent, name, iData, config)
         
         
@@ -39,61 +57,118 @@ class BaseChatManager(BaseManager):
                             "for manager {}".format(self.identity))
     
     
+    def _initializeModules(self, initData):
+        """ Initialize the modules, then (re)build the command routing 
+        table. """
+        super(BaseChatManager, self)._initializeModules(initData)
+        self._buildRoutes()
+        
+        
+    def _buildRoutes(self):
+        """ Build the command routing table. Each command maps to the modules
+        that list it in their available_commands, plus the modules that 
+        accept all chats (see BaseChatModule.acceptsAllChats), in priority 
+        order. Chats that are not commands (or are unknown commands) are
+        only passed to the modules that accept all chats. """
+        routes = []
+        for m in self._modules:
+            commands = m.module.extendedCall('available_commands')
+            if commands is None:
+                commands = {}
+            routes.append(_Route(m, frozenset(k.lower() for k in commands)))
+        allChatRoutes = [r for r in routes 
+                         if getattr(r.entry.module, 'acceptsAllChats', False)]
+        commandNames = set()
+        for r in routes:
+            commandNames.update(r.commands)
+        self._routes = dict(
+                (c, [r for r in routes 
+                     if c in r.commands or r in allChatRoutes])
+                for c in commandNames)
+        self._allChatRoutes = allChatRoutes
+        self._log.debug("Routing table: {} commands, {} modules accepting "
+                        "all chats.".format(len(self._routes), 
+                                            len(allChatRoutes)))
+    
+    
     def _processChat(self, msg, checkNum):
         """ Every approved chat is passed to the _processChat method. Here
         the chat is passed to individual modules. """
+        start = time.time()
         replies = []
         txt = msg['text']
-        # check if this is a command or help query (starts with ? or !) that
-        # is of the form "!COMMAND (ARGS)"
-        m1 = re.search(r'^(!|\?)([^\s(]+)\s*\((.*)\)', txt)
-        cmdtype = []
-        cmd = []
-        arg = []
-        if m1 is not None:
-            cmdtype = m1.group(1)
-            cmd = m1.group(2).lower()
-            arg = m1.group(3)
+        # check if this is a command or help query (starts with ? or !)
+        match = _commandRegex.search(txt)
+        if match is not None:
+            cmdtype = match.group(1)
+            cmd = match.group(2).lower()
+            arg = match.group(3)
+            if arg is None:
+                arg = match.group(4)
         else:
-            # check for the form "!COMMAND ARGS", discard -hic- if present
-            m2 = re.search(r'^(!|\?)([^\s(]+)\s*(.*?)(\s*-hic-)?$', txt)
-            if m2 is not None:
-                cmdtype = m2.group(1)
-                cmd = m2.group(2).lower()
-                arg = m2.group(3)
-            else:
-                cmdtype = None
-                cmd = None
-                arg = None
-        if arg is None:
-            arg = "" 
+            cmdtype = None
+            cmd = None
+            arg = ""
         if cmd == "help" or cmdtype == "?":
             # show "help" text
             replies.extend(self._showHelp(msg, cmd, arg))
         else:
             # execute command
             with self._syncLock:    
-                for m in self._modules:
-                    mod = m.module
-                    permission = m.permission
-                    clanOnly = m.clanOnly
+                for r in self._routes.get(cmd, self._allChatRoutes):
+                    m = r.entry
                     # ACTUALLY execute the command
-                    txt = self._processCommand(mod, permission, clanOnly, msg, 
-                                              cmd, arg)
+                    txt = self._processCommand(m.module, m.permission, 
+                                               m.clanOnly, msg, cmd, arg,
+                                               r.commands)
                     if txt is not None:
                         replies.extend(txt.split("\n"))
                         # chat processed! return the replies.
                         break
+        if cmd is not None:
+            self._recordCommand(cmd, time.time() - start)
         return [r for r in replies if r != ""]
+    
+    
+    def _recordCommand(self, cmd, seconds):
+        # unknown commands are counted together, so that users cannot grow
+        # the stats table without bound
+        if cmd not in self._routes and cmd != "help":
+            cmd = None
+        with self._statsLock:
+            s = self._commandStats.get(cmd)
+            if s is None:
+                s = {'count': 0, 'seconds': 0.0, 'maxSeconds': 0.0}
+                self._commandStats[cmd] = s
+            s['count'] += 1
+            s['seconds'] += seconds
+            s['maxSeconds'] = max(s['maxSeconds'], seconds)
+            
+            
+    def getCommandStats(self):
+        """ Get a dict of command -> {'count', 'seconds', 'maxSeconds'}, 
+        the number of times each command was processed and the time spent
+        processing it. Unknown commands are counted under None. """
+        with self._statsLock:
+            return dict((k, dict(v)) for k,v in self._commandStats.items())
+        
+        
+    def resetCommandStats(self):
+        with self._statsLock:
+            self._commandStats = {}
 
     
-    def _processCommand(self, module, permission, clanOnly, msg, cmd, arg):
+    def _processCommand(self, module, permission, clanOnly, msg, cmd, arg,
+                        availableCommands=None):
         """ This function is used to send a chat to a module, while first
-        checking permissions and in-clan status. """
+        checking permissions and in-clan status. availableCommands is the
+        collection of the module's command names; if it is not given, the
+        module is asked for them. """
         
         # get a list of available chat commands
         uid = msg['userId']
-        availableCommands = module.extendedCall('available_commands')
+        if availableCommands is None:
+            availableCommands = module.extendedCall('available_commands')
         if availableCommands is None:
             availableCommands = {}
         noPermission = (permission is None or 
@@ -1,17 +1,18 @@
 import abc
 import time
-import copy
 import re
 import cwbot.util.DebugThreading as threading
 from cwbot.util.tryRequest import tryRequest
 from cwbot.kolextra.request.ClanRaidLogRequest import ClanRaidLogRequest
 from cwbot.managers.MultiChannelManager import MultiChannelManager
+from cwbot.common.eventList import EventList
+from cwbot.common.frozen import FrozenDict, freeze
 from cwbot.database import database
 
 
-class LogDict(dict):
-    """ A dict with supressed __str__ and __repr__ to prevent clogging up
-    the CLI """
+class LogDict(FrozenDict):
+    """ A read-only dict with supressed __str__ and __repr__ to prevent 
+    clogging up the CLI """
     
     def __str__(self):
         return "{Event Log}"
@@ -20,6 +21,8 @@ class LogDict(dict):
         return "{Event Log}"
 
 
+_noMatch = FrozenDict()
+
 
 class BaseClanDungeonChannelManager(MultiChannelManager):
     """ Subclass of MultiChannelManager that incorporates Dungeon chat 
@@ -47,11 +50,13 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
                                             # LOCKING self._syncLock
         self.__initialized = False
         self.__lastEvents = None
+        self.__indexed = (None, None) # (raid log events, indexed log)
         self._lastEventCheck = 0
         self._logEntryDb = []
         printDbLoad = False
         if self._csvFile is not None:
-            self._logEntryDb = database.csvDatabase(self._csvFile)
+            self._logEntryDb = [FrozenDict(dbEntry) for dbEntry 
+                                in database.csvDatabase(self._csvFile)]
             printDbLoad = True
         
         with self.__raidlogDownloadLock:
@@ -61,7 +66,7 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
                                     numTries=5, 
                                     initialDelay=0.5, 
                                     scaleFactor=2)
-                self.__initialRaidlog = result
+                self.__initialRaidlog = freeze(result)
         self.__lastEvents = self.__initialRaidlog
 
         super(BaseClanDungeonChannelManager, self).__init__(parent, 
@@ -89,23 +94,26 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
     
     def _moduleInitData(self):
         """ The initData here is the last read raid log events. """
-        d = self._filterEvents(self.lastEvents)
+        d = self._indexedEvents(self.lastEvents)
         d['event-db'] = self._logEntryDb
         return d
 
 
     
+    # the raid log is stored as a read-only snapshot (see 
+    # cwbot.common.frozen), so it is shared instead of copied
     @property
     def lastEvents(self):
         """ get the last-read events """
         with self.__eventLock:
-            return copy.deepcopy(self.__lastEvents)
+            return self.__lastEvents
     
     
     @lastEvents.setter
     def lastEvents(self, val):
+        val = freeze(val)
         with self.__eventLock:
-            self.__lastEvents = copy.deepcopy(val)
+            self.__lastEvents = val
     
             
     @lastEvents.deleter
@@ -114,18 +122,21 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
             del self.__lastEvents
 
 
-    def _getRaidLog(self, noThrow=True, force=False):
-        """ Access the raid log and store it locally """
+    def _getRaidLog(self, noThrow=True, force=False, refresh=False):
+        """ Access the raid log and store it locally. If refresh is True,
+        a raid log that was read in the last few seconds is not reused. """
         with self.__raidlogDownloadLock:
             if not self.__initialized and not force:
                 return self.lastEvents
             self._log.debug("Reading clan raid logs...")   
             rl = ClanRaidLogRequest(self.session)
+            rl.forceRefresh = force or refresh
             result = tryRequest(rl, nothrow=noThrow, numTries=5, 
                                 initialDelay=0.5, scaleFactor=2)
             if result is None:
                 self._log.warning("Could not read clan raid logs.")
                 return self.lastEvents
+            result = freeze(result)
             with self._syncLock:
                 self._raiseEvent("new_raid_log", None, LogDict(result))
             return result
@@ -136,7 +147,7 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
         process_log extended call of each module. """
         with self.__raidlogDownloadLock:
             if time.time() - self._lastEventCheck >= self.delay or force:
-                result = self._getRaidLog()
+                result = self._getRaidLog(refresh=force)
                 return result
             return self.lastEvents
 
@@ -156,7 +167,7 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
             else:
                 evts = self.lastEvents
             with self.__eventLock:
-                raidlog = self._filterEvents(evts)        
+                raidlog = self._indexedEvents(evts)        
                 with self._syncLock:
                     txt = msg['text']
                     for m in self._modules:
@@ -196,8 +207,8 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
     def _eventCallback(self, eData):
         MultiChannelManager._eventCallback(self, eData)
         if eData.subject == "new_raid_log":
-            raidlog = dict((k,v) for k,v in eData.data.items())
-            self.lastEvents = raidlog
+            self.lastEvents = eData.data
+            raidlog = self.lastEvents
             if not self.__initialized:
                 return
             self._notifyModulesOfNewRaidLog(raidlog)
@@ -217,7 +228,7 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
             with self._syncLock:
                 self._log.debug("{} received new log".format(self.identity))
                 self._lastEventCheck = time.time()
-                filteredLog = self._filterEvents(raidlog)
+                filteredLog = self._indexedEvents(raidlog)
                 self._handleNewRaidlog(filteredLog)
                 for m in self._modules:
                     mod = m.module
@@ -225,11 +236,40 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
                 self._syncState()
                 
                 
+    def _indexedEvents(self, raidlog):
+        """ Filter the raid log and replace its event list with an 
+        EventList, which is indexed by db-match values for the modules. 
+        The aggregate queries of all modules are evaluated here, in one
+        pass over the events. 
+        
+        Raid logs are read-only snapshots, so the indexed log is built once 
+        per snapshot and reused until the raid log is refreshed. Copies of a
+        snapshot (such as the LogDict sent with new_raid_log) share its 
+        event tuple, which identifies the snapshot. A new dict is returned 
+        each time, so callers may add entries to it. """
+        with self.__eventLock:
+            lastEvents, indexed = self.__indexed
+            if raidlog['events'] is not lastEvents or indexed is None:
+                indexed = self._filterEvents(raidlog)
+                indexed['events'] = EventList(indexed['events'])
+                self.__indexed = (raidlog['events'], indexed)
+            queries = set()
+            for m in self._modules:
+                queries.update(getattr(m.module, 'aggregateQueries', 
+                                       {}).values())
+            # already-evaluated queries are cached by the EventList
+            indexed['events'].aggregate(queries)
+            return dict(indexed)
+    
+    
     def _dbMatchRaidLog(self, raidlog):
+        """ Get a copy of the raid log, where each event has a 'db-match'
+        entry. The raid log itself is not modified. """
         try:
             eventList = []
             for e in raidlog['events']:
-                e['db-match'] = {}
+                e = dict(e)
+                e['db-match'] = _noMatch
                 for dbEntry in self._logEntryDb:
                     if dbEntry['category'].strip() == e['category']:
                         if re.search(dbEntry['regex'], e['event']):
@@ -242,9 +282,10 @@ class BaseClanDungeonChannelManager(MultiChannelManager):
                                                .format(e['event'],
                                                        e['db-match']['regex'],
                                                        dbEntry['regex']))
-                eventList.append(e)
-            raidlog['events'] = eventList
-            return raidlog
+                eventList.append(FrozenDict(e))
+            d = dict(raidlog)
+            d['events'] = eventList
+            return d
         except Exception:
             print(raidlog)
             raise
@@ -11,6 +11,7 @@ from cwbot.util.importClass import easyImportClass
 from cwbot.sys.eventSubsystem import EventSubsystem
 from cwbot.sys.heartbeatSubsystem import HeartbeatSubsystem
 from cwbot.sys.database import encode
+from cwbot.kolextra.manager.DisplayCaseManager import DisplayCaseManager
 
 
 class ManagerMetaClass(abc.ABCMeta):
@@ -337,6 +338,12 @@ class BaseManager(EventSubsystem.EventCapable,
         return self._invMan
     
     
+    @property
+    def displayCaseManager(self):
+        """ Get the current DisplayCaseManager """
+        return DisplayCaseManager.forSession(self._s)
+    
+    
     @property
     def chatManager(self):
         return self._c
@@ -390,6 +397,21 @@ class BaseManager(EventSubsystem.EventCapable,
         return []
     
     
+    def kmailStateItems(self):
+        """ Get the module state rows (see Database.encodeState) that must
+        be committed together with the responses to the kmails processed
+        since the last commit, or None if processing those kmails did not
+        change this manager's state. The CommunicationDirector calls this
+        when it commits a group of kmails, and then calls 
+        kmailStateCommitted() once they are saved. """
+        return None
+    
+    
+    def kmailStateCommitted(self):
+        """ Called after the rows from kmailStateItems() are committed. """
+        pass
+    
+    
     def kmailFailed(self, module, message, exception):
         """ This is called by the CommunicationDirector if a kmail fails 
         to send for some reason. """
@@ -1,3 +1,4 @@
+import time
 from cwbot.kolextra.manager.MailboxManager import MailboxManager
 from cwbot.managers.BaseManager import BaseManager
 from cwbot.common.kmailContainer import KmailResponse, Kmail
@@ -15,6 +16,7 @@ class MessageManager(BaseManager):
         """ Initialize the MessageManager """
         self._channelName = None
         self._showChatHelpMessage = None
+        self._kmailDirty = False
         super(MessageManager, self).__init__(parent, name, iData, config)
         self._mail = MailboxManager(self._s)
         self._chatChannel = None
@@ -75,7 +77,9 @@ class MessageManager(BaseManager):
                 self._log.debug("Module {} responded to kmail."
                                 .format(mod.id))
                 break # do not continue to "lower" modules
-        self._syncState(True) # force a sync here
+        # the state is saved with the responses (see kmailStateItems)
+        with self._syncLock:
+            self._kmailDirty = True
         return responses
     
     
@@ -105,6 +109,35 @@ class MessageManager(BaseManager):
         return [KmailResponse(self, self, Kmail(uid, txt))]
 
 
+    def kmailStateItems(self):
+        """ The state of all modules is committed with the kmails that 
+        changed it. """
+        with self._syncLock:
+            if not self._kmailDirty or self._persist is None:
+                return None
+            for m in self._modules:
+                mod = m.module
+                self._persist[mod.id] = mod.state
+            return self._db.encodeState(self.identity, self._persist)
+        
+        
+    def kmailStateCommitted(self):
+        with self._syncLock:
+            self._kmailDirty = False
+            self._lastSync = time.time()
+            
+            
+    def _syncState(self, force=False):
+        """ A periodic sync is skipped while there are processed kmails that 
+        have not been committed yet. Otherwise, a crash before the commit 
+        would leave the kmails to be processed again on top of the state 
+        that already includes them. """
+        with self._syncLock:
+            if self._kmailDirty and not force:
+                return
+            super(MessageManager, self)._syncState(force)
+
+
     def parseKmail(self, message):
         """ Process a Kmail. This function is called by the
         CommunicationDirector every time a Kmail is received. """
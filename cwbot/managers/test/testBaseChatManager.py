@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+import unittest
+from collections import namedtuple
+from cwbot.managers.BaseManager import BaseManager
+from cwbot.managers.BaseChatManager import BaseChatManager
+from cwbot.modules.general.ChatLogModule import ChatLogModule
+from cwbot.modules.general.FaxModule import FaxModule
+from cwbot.modules.general.FaxModule2 import FaxModule2, _FaxState
+from cwbot.modules.test.MockChatManager import MockChatManager
+
+
+_Entry = namedtuple("_Entry", ["module", "permission", "clanOnly"])
+
+
+class _ChatManager(BaseChatManager):
+    """ A BaseChatManager that routes chats to the given modules, without
+    a session, database or configuration. It uses the subsystems of the
+    modules' mock manager. """
+    capabilities = ['chat']
+
+    def __init__(self, mock, modules):
+        super(BaseManager, self).__init__(name="sys.testchatmanager",
+                                          identity="testchatmanager",
+                                          evSys=mock.eventSubsystem,
+                                          hbSys=mock.heartbeatSubsystem)
+        self._log = logging.getLogger("testchatmanager")
+        self._log.propagate = False
+        self._log.setLevel(logging.CRITICAL)
+        self._commandStats = {}
+        self._statsLock = threading.Lock()
+        self._modules = [_Entry(m, None, False) for m in modules]
+        self._buildRoutes()
+
+    def processChat(self, msg):
+        return self._processChat(msg, 0)
+
+
+class _ChatLogModule(ChatLogModule):
+    """ Keeps the chat log in memory instead of writing log files. """
+    requiredCapabilities = ['chat']
+    _name = "chatlog"
+
+    def logChat(self, message, delaySeconds=0):
+        self._chatlog.append(message)
+
+
+class _FaxModule(FaxModule):
+    """ Does not look in the clan log for the last fax. """
+    requiredCapabilities = ['chat']
+    _name = "fax"
+
+    def updateLastFax(self):
+        return None
+
+
+class Test(unittest.TestCase):
+    """ Chats that are not commands reach the modules that accept all
+    chats. """
+
+    def setUp(self):
+        self.mock = MockChatManager()
+
+    def tearDown(self):
+        self.mock.cleanup()
+
+    def addModule(self, module):
+        self.mock.addModule(module, module.initialState)
+        return module
+
+    def testChatIsLogged(self):
+        chatlog = self.addModule(_ChatLogModule(self.mock, "chatlog", {}))
+        manager = _ChatManager(self.mock, [chatlog])
+        msg = {'type': 'normal', 'channel': "clan", 'userId': 1,
+               'userName': "Player", 'text': "hello"}
+        self.assertEqual(manager.processChat(msg), [])
+        self.assertEqual(chatlog._chatlog, [msg])
+
+    def testFaxbotMessage(self):
+        fax = self.addModule(_FaxModule(self.mock, "fax", {}))
+        chatlog = self.addModule(_ChatLogModule(self.mock, "chatlog", {}))
+        manager = _ChatManager(self.mock, [fax, chatlog])
+        msg = {'type': 'private', 'userId': fax.faxbot_uid,
+               'userName': "FaxBot",
+               'text': "I do not understand your request."}
+        self.assertEqual(manager.processChat(msg), [])
+        chats = [op['text'] for op in self.mock.operations
+                 if op['type'] == 'chat']
+        self.assertEqual(len(chats), 1)
+        self.assertTrue(chats[0].startswith("FaxBot does not have"))
+        # PMs are not logged
+        self.assertEqual(chatlog._chatlog, [])
+
+    def testFaxbot2Message(self):
+        fax = self.addModule(FaxModule2(self.mock, "fax", {}))
+        manager = _ChatManager(self.mock, [fax])
+        fax._faxState = _FaxState(requestTime=time.time(), requestId=1000)
+        msg = {'type': 'private', 'userId': 1000, 'userName': "faustbot",
+               'text': "Your fax has been delivered."}
+        self.assertEqual(manager.processChat(msg), [])
+        self.assertEqual(fax._faxReply, msg['text'])
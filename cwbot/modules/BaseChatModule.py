@@ -10,6 +10,10 @@ class BaseChatModule(BaseModule):
     requiredCapabilities = []
     _name = ""
     
+    # set to True in derived classes that need to see every chat, including
+    # chats that are not commands and commands not in _availableCommands()
+    acceptsAllChats = False
+    
     
     def __init__(self, manager, identity, config):
         super(BaseChatModule, self).__init__(manager, identity, config)
@@ -21,9 +25,9 @@ class BaseChatModule(BaseModule):
     def _processCommand(self, message, cmd, args):
         """
         Process chat commands (chats which start with !).
-        If the module is not set as clan-only, all chats will be sent to this
-        function. If it is clan-only, only commands matching those in
-        _availableCommands() are sent here.
+        Only commands matching those in _availableCommands() are sent here,
+        unless acceptsAllChats is True, in which case all chats will be sent
+        to this function (cmd is None for chats that are not commands).
         
         The derived class should process those that apply and ignore the 
         others. 'message' contains the full message structure as defined by
@@ -44,5 +48,7 @@ class BaseChatModule(BaseModule):
     def _availableCommands(self):
         """ Return a dict of available commands. Entries should be in the form
         "command": "text that is shown for help". To keep a command hidden,
-        use the format "command": None. """
+        use the format "command": None. Every command (and alias) that
+        _processCommand() handles must be listed here, or the manager will 
+        not route it to this module. """
         return {}
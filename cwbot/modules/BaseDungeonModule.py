@@ -1,5 +1,6 @@
 import re
 from cwbot.modules.BaseChatModule import BaseChatModule
+from cwbot.common.eventList import EventList
 
 __compiled = {}
 
@@ -12,6 +13,8 @@ def eventFilter(events, *text):
     """
     regexText = '|'.join(text)
     regex = __compiled.setdefault(regexText, re.compile(regexText))
+    if isinstance(events, EventList):
+        return events.filter(regex)
     return (e for e in events if regex.search(e['event']) is not None)
 
 
@@ -20,13 +23,16 @@ def eventDbMatch(events, *categoryDicts):
     This function is often used in dungeon module parsing. It returns a 
     generator that returns log entries that have an event that matches 
     any of the dictionaries passed in. It is used so commonly that this 
-    function is very convenient. Regexes are automatically compiled and 
-    cached.
+    function is very convenient. If events is an EventList (as supplied
+    by the dungeon managers), its index is used instead of a full scan.
     """
-    sets = [set(d.items()) for d in categoryDicts]
+    if isinstance(events, EventList):
+        return events.dbMatch(*categoryDicts)
+    itemLists = [d.items() for d in categoryDicts]
     return (e for e in events 
-            if any(s.issubset(set(e['db-match'].items()))
-                   for s in sets))
+            if any(all(k in e['db-match'] and e['db-match'][k] == v
+                       for k,v in items)
+                   for items in itemLists))
 
     
 class BaseDungeonModule(BaseChatModule):
@@ -40,6 +46,11 @@ class BaseDungeonModule(BaseChatModule):
     """
     requiredCapabilities = []
     _name = None
+    
+    # name -> aggregate query (see cwbot.common.logQueries). The dungeon
+    # manager evaluates the queries of all its modules in one pass when the
+    # raid log is read; get the results with self.aggregates(raidlog).
+    aggregateQueries = {}
 
     
     def __init__(self, manager, identity, config):
@@ -54,6 +65,17 @@ class BaseDungeonModule(BaseChatModule):
     def _dungeonActive(self):
         """ Is dungeon alive? """
         return self.parent.active()
+    
+    
+    def aggregates(self, raidlog):
+        """ Get a dict of name -> result for this module's aggregateQueries
+        over the events of the raid log. """
+        events = raidlog['events']
+        if not isinstance(events, EventList):
+            events = EventList(events)
+        queries = self.aggregateQueries
+        results = events.aggregate(queries.values())
+        return dict((name, results[q]) for name,q in queries.items())
 
 
 #####################################
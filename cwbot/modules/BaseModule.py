@@ -149,6 +149,11 @@ class BaseModule(EventSubsystem.EventCapable,
         """Get the inventory manager"""
         return self.parent.inventoryManager
 
+    @property
+    def displayCaseManager(self):
+        """Get the display case manager"""
+        return self.parent.displayCaseManager
+
 
     # logging
     
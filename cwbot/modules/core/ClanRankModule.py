@@ -18,6 +18,7 @@ from cwbot.kolextra.request.RemovePlayerFromClanWhitelistRequest \
 from kol.request.BootClanMemberRequest import BootClanMemberRequest
 from cwbot.common.exceptions import FatalError
 from kol.request.StatusRequest import StatusRequest
+from kol.RequestScheduler import BACKGROUND
 from cwbot.util.textProcessing import toTypeOrNone, stringToBool, stringToList
 from cwbot.common.kmailContainer import Kmail
 
@@ -105,6 +106,13 @@ class ClanRankModule(BaseModule):
         super(ClanRankModule, self).__init__(manager, identity, config)
         
         
+    def tryRequest(self, request, *args, **kwargs):
+        """ Rank scans are maintenance tasks, so they yield to chat, kmail
+        and dungeon requests. """
+        kwargs.setdefault('priority', BACKGROUND)
+        return super(ClanRankModule, self).tryRequest(request, *args, **kwargs)
+        
+        
     def _configure(self, config):
         self._daysUntilBoot = int(config.setdefault('boot_after_days', 180))
         safeRanks = stringToList(config.setdefault('safe_ranks',
@@ -113,5 +113,6 @@ class DreadChoicesModule(BaseDungeonModule):
     def _availableCommands(self):
         return {'choices': "!choices: Display the Dreadsylvania choice "
                            "adventures that are still available to you "
-                           "(or another player with !choices PLAYERNAME)."}
+                           "(or another player with !choices PLAYERNAME).",
+                'choice': None}
     
\ No newline at end of file
@@ -64,5 +64,6 @@ class DreadKeyModule(BaseDungeonModule):
         
                 
     def _availableCommands(self):
-        return {'keys': "!keys: Show which Dreadsylvanian areas are unlocked."}
+        return {'keys': "!keys: Show which Dreadsylvanian areas are unlocked.",
+                'key': None, 'locked': None, 'unlocked': None}
     
\ No newline at end of file
@@ -75,5 +75,6 @@ class DreadKillsModule(BaseDungeonModule):
     def _availableCommands(self):
         return {'kills': "!kills: Display how many monsters you have killed "
                          "in this Dreadsylvania instance. "
-                         "(or another player with !kills PLAYERNAME)."}
+                         "(or another player with !kills PLAYERNAME).",
+                'killed': None}
     
\ No newline at end of file
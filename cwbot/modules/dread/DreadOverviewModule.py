@@ -1,7 +1,7 @@
-from cwbot.modules.BaseDungeonModule import (BaseDungeonModule, eventFilter,
-                                             eventDbMatch)
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
 from cwbot.util.textProcessing import stringToList
 from cwbot.common.exceptions import FatalError
+from cwbot.common.logQueries import SumTurns, AnyEvent
 from math import log
 
 def dreadPercent(n):
@@ -10,6 +10,24 @@ def dreadPercent(n):
     return "{}%".format(max(0, min(99, int(n/10))))
 
 
+def _overviewQueries(monsters, plurals, areas):
+    prefix = r'defeated\s+(?:hot|cold|spooky|stench|sleaze)\s+'
+    prefixDef = r'was defeated by\s+(?:hot|cold|spooky|stench|sleaze)\s+'
+    queries = {}
+    for monster in monsters:
+        queries['kills', monster] = SumTurns(prefix + monster)
+        queries['defeats', monster] = SumTurns(prefixDef + monster)
+        queries['banished', monster] = SumTurns("drove some " 
+                                                + plurals[monster])
+    for i,a in enumerate(["forest", "village", "castle"]):
+        queries['less', i] = SumTurns("made the " + a + " less")
+    for i,area in enumerate(areas):
+        queries['done', i] = AnyEvent({'category': area, 
+                                       'zone': "(combat)",
+                                       'subzone': "boss"})
+    return queries
+
+
 class DreadOverviewModule(BaseDungeonModule):
     """ 
     Displays an overview of Dreadsylvania.
@@ -34,6 +52,7 @@ class DreadOverviewModule(BaseDungeonModule):
                 'zombie': "zombies", 'ghost': "ghosts",
                 'vampire': "vampires", 'skeleton': "skeletons"}
     _areas = ["The Woods", "The Village", "The Castle"]
+    aggregateQueries = _overviewQueries(_monsters, _plurals, _areas)
     
     def __init__(self, manager, identity, config):
         self._done = None
@@ -240,11 +259,8 @@ class DreadOverviewModule(BaseDungeonModule):
 
     def _processLog(self, raidlog):
         events = raidlog['events']
-        self._done = [any(eventDbMatch(events, 
-                                       {'category': self._areas[i], 
-                                        'zone': "(combat)",
-                                        'subzone': "boss"}))
-                      for i in range(3)]
+        agg = self.aggregates(raidlog)
+        self._done = [agg['done', i] for i in range(3)]
         self._drunk = raidlog['dread']['drunkenness']
         
         newKilled = [raidlog['dread'].get('forest', 0),
@@ -266,18 +282,10 @@ class DreadOverviewModule(BaseDungeonModule):
         self._banished = {} 
         self._kills = {}      
         self._defeats = {}  
-        prefix = r'defeated\s+(?:hot|cold|spooky|stench|sleaze)\s+'
-        prefixDef = r'was defeated by\s+(?:hot|cold|spooky|stench|sleaze)\s+'
         for monster in self._monsters:
-            self._kills[monster] = (
-                sum(e['turns'] for e in eventFilter(events, 
-                                                    prefix + monster)))
-            self._defeats[monster] = (
-                sum(e['turns'] for e in eventFilter(events, 
-                                                    prefixDef + monster)))
-            self._banished[monster] = (
-                sum(e['turns'] for e in eventFilter(events,
-                            "drove some " + self._plurals[monster])))
+            self._kills[monster] = agg['kills', monster]
+            self._defeats[monster] = agg['defeats', monster]
+            self._banished[monster] = agg['banished', monster]
             
         # do likelihood ratio test to determine which monsters are more
         # populous
@@ -287,10 +295,7 @@ class DreadOverviewModule(BaseDungeonModule):
                              - self._kills[self._monsters[2*i+1]])
                          for i in range(3)}
         
-        self._level = [1 + sum(e['turns'] 
-                               for e in eventFilter(events, 
-                                                    "made the " + a + " less"))
-                       for a in ["forest", "village", "castle"]]
+        self._level = [1 + agg['less', i] for i in range(3)]
         
         self._kisses = raidlog['dread'].get('kisses', 0)
         
@@ -378,5 +383,6 @@ class DreadOverviewModule(BaseDungeonModule):
                 
                 
     def _availableCommands(self):
-        return {'status': "!status: Display an overview of Dreadsylvania."}
+        return {'status': "!status: Display an overview of Dreadsylvania.",
+                'dread': None, 'dreadsylvania': None, 'summary': None}
     
\ No newline at end of file
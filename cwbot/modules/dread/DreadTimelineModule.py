@@ -4,7 +4,6 @@ from cwbot.common.kmailContainer import Kmail
 from cwbot.kolextra.request.UserProfileRequest import UserProfileRequest
 import pytz
 from copy import deepcopy
-import itertools
 from collections import defaultdict
 import datetime
 import time
@@ -23,6 +22,12 @@ def _nameKey(x):
     return "".join(x.split()).strip().lower()
 
 
+def _dbKey(dbm):
+    """ Get a stable key for a dread.csv entry that can be stored in the
+    module state. """
+    return "{}|{}".format(dbm['category'].strip(), dbm['regex'])
+
+
 _maxLen = 33
 _format = "{:33}{:33}{:33}"
 _areas = {0: 'The Woods', 1: 'The Village', 2: 'The Castle'}
@@ -38,6 +43,8 @@ class DreadTimelineModule(BaseDungeonModule):
     
     def __init__(self, manager, identity, config):
         self._snapshots = None
+        self._totals = None
+        self._dbByKey = None
         self._lastComplete = None
         self._lastRaidlog = None
         self._apikey = None
@@ -50,7 +57,12 @@ class DreadTimelineModule(BaseDungeonModule):
         
     def initialize(self, state, initData):
         self._db = initData['event-db']
-        self._snapshots = state['snapshots']
+        self._dbByKey = dict((_dbKey(dbm), dbm) for dbm in self._db)
+        self._snapshots = [self._compactSnapshot(snapshot) 
+                           for snapshot in state['snapshots']]
+        self._totals = defaultdict(int)
+        for snapshot in self._snapshots:
+            self._addToTotals(snapshot)
         self._lastComplete = state['last']
         pastes = state.get('pastes', {})
         self._pastes = {k: v for k,v in pastes.items()
@@ -79,8 +91,8 @@ class DreadTimelineModule(BaseDungeonModule):
 
     def _processLog(self, raidlog):
         with self._timelineLock:
-            events = deepcopy(raidlog['events'])
-            self._lastRaidlog = deepcopy(raidlog)
+            events = raidlog['events']
+            self._lastRaidlog = dict(raidlog)
             dvid = raidlog.get('dvid')
             if not self._dungeonActive():
                 if dvid is not None and str(dvid) not in self._pastes:
@@ -93,56 +105,77 @@ class DreadTimelineModule(BaseDungeonModule):
             roundedKilled = map(lambda x: (x // 50) * 50, killed)
             if roundedKilled > self._lastComplete:
                 self._lastComplete = roundedKilled
-                self._snapshots.append(self._getNewEvents(events))
+                newSnapshot = self._getNewEvents(events)
+                self._snapshots.append(newSnapshot)
+                self._addToTotals(newSnapshot)
             return True
     
     
+    # snapshots are stored as compact deltas. Each snapshot is a list of
+    # [userId, dbKey, turns, eventText] entries, where turns is the number
+    # of turns for that (player, db entry) pair since the previous
+    # snapshot. self._totals holds the cumulative turns of all snapshots,
+    # keyed by (userId, dbKey).
+    def _compactSnapshot(self, snapshot):
+        """ Convert a snapshot stored as a list of full events (the old 
+        state format) to a list of deltas. Delta lists are unchanged. """
+        compacted = []
+        for entry in snapshot:
+            if isinstance(entry, dict):
+                entry = [entry['userId'], _dbKey(entry['db-match']),
+                         entry['turns'], entry['event']]
+            if entry[1] in self._dbByKey:
+                compacted.append(entry)
+        return compacted
+    
+    
+    def _addToTotals(self, snapshot):
+        for uid, dbKey, turns, _event in snapshot:
+            self._totals[(uid, dbKey)] += turns
+    
+    
+    def _expandSnapshot(self, snapshot):
+        """ Convert a list of deltas back to a list of events """
+        return [{'userId': uid, 
+                 'turns': turns, 
+                 'event': event, 
+                 'db-match': self._dbByKey[dbKey]}
+                for uid, dbKey, turns, event in snapshot]
+    
+    
     def _getNewEvents(self, events):
         t1 = time.time()
-
-        newEvents = []
         
-        # first, get a list of all db entries and players
-        dbEntries = []
-        players = set()
+        # sum the turns of each (player, db entry) pair in one pass
+        eventTotals = defaultdict(int)
+        eventText = {}
         for e in events:
-            if e['db-match'] not in dbEntries:
-                dbEntries.append(e['db-match'])
-            players.add(e['userId'])
-                
-        # now, loop over all players and db entries
-        for dbm in dbEntries:
+            dbm = e['db-match']
             
             # skip unmatched events
             if not dbm:
                 continue
-            
-            matchingDoneEvents = list(eventDbMatch(
-                                    itertools.chain.from_iterable(
-                                                self._snapshots), dbm))
-            matchingNewEvents = list(eventDbMatch(events, dbm))
-            for uid in players:
-                matchesUser = lambda x: x['userId'] == uid
-                playerEvents = filter(matchesUser, matchingNewEvents)
-                doneEvents = filter(matchesUser, matchingDoneEvents)
-                playerTotalEvents = sum(pe['turns'] for pe in playerEvents)
-                doneTotalEvents = sum(de['turns'] for de in doneEvents)
-                eventDiff = playerTotalEvents - doneTotalEvents
-                if eventDiff < 0:
-                    self._log.warn("Snapshot: {}\nevents: {}"
-                                   .format(self._snapshots, events))
-                    raise RuntimeError("Error: detected {} events but "
-                                       "{} in snapshot for user {} and "
-                                       "db entry {}"
-                                       .format(playerTotalEvents,
-                                               doneTotalEvents,
-                                               uid,
-                                               dbm))
-
-                if eventDiff > 0:
-                    newEvent = deepcopy(playerEvents[0])
-                    newEvent['turns'] = eventDiff
-                    newEvents.append(newEvent)
+            key = (e['userId'], _dbKey(dbm))
+            eventTotals[key] += e['turns']
+            eventText.setdefault(key, e['event'])
+        
+        # now subtract the turns that are already in a snapshot
+        newEvents = []
+        for key, playerTotalEvents in eventTotals.items():
+            doneTotalEvents = self._totals.get(key, 0)
+            eventDiff = playerTotalEvents - doneTotalEvents
+            if eventDiff < 0:
+                self._log.warn("Snapshot: {}\nevents: {}"
+                               .format(self._snapshots, events))
+                raise RuntimeError("Error: detected {} events but "
+                                   "{} in snapshot for user {} and "
+                                   "db entry {}"
+                                   .format(playerTotalEvents,
+                                           doneTotalEvents,
+                                           key[0],
+                                           key[1]))
+            if eventDiff > 0:
+                newEvents.append([key[0], key[1], eventDiff, eventText[key]])
         self.debugLog("Built new DB entries in {} seconds"
                       .format(time.time() - t1))
         return newEvents
@@ -180,8 +213,8 @@ class DreadTimelineModule(BaseDungeonModule):
         timelineKills = [0,0,0]
         newEvents = self._getNewEvents(events)
         t1 = time.time()
-        snapshots = deepcopy(self._snapshots)
-        snapshots.append(newEvents)
+        snapshots = [self._expandSnapshot(snapshot) 
+                     for snapshot in self._snapshots + [newEvents]]
         for snapshot in snapshots:
             timelineText = []
             for area in range(3):
@@ -409,5 +442,6 @@ class DreadTimelineModule(BaseDungeonModule):
         
     def _availableCommands(self):
         return {'timeline': "!timeline: Show a timeline of the Dreadsylvania "
-                            "instance."}
+                            "instance.",
+                'timelines': None}
     
\ No newline at end of file
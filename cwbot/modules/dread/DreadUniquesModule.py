@@ -194,5 +194,6 @@ class DreadUniquesModule(BaseDungeonModule):
                 
     def _availableCommands(self):
         return {'uniques': "!uniques: Show which Dreadsylvanian unique items "
-                            "are still available."}    
+                            "are still available.",
+                'unique': None, 'pencil': None, 'pencils': None}    
         
\ No newline at end of file
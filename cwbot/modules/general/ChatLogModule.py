@@ -28,6 +28,8 @@ class ChatLogModule(BaseChatModule):
     
     requiredCapabilities = ['chat']
     _name = "chatlog"
+    # every public chat is logged, not just commands
+    acceptsAllChats = True
     
     def __init__(self, manager, identity, config):
         self._clanOnly = []
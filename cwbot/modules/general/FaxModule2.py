@@ -13,6 +13,7 @@ from collections import defaultdict, namedtuple, deque
 from fuzzywuzzy import fuzz #@UnresolvedImport
 from cwbot.modules.BaseChatModule import BaseChatModule
 import kol.util.Report
+from kol.RequestScheduler import BACKGROUND
 #from kol.request.ClanLogRequest import ClanLogRequest, CLAN_LOG_FAX
 from cwbot.kolextra.request.ClanLogPartialRequest import \
                             ClanLogPartialRequest, CLAN_LOG_FAX
@@ -98,6 +99,8 @@ class FaxModule2(BaseChatModule):
         
     requiredCapabilities = ['chat']
     _name = "fax"
+    # PMs from the fax bots are not commands
+    acceptsAllChats = True
     
     __lock = threading.RLock()
     _faxWait = 60
@@ -271,9 +274,9 @@ class FaxModule2(BaseChatModule):
             # suppress annoying output from pyKol
             kol.util.Report.removeOutputSection("*")
             try:
-                r = ClanLogPartialRequest(self.session)
+                r = ClanLogPartialRequest(self.session, types=[CLAN_LOG_FAX])
                 log = self.tryRequest(r, numTries=5, initialDelay=0.25, 
-                                      scaleFactor=1.5)
+                                      scaleFactor=1.5, priority=BACKGROUND)
             finally:
                 kol.util.Report.addOutputSection("*")
             faxEvents = [event for event in log['entries'] 
@@ -1,5 +1,4 @@
 from cwbot.modules.BaseChatModule import BaseChatModule
-from cwbot.kolextra.request.GetDisplayCaseRequest import GetDisplayCaseRequest
 
 
 class HookahInfoModule(BaseChatModule):
@@ -28,13 +27,10 @@ class HookahInfoModule(BaseChatModule):
 
     def _processCommand(self, unused_message, cmd, args):
         if cmd == "hookah":
-            r = GetDisplayCaseRequest(self.session)
-            inventory = self.tryRequest(r)['items']
+            itemDict = self.displayCaseManager.displayCase()
             
             # get list of quantities
             hookahItems = [4510,4511,4515,4516,4512,4513] 
-            itemDict = dict((it['id'], it['quantity']) for it in inventory 
-                             if it['id'] in hookahItems)
             itemQty = [itemDict.get(iid, 0) for iid in hookahItems]
             
             # deduct one for save last option
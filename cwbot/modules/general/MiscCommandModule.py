@@ -51,6 +51,7 @@ class MiscCommandModule(BaseChatModule):
         return None
 
 
-    def availableCommands(self):
-        return {'crash': None, 'kill': None, 'uptime': None, 'charter': None}
+    def _availableCommands(self):
+        return {'crash': None, 'kill': None, 'uptime': None, 'charter': None,
+                'spoiler': None, 'spoilers': None}
 
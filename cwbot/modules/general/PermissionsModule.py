@@ -27,6 +27,6 @@ class PermissionsModule(BaseChatModule):
         return None
 
 
-    def availableCommands(self):
+    def _availableCommands(self):
         return {'permissions': "!permissions: show your permissions list."}
 
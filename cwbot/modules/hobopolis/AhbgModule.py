@@ -1,6 +1,7 @@
 import math
 import re
 from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.common.logQueries import SumTurns, AnyEvent
 
 def killPercent(n):
     return int(max(0, min(99, 100*n / 500.0)))
@@ -18,6 +19,16 @@ class AhbgModule(BaseDungeonModule):
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "burial"
     
+    aggregateQueries = {
+        'flimflams': SumTurns({'ahbg_code': "flimflam"}),
+        'dances': SumTurns({'ahbg_code': "dance"}),
+        'watches': SumTurns({'ahbg_code': "watch"}),
+        'fails': SumTurns({'ahbg_code': "fail"}),
+        'kills': SumTurns({'ahbg_code': "combat"}),
+        'tombs': SumTurns({'ahbg_code': "tomb"}),
+        'done': AnyEvent({'ahbg_code': "boss"}),
+        'open': AnyEvent({'category': "The Ancient Hobo Burial Ground"})}
+    
     # approximate values of dances. computed from a collection of logs
     # using a least-squares linear regression
     danceVals = [1.0, 
@@ -74,6 +85,7 @@ class AhbgModule(BaseDungeonModule):
 
     def _processLog(self, raidlog):
         events = raidlog['events']
+        agg = self.aggregates(raidlog)
         # first: check number of dances available 
         #        = 5 * flim-flams - dances so far
         # also see who has danced so far.
@@ -82,15 +94,8 @@ class AhbgModule(BaseDungeonModule):
         self._dances = {w['userName']: w['turns']
                          for w in eventDbMatch(events, {'ahbg_code': "dance"})}
 
-        self._availableDances = (
-                5 * sum(f['turns'] for f in eventDbMatch(
-                    events, {'ahbg_code': "flimflam"}))
-                -   sum(f['turns'] for f in eventDbMatch(
-                    events, {'ahbg_code': "dance"}))
-                -   sum(f['turns'] for f in eventDbMatch(
-                    events, {'ahbg_code': "watch"}))
-                -   sum(f['turns'] for f in eventDbMatch(
-                    events, {'ahbg_code': "fail"})))
+        self._availableDances = (5 * agg['flimflams'] - agg['dances']
+                                 - agg['watches'] - agg['fails'])
 
         # any player in hobopolis is added to watch list             
         for hoboplayer in set(item['userName'] for item in events 
@@ -98,17 +103,12 @@ class AhbgModule(BaseDungeonModule):
             if hoboplayer not in self._watches:
                 self._watches[hoboplayer] = 0
 
-        self._killed = (      
-                  sum(k['turns'] for k in eventDbMatch(
-                    events, {'ahbg_code': "combat",}))
-            - 9 * sum(t['turns'] for t in eventDbMatch(
-                    events, {'ahbg_code': "tomb"})))
+        self._killed = agg['kills'] - 9 * agg['tombs']
 
-        self._ahbgDone = any(eventDbMatch(events, {'ahbg_code': "boss"}))
+        self._ahbgDone = agg['done']
 
         if not self._open:
-            if any(eventDbMatch(events, {'category': 
-                                         "The Ancient Hobo Burial Ground"})): 
+            if agg['open']: 
                 self._open = True
         return True
 
@@ -1,4 +1,5 @@
 from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.common.logQueries import SumTurns, AnyEvent
 
 
 def killPercent(n):
@@ -45,6 +46,10 @@ class BurnbarrelModule(BaseDungeonModule):
     """    
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "burnbarrel"
+    
+    aggregateQueries = {'kills': SumTurns({'bb_code': "combat"}),
+                        'doors': SumTurns({'bb_code': "door"}),
+                        'done': AnyEvent({'bb_code': "boss"})}
 
     def __init__(self, manager, identity, config):
         self._hobosKilled = None # hobos defeated - 8 * doors opened
@@ -157,17 +162,13 @@ class BurnbarrelModule(BaseDungeonModule):
     
     
     def _processLog(self, raidlog):
-        events = raidlog['events']
+        agg = self.aggregates(raidlog)
         #check hot hobos killed (negative for hot door opened)
         #  = defeated - 8 * hot doors opened        
-        self._hobosKilled = (
-                      sum(k['turns'] for k in eventDbMatch(
-                        events, {'bb_code': "combat"}))
-                - 8 * sum(d['turns'] for d in eventDbMatch(
-                        events, {'bb_code': "door"})))
+        self._hobosKilled = agg['kills'] - 8 * agg['doors']
 
         # if Ol' Scratch is dead, set burnbarrel to finished
-        self._bbDone = any(eventDbMatch(events, {'bb_code': "boss"}))
+        self._bbDone = agg['done']
                 
         if (self._hobosKilled > 0 or 
                 self._totalTires > 0 or 
@@ -1,6 +1,7 @@
 import re
 import time
 from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.common.logQueries import SumTurns
 
 
 
@@ -30,6 +31,8 @@ class CageModule(BaseDungeonModule):
     """
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "cage"
+    
+    aggregateQueries = {'rescues': SumTurns({'sewer_code': "rescue"})}
 
     def __init__(self, manager, identity, config):
         # name of the player in the cage right now 
@@ -173,9 +176,7 @@ class CageModule(BaseDungeonModule):
                 self.setEscaped()
                     
         # check sewer actions
-        newTotalFreed = sum(
-                f['turns'] for f in eventDbMatch(
-                    events, {'sewer_code': "rescue"}))
+        newTotalFreed = self.aggregates(raidlog)['rescues']
         if newTotalFreed > self._totalFreed and self.getCageState() == TRAPPED:
             self.setReleased(self.inCage)
         self._totalFreed = newTotalFreed
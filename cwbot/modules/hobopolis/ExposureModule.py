@@ -1,4 +1,5 @@
-from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule
+from cwbot.common.logQueries import SumTurns, AnyEvent
 
 
 def killPercent(n):
@@ -15,6 +16,13 @@ class ExposureModule(BaseDungeonModule):
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "exposure"
     
+    aggregateQueries = {'kills': SumTurns({'ee_code': "combat"}),
+                        'yodel0': SumTurns({'ee_code': "yodel0"}),
+                        'yodel1': SumTurns({'ee_code': "yodel1"}),
+                        'yodel2': SumTurns({'ee_code': "yodel2"}),
+                        'pipes': SumTurns({'ee_code': "pipe3"}),
+                        'done': AnyEvent({'ee_code': "boss"})}
+    
     def __init__(self, manager, identity, config):
         super(ExposureModule, self).__init__(manager, identity, config)
         self._exposureDone = False
@@ -72,27 +80,15 @@ class ExposureModule(BaseDungeonModule):
 
 
     def _processLog(self, raidlog):
-        events = raidlog['events']
+        agg = self.aggregates(raidlog)
         # hobos killed by non-yodels
         oldYodel = self._yodel
         oldPipes = self._pipes
         
-        self._killed = sum(
-                coldhobo['turns'] for coldhobo in eventDbMatch(
-                    events, {'ee_code': "combat"}))
-            
-        self._yodel = (
-                [sum(yodel0['turns'] for yodel0 in eventDbMatch(
-                    events, {'ee_code': "yodel0"})),
-                 sum(yodel1['turns'] for yodel1 in eventDbMatch(
-                    events, {'ee_code': "yodel1"})),
-                 sum(yodel2['turns'] for yodel2 in eventDbMatch(
-                    events, {'ee_code': "yodel2"}))])
-
-        self._pipes = sum(pipeevent['turns'] for pipeevent in eventDbMatch(
-                              events, {'ee_code': "pipe3"}))
-
-        self._exposureDone = any(eventDbMatch(events, {'ee_code': "boss"}))
+        self._killed = agg['kills']
+        self._yodel = [agg['yodel0'], agg['yodel1'], agg['yodel2']]
+        self._pipes = agg['pipes']
+        self._exposureDone = agg['done']
 
         if self._killed > 0 or self._pipes > 0 or sum(self._yodel) > 0:
             self._open = True
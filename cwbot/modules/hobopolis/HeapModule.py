@@ -1,4 +1,5 @@
-from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule
+from cwbot.common.logQueries import SumTurns, AnyEvent
 
 
 def killPercent(n):
@@ -26,6 +27,13 @@ class HeapModule(BaseDungeonModule):
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "heap"
     
+    aggregateQueries = {'dives': SumTurns({'heap_code': "dive"}),
+                        'kills': SumTurns({'heap_code': "combat"}),
+                        'trashcanos': SumTurns({'heap_code': "trashcano"}),
+                        'stench': SumTurns({'heap_code': "stench"}),
+                        'unstench': SumTurns({'heap_code': "unstench"}),
+                        'done': AnyEvent({'heap_code': "boss"})}
+    
     def __init__(self, manager, identity, config):
         # current heap stench lvl (negative is Oscus is dead, None if unknown)
         self._stench = None
@@ -42,7 +50,7 @@ class HeapModule(BaseDungeonModule):
 
         
     def initialize(self, state, initData):
-        events = initData['events']
+        agg = self.aggregates(initData)
         self._db = initData['event-db']
         self._chatStrings = {d['heap_code']: d['chat'] for d in self._db
                              if d['heap_code']}
@@ -52,16 +60,10 @@ class HeapModule(BaseDungeonModule):
         
         self._heapDone = False
         self._open = state['open']
-        self._numDives = sum(d['turns'] for d in eventDbMatch(
-                                 events, {'heap_code': "dive"}))
+        self._numDives = agg['dives']
 
-        self._totalStench = (
-                4 + sum(t['turns'] for t in eventDbMatch(
-                            events, {'heap_code': "trashcano"}))
-                  + sum(t['turns'] for t in eventDbMatch(
-                            events, {'heap_code': "stench"}))                             
-                  - sum(f['turns'] for f in eventDbMatch(
-                            events, {'heap_code': "unstench"})))
+        self._totalStench = (4 + agg['trashcanos'] + agg['stench'] 
+                               - agg['unstench'])
         self._initStench = self._totalStench
         self.log("OldDives: {}, NewDives: {}"
                  .format(state['dives'], self._numDives))
@@ -115,23 +117,15 @@ class HeapModule(BaseDungeonModule):
 
 
     def _processLog(self, raidlog):
-        events = raidlog['events']
+        agg = self.aggregates(raidlog)
         # check stench hobos killed
-        self._killed = (sum(stenchhobo['turns'] for stenchhobo in eventDbMatch(
-                                            events, {'heap_code': "combat"}))
-                        + 5 * sum(trash['turns'] for trash in eventDbMatch(
-                                        events, {'heap_code': "trashcano"})))
+        self._killed = agg['kills'] + 5 * agg['trashcanos']
             
-        self._totalStench = (
-                4 + sum(t['turns'] for t in eventDbMatch(
-                            events, {'heap_code': "trashcano"}))
-                  + sum(t['turns'] for t in eventDbMatch(
-                            events, {'heap_code': "stench"}))                             
-                  - sum(f['turns'] for f in eventDbMatch(
-                            events, {'heap_code': "unstench"})))
+        self._totalStench = (4 + agg['trashcanos'] + agg['stench'] 
+                               - agg['unstench'])
             
         # if Oscus is dead, set the heap to finished
-        self._heapDone = any(eventDbMatch(events, {'heap_code': "boss"}))
+        self._heapDone = agg['done']
                 
         if self._killed > 0:
             self._open = True  
@@ -1,5 +1,6 @@
 import math
-from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule
+from cwbot.common.logQueries import SumTurns, AnyEvent
 
 
 def killPercent(n):
@@ -19,6 +20,13 @@ class PldModule(BaseDungeonModule):
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "pld"
     
+    aggregateQueries = {'unpopular': SumTurns({'pld_code': "unpopular"}),
+                        'popular': SumTurns({'pld_code': "popular"}),
+                        'kills': SumTurns({'pld_code': "combat"}),
+                        'dumpsters': SumTurns({'pld_code': "dumpster"}),
+                        'barfights': SumTurns({'pld_code': "barfight"}),
+                        'done': AnyEvent({'pld_code': "boss"})}
+    
     def __init__(self, manager, identity, config):
         self._unpopularity = None # current unpopularity level 
         self._pldKilled = None # number of sleaze hobos killed
@@ -85,28 +93,19 @@ class PldModule(BaseDungeonModule):
 
                 
     def _processLog(self, raidlog):
-        events = raidlog['events']
+        agg = self.aggregates(raidlog)
         # check stench hobos killed
-        self._unpopularity = (  
-                sum(u['turns'] for u in eventDbMatch(
-                        events, {'pld_code': "unpopular"}))
-                - sum(p['turns'] for p in eventDbMatch(
-                        events, {'pld_code': "popular"})))
+        self._unpopularity = agg['unpopular'] - agg['popular']
         
-        self._pldKilled = (      
-                sum(k['turns'] for k in eventDbMatch(
-                                    events, {'pld_code': "combat"}))
-                - 6 * sum(d['turns'] for d in eventDbMatch(
-                                    events, {'pld_code': "dumpster"})))
-
-        self._pldFights = sum(f['turns'] for f in eventDbMatch(
-                                  events, {'pld_code': "barfight"}))
+        self._pldKilled = agg['kills'] - 6 * agg['dumpsters']
+
+        self._pldFights = agg['barfights']
             
         # if Chester is dead, set the heap to finished
         if self._pldKilled > 0 or self._pldFights > 0:
             self._open = True
         
-        self._pldDone = any(eventDbMatch(events, {'pld_code': "boss"}))
+        self._pldDone = agg['done']
         return True
             
 
@@ -1,4 +1,5 @@
-from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule
+from cwbot.common.logQueries import SumTurns
 
 
 class SewerModule(BaseDungeonModule):
@@ -11,6 +12,9 @@ class SewerModule(BaseDungeonModule):
     """
     requiredCapabilities = ['chat', 'hobopolis']
     _name = "sewer"
+    
+    aggregateQueries = {'valves': SumTurns({'sewer_code': "valve"}),
+                        'grates': SumTurns({'sewer_code': "grate"})}
 
     
     def __init__(self, manager, identity, config):
@@ -42,11 +46,9 @@ class SewerModule(BaseDungeonModule):
 
         
     def _processLog(self, raidlog):
-        events = raidlog['events']
-        self._valves = sum(w['turns'] for w in eventDbMatch(
-                               events, {'sewer_code': "valve"}))
-        self._grates = sum(g['turns'] for g in eventDbMatch(
-                               events, {'sewer_code': "grate"}))
+        agg = self.aggregates(raidlog)
+        self._valves = agg['valves']
+        self._grates = agg['grates']
         return True
     
 
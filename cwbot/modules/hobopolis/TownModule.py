@@ -1,18 +1,7 @@
-from cwbot.modules.BaseDungeonModule import BaseDungeonModule, eventDbMatch
+from cwbot.modules.BaseDungeonModule import BaseDungeonModule
+from cwbot.common.logQueries import SumTurns, AnyEvent
 import re
 
-
-def stageClearCount(events):
-    return sum(c['turns'] for c in eventDbMatch(
-                   events, 
-                   {'town_code': "ruin"}, 
-                   {'town_code': "busk"}, 
-                   {'town_code': "mosh"}))
-
-def stageCount(events):
-    return sum(s['turns'] 
-               for s in eventDbMatch(events, {'town_code': "stage"}))
-
     
 UNKNOWN = 0
 GUESSED = 1
@@ -65,6 +54,19 @@ class TownModule(BaseDungeonModule):
                 (1250, "The Purple Light District", "pld", "PLD"),
                 (1500, "The tent", None, None)]
     
+    aggregateQueries = {'kills': SumTurns({'town_code': "combat"}),
+                        'stageClears': SumTurns(({'town_code': "ruin"}, 
+                                                 {'town_code': "busk"}, 
+                                                 {'town_code': "mosh"})),
+                        'performers': SumTurns({'town_code': "stage"}),
+                        'stageOpen': AnyEvent({'town_code': "stage"}),
+                        'pldKills': AnyEvent({'pld_code': "combat"}),
+                        'ahbgKills': AnyEvent({'ahbg_code': "combat"}),
+                        'heapKills': AnyEvent(({'heap_code': "combat"},
+                                               {'heap_code': "trashcano"})),
+                        'eeKills': AnyEvent({'ee_code': "combat"}),
+                        'bbKills': AnyEvent({'bb_code': "combat"})}
+    
     
     # approximate values of dances
     def __init__(self, manager, identity, config):
@@ -116,23 +118,23 @@ class TownModule(BaseDungeonModule):
                               .format(self.getTag()))
               
                 
-    def correctDamage(self, events, damage):
+    def correctDamage(self, agg, damage):
         """ adjust damage if any areas are open but we "think" they are not.
-        make sure to do this AFTER accounting for scarehobos """
+        make sure to do this AFTER accounting for scarehobos. agg is the
+        result of self.aggregates() for the current log. """
 
         minDamage = 0
-        if any(eventDbMatch(events, {'town_code': "stage"})):
+        if agg['stageOpen']:
             minDamage = 1500 + 100 * max(0, self._stageClears - 1)
-        elif any(eventDbMatch(events, {'pld_code': "combat"})):
+        elif agg['pldKills']:
             minDamage = 1250
-        elif any(eventDbMatch(events, {'ahbg_code': "combat"})):
+        elif agg['ahbgKills']:
             minDamage = 1000
-        elif any(eventDbMatch(events, {'heap_code': "combat"},
-                                      {'heap_code': "trashcano"})):
+        elif agg['heapKills']:
             minDamage = 750
-        elif any(eventDbMatch(events, {'ee_code': "combat"})):
+        elif agg['eeKills']:
             minDamage = 500
-        elif any(eventDbMatch(events, {'bb_code': "combat"})):
+        elif agg['bbKills']:
             minDamage = 250
             
         if minDamage > damage:
@@ -147,18 +149,17 @@ class TownModule(BaseDungeonModule):
 
     
     def initialize(self, state, initData):
-        events = initData['events']
+        agg = self.aggregates(initData)
         self._db = initData['event-db']
         
-        self._killed = sum(k['turns'] for k in eventDbMatch(
-                               events, {'town_code': "combat"}))
-        self._stageClears = stageClearCount(events)
-        self._totalperformers = stageCount(events)
+        self._killed = agg['kills']
+        self._stageClears = agg['stageClears']
+        self._totalperformers = agg['performers']
         self._damageCorrection = state['damageCorrection']
         
         # do an initial damage calculation
         (doneAmt, guessState) = self.getDoneAndState() 
-        doneAmt = self.correctDamage(events, doneAmt)
+        doneAmt = self.correctDamage(agg, doneAmt)
         
         self._doProcessLog(initData, suppressChat=True)
         
@@ -237,13 +238,12 @@ class TownModule(BaseDungeonModule):
     
     
     def _doProcessLog(self, raidlog, suppressChat=False):
-        events = raidlog['events']
+        agg = self.aggregates(raidlog)
         doneAmt = self.getDoneAndState()[0] 
-        doneAmt = self.correctDamage(events, doneAmt)
-        self._killed = sum(k['turns'] for k in eventDbMatch(
-                               events, {'town_code': "combat"}))
-        newPerformers = stageCount(events)
-        newStageClears = stageClearCount(events)
+        doneAmt = self.correctDamage(agg, doneAmt)
+        self._killed = agg['kills']
+        newPerformers = agg['performers']
+        newStageClears = agg['stageClears']
         if newStageClears > self._stageClears:
             self._tentOpen = KNOWN_CLOSED
             if not suppressChat:
@@ -417,4 +417,6 @@ class TownModule(BaseDungeonModule):
     def _availableCommands(self):
         return {'town': "!town: show the number of scarehobos available "
                         "and the state of the town stage.",
-                'status': "!status: show a summary of Hobopolis progress."}
+                'status': "!status: show a summary of Hobopolis progress.",
+                'townsquare': None, 'stage': None, 'hobo': None, 
+                'hobopolis': None, 'summary': None}
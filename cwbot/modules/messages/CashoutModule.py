@@ -1,5 +1,5 @@
 from cwbot.modules.BaseKmailModule import BaseKmailModule
-from kol.database.ItemDatabase import getItemFromId
+from kol.database.ItemDatabase import getOrDiscoverItemFromId
 
 
 class CashoutModule(BaseKmailModule):
@@ -31,7 +31,8 @@ class CashoutModule(BaseKmailModule):
                                                     "stored for you.")
             text = "Your balance: \n"
             for iid, qty in items.items():
-                text += ("\n{}: {}".format(qty, getItemFromId(iid).get(
+                item = getOrDiscoverItemFromId(iid, self.session)
+                text += ("\n{}: {}".format(qty, item.get(
                                           'name', "item ID {}".format(iid))))
             if meat > 0:
                 text += "\n{} meat".format(meat)
@@ -1,11 +1,6 @@
 from cwbot.modules.BaseKmailModule import BaseKmailModule
 from cwbot.modules.BaseModule import BaseModule
 from cwbot.common.exceptions import MessageError
-from cwbot.kolextra.request.AddItemsToDisplayCaseRequest import \
-                                            AddItemsToDisplayCaseRequest
-from cwbot.kolextra.request.TakeItemsFromDisplayCaseRequest import \
-                                            TakeItemsFromDisplayCaseRequest
-from cwbot.kolextra.request.GetDisplayCaseRequest import GetDisplayCaseRequest
 from cwbot.locks import InventoryLock
 
 
@@ -61,12 +56,9 @@ class BaseHookahModule(BaseModule):
         counted in this calculation. """
         missingItems = []
         with InventoryLock.lock:
-            r = GetDisplayCaseRequest(self.session)
-            inventory = self.tryRequest(r).get('items', [])     
+            display = self.displayCaseManager.displayCase()
             for iid, iname in hookahItems().items():
-                threshold = keepLast
-                if not any(item['id'] == iid and item['quantity'] > threshold 
-                           for item in inventory):
+                if display.get(iid, 0) <= keepLast:
                     missingItems.append(iname)
             return missingItems
     
@@ -77,15 +69,13 @@ class BaseHookahModule(BaseModule):
         with InventoryLock.lock:
             self.inventoryManager.refreshInventory()
             inventory = self.inventoryManager.inventory()
-            hList = []
-            for hItem in (item for item in hookahItems().keys() 
-                          if item in inventory):
-                hList.append({'id': hItem, 'quantity': inventory[hItem]})
-            if len(hList) > 0:
+            hItems = dict((hItem, inventory[hItem]) 
+                          for hItem in hookahItems().keys() 
+                          if hItem in inventory)
+            if len(hItems) > 0:
                 self.log("Adding to display case: {}"
-                         .format(hList))
-                r = AddItemsToDisplayCaseRequest(self.session, hList)
-                self.tryRequest(r)
+                         .format(hItems))
+                self.displayCaseManager.addItems(hItems)
             
 
     def displayHookahParts(self, itemMap):
@@ -94,15 +84,12 @@ class BaseHookahModule(BaseModule):
         with InventoryLock.lock:
             self.inventoryManager.refreshInventory()
             inventory = self.inventoryManager.inventory()
-            hList = []
-            for hItem in (item for item in hookahItems().keys() 
-                          if item in inventory):
-                hList.append({'id': hItem, 
-                              'quantity': min(inventory.get(hItem, 0), 
-                                              itemMap.get(hItem, 0))})
-            if len(hList) > 0:
-                r = AddItemsToDisplayCaseRequest(self.session, hList)
-                self.tryRequest(r)
+            hItems = dict((hItem, min(inventory.get(hItem, 0), 
+                                      itemMap.get(hItem, 0)))
+                          for hItem in hookahItems().keys() 
+                          if hItem in inventory)
+            if len(hItems) > 0:
+                self.displayCaseManager.addItems(hItems)
 
 
     def removeHookahFromDisplay(self, keepLast):
@@ -112,10 +99,7 @@ class BaseHookahModule(BaseModule):
         with InventoryLock.lock:
             oos = self.outOfStock(keepLast) 
             if len(oos) == 0:
-                hList = [{'id': iid, 'quantity': 1} 
-                         for iid in hookahItems().keys()]
-                r = TakeItemsFromDisplayCaseRequest(self.session, hList)
-                self.tryRequest(r)
+                self.displayCaseManager.takeItems(hookahItemDict())
             else:
                 raise NoHookahStockException
 
@@ -16,6 +16,21 @@ def _parse():
     p.add_argument('--debug', action='store_true', help="Run in debug mode")
     p.add_argument('--login', nargs=2, help="use an alternate account",
                    metavar=('USER', 'PASS'))
+    p.add_argument('--precompile-patterns', action='store_true',
+                   dest='precompilePatterns',
+                   help="compile all pyKol patterns at startup")
+    p.add_argument('--response-log-length', type=int, default=None,
+                   dest='responseLogLength', metavar='N',
+                   help="truncate logged pyKol response bodies to N "
+                        "characters (default: no limit)")
+    p.add_argument('--response-log-sample-rate', type=float, default=1.0,
+                   dest='responseLogSampleRate', metavar='RATE',
+                   help="log only this fraction of pyKol response bodies "
+                        "(default: 1.0)")
+    p.add_argument('--request-engine', action='store_true',
+                   dest='requestEngine',
+                   help="send chats from coroutines on a request engine "
+                        "instead of a thread per target")
     p.add_argument('path', default=None, nargs='?',
                    help="run path (default: same path as cwbot.py)")
     p.add_argument('-v', '--version', action='version', 
@@ -57,5 +72,14 @@ def processArgv(argv, curFolder):
     
     log.info("-------- Startup --------")
     log.info("Using working directory {}".format(os.getcwd()))
+    if parsed.precompilePatterns:
+        from kol.manager import PatternManager
+        log.info("Compiled {} patterns.".format(
+                                            PatternManager.precompileAll()))
+    from kol.request import GenericRequest
+    GenericRequest.setResponseLogging(parsed.responseLogLength, 
+                                      parsed.responseLogSampleRate)
 
-    return RunProperties(debug, loginFile, adminFile, cwd, altLogin=altLogin)
+    props = RunProperties(debug, loginFile, adminFile, cwd, altLogin=altLogin)
+    props.requestEngine = parsed.requestEngine
+    return props
@@ -0,0 +1,498 @@
+""" Replay chat and kmail streams through the bot, for benchmarking.
+
+The bot runs in-process with its real managers and modules (loaded from a
+modules.ini), but its session talks to a fake KoL server
+(kol.test.FakeKol.FakeKol) instead of the game. Chats and kmails from a
+stream are posted to the fake server, and the bot's replies are timed. At the
+end, a report shows the throughput, the reply latency, the number of
+requests made to each endpoint and the memory growth of the process.
+
+A stream file has one JSON object per line, for example:
+
+    {"t": 0.0, "type": "chat", "userId": 1001, "text": "!roll 1d20"}
+    {"t": 0.5, "type": "private", "userId": 1002, "text": "!uptime"}
+    {"t": 1.2, "type": "kmail", "userId": 1003, "text": "hello", "meat": 0}
+
+"type" is "chat" (with an optional "channel"), "private" or "kmail". "t" is
+the time of the event in seconds; if it is missing, events are posted at a
+fixed rate. "userName" may be given to name the player. Latency is only
+measured for events that expect a reply: chats and private messages that
+start with "!", and all kmails, unless "reply" is set to true or false.
+Replies are matched to events in order, by channel (for chats) or by player
+(for private messages and kmails).
+
+If no stream is given, a synthetic stream of dice rolls, uptime queries,
+idle chatter and kmails is generated.
+
+By default, the bot polls chat as often as modules.ini says, throttles its
+chats and rate-limits its requests as it would in production, so the
+latencies are those that players would see. Lowering the poll interval, chat
+throttle and request rate limit (see --help) measures the bot's own
+processing time instead. Note that polling faster than the request rate
+limit allows starves the other request classes (see kol.RequestScheduler).
+
+With --engine, the session gets a RequestEngine (see kol.RequestEngine), so
+chats are sent by coroutines instead of by a thread per target. Comparing the
+thread counts, memory and latencies of runs with and without it shows the
+cost of each model.
+"""
+import os
+import gc
+import json
+import time
+import random
+import shutil
+import logging
+import tempfile
+import argparse
+import threading
+from collections import defaultdict
+
+_log = logging.getLogger("cwbot.replay")
+
+_defaultModules = """overwrite_config = True
+[system]
+    channels = clan,
+    communication_interval = 1
+[director]
+    base = cwbot.managers
+    mail_check_interval = 300
+    [[KmailManager]]
+        type = MessageManager
+        priority = 1
+        base = cwbot.modules.messages
+        sync_interval = 300
+        channel = clan
+        show_chat_help_message = False
+        [[[Unknown]]]
+            type = UnknownKmailModule
+            priority = 3
+            permission = None
+            clan_only = False
+    [[all_channel]]
+        type = AllChannelManager
+        priority = 110
+        base = cwbot.modules
+        sync_interval = 300
+        channel = UNKNOWN
+        accept_private_messages = True
+        [[[Dice]]]
+            type = general.DiceModule
+            priority = 100
+            permission = None
+            clan_only = False
+        [[[Misc]]]
+            type = general.MiscCommandModule
+            priority = 100
+            permission = None
+            clan_only = False
+        [[[Permissions]]]
+            type = general.PermissionsModule
+            permission = *
+            priority = 101
+            clan_only = False
+"""
+
+_syntheticChats = [("!roll 1d20", True),
+                   ("!roll 3d6+2", True),
+                   ("!order alpha beta gamma delta", True),
+                   ("!uptime", True),
+                   ("anyone around?", False),
+                   ("brb, getting coffee", False),
+                   ("has anyone seen the hobo stage yet", False),
+                   ("gz on the drop!", False),
+                   ("ok", False)]
+
+
+def synthesize(count, numUsers=20, kmailFraction=0.1, privateFraction=0.3,
+               seed=0):
+    """ Generate a list of count random events from numUsers players. """
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        userId = 1001 + rng.randrange(numUsers)
+        x = rng.random()
+        if x < kmailFraction:
+            events.append({'type': "kmail", 'userId': userId,
+                           'text': "hello there"})
+            continue
+        text, reply = rng.choice(_syntheticChats)
+        if x < kmailFraction + privateFraction:
+            if not reply:
+                continue
+            events.append({'type': "private", 'userId': userId,
+                           'text': text})
+        else:
+            events.append({'type': "chat", 'userId': userId,
+                           'text': text})
+    return events
+
+
+def loadStream(fileName):
+    """ Read a stream file (see module documentation). """
+    events = []
+    with open(fileName) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                events.append(json.loads(line))
+    return events
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def _rss():
+    from cwbot.host import memoryUsage
+    return memoryUsage(os.getpid())['rss']
+
+
+class ReplayHarness(object):
+    """ Runs a bot against a FakeKol in a temporary run folder. Call start(),
+    then replay() one or more streams, then stop(). pollInterval, 
+    chatThrottle and requestRate override the chat poll interval, the time
+    between chats to the same target and the request rate limit (None keeps
+    the production values). If useEngine is True, the session gets a 
+    RequestEngine. """
+    def __init__(self, modulesFile=None, pollInterval=None, 
+                 chatThrottle=None, requestRate=None, keepFolder=False,
+                 useEngine=False):
+        self._modulesFile = modulesFile
+        self._useEngine = useEngine
+        self._pollInterval = pollInterval
+        self._chatThrottle = chatThrottle
+        self._requestRate = requestRate
+        self._keepFolder = keepFolder
+        self._exitEvent = threading.Event()
+        self._lock = threading.Lock()
+        self._pending = defaultdict(list) # (kind, key) -> injection times
+        self._latencies = defaultdict(list) # kind -> seconds
+        self._unmatched = defaultdict(int) # kind -> number of replies
+        self._thread = None
+        self._folder = None
+        self._oldFolder = None
+        self.fake = None
+        self.opener = None
+        self.session = None
+        self.engine = None
+        self._chatManager = None
+        self._inventoryManager = None
+        self._bot = None
+
+
+    def _prepareFolder(self):
+        self._folder = tempfile.mkdtemp(prefix="cwbot-replay-")
+        os.makedirs(os.path.join(self._folder, "data"))
+        os.makedirs(os.path.join(self._folder, "log"))
+        with open(os.path.join(self._folder, "login.ini"), 'w') as f:
+            f.write("username = {}\npassword = fake\n"
+                    .format(self.fake.userName))
+        with open(os.path.join(self._folder, "admin.ini"), 'w') as f:
+            f.write("[groups]\n[admins]\n")
+        if self._modulesFile is not None:
+            shutil.copy(self._modulesFile,
+                        os.path.join(self._folder, "modules.ini"))
+        else:
+            with open(os.path.join(self._folder, "modules.ini"), 'w') as f:
+                f.write(_defaultModules)
+
+
+    def start(self):
+        """ Log in to the fake server and start the bot. """
+        from kol.Session import Session
+        from kol.RequestScheduler import RequestScheduler
+        from kol.RequestEngine import RequestEngine
+        from kol.test.FakeKol import FakeKol, FakeKolOpener
+        from cwbot.RunProperties import RunProperties
+        from cwbot.sys.BotSystem import BotSystem
+        from cwbot.sys.database import Database
+        from cwbot.kolextra.manager.ChatManager import ChatManager
+        from cwbot.kolextra.manager.InventoryManager import InventoryManager
+        from cwbot.kolextra.manager.MessageDispatcher import MessageThread
+
+        self.fake = FakeKol()
+        self.fake.listeners.append(self._onReply)
+        self._prepareFolder()
+        self._oldFolder = os.getcwd()
+        os.chdir(self._folder)
+
+        fileHandler = logging.FileHandler('log/cwbot.log')
+        logging.getLogger().addHandler(fileHandler)
+        logging.getLogger().setLevel(logging.INFO)
+
+        props = RunProperties(False, 'login.ini', 'admin.ini',
+                              self._oldFolder)
+        db = Database('data/cwbot.db')
+        self.opener = FakeKolOpener(self.fake)
+        if self._useEngine:
+            self.engine = RequestEngine()
+            self.engine.start()
+        self.session = Session(opener=self.opener, 
+                               scheduler=RequestScheduler(
+                                                rate=self._requestRate),
+                               engine=self.engine)
+        if self._chatThrottle is not None:
+            MessageThread.throttleSeconds = self._chatThrottle
+        self.session.login(props.userName, props.password)
+        self._inventoryManager = InventoryManager(self.session, db)
+        self._chatManager = ChatManager(self.session)
+        self._bot = BotSystem(self.session, self._chatManager, props, 
+                              self._inventoryManager,
+                              'modules.ini', db, self._exitEvent)
+
+        # communication_interval cannot be set below one second
+        if self._pollInterval is not None:
+            self._bot._chatDelay = self._pollInterval
+        self._thread = threading.Thread(target=self._run, name="replay-bot")
+        self._thread.daemon = True
+        self._thread.start()
+
+
+    def _run(self):
+        try:
+            self._bot.loop()
+        except SystemExit:
+            pass
+        except Exception:
+            _log.exception("Bot crashed.")
+
+
+    def stop(self):
+        """ Stop the bot and remove the run folder. """
+        self._exitEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._chatManager is not None:
+            self._chatManager.close()
+        if self._inventoryManager is not None:
+            self._inventoryManager.close()
+        if self.session is not None:
+            self.session.logout()
+        if self.engine is not None:
+            self.engine.stop()
+        os.chdir(self._oldFolder)
+        if self._keepFolder:
+            print("Run folder: {}".format(self._folder))
+        else:
+            shutil.rmtree(self._folder, ignore_errors=True)
+
+
+    def _onReply(self, kind, target, _text):
+        now = time.time()
+        if kind == "chat":
+            key = ("chat", target)
+        else:
+            key = (kind, target)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending:
+                t0 = pending.pop(0)
+                self._latencies[key[0]].append(now - t0)
+            else:
+                self._unmatched[kind] += 1
+
+
+    def _numPending(self):
+        with self._lock:
+            return sum(len(v) for v in self._pending.values())
+
+
+    def inject(self, event):
+        """ Post a single event to the fake server. """
+        kind = event['type']
+        userId = int(event['userId'])
+        text = event.get('text', "")
+        if 'userName' in event or userId not in self.fake.players:
+            self.fake.addPlayer(
+                    userId, event.get('userName', "Player{}".format(userId)),
+                    event.get('inClan', True))
+        expectReply = event.get('reply', kind == "kmail" or
+                                         text.startswith("!"))
+        if expectReply:
+            if kind == "chat":
+                channel = event.get('channel', "clan")
+                key = ("chat", channel)
+            elif kind == "private":
+                key = ("private", userId)
+            else:
+                key = ("kmail", userId)
+            with self._lock:
+                self._pending[key].append(time.time())
+        if kind == "chat":
+            self.fake.postChat(userId, text, event.get('channel'))
+        elif kind == "private":
+            self.fake.postPrivate(userId, text)
+        elif kind == "kmail":
+            self.fake.sendKmail(userId, text, int(event.get('meat', 0)))
+        else:
+            raise ValueError("Unknown event type: {}".format(kind))
+
+
+    def replay(self, events, rate=20.0, speed=1.0, timeout=30):
+        """ Post the events to the fake server and wait for the replies.
+        Events without a time are posted rate per second; times are divided
+        by speed. Returns a report dict. """
+        with self._lock:
+            self._pending.clear()
+            self._latencies.clear()
+            self._unmatched.clear()
+        self.opener.stats.reset()
+        gc.collect()
+        rssStart = _rss()
+        threadsStart = threading.active_count()
+        threadsPeak = threadsStart
+
+        start = time.time()
+        for i, event in enumerate(events):
+            t = event.get('t')
+            t = i / rate if t is None else float(t) / speed
+            delay = start + t - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.inject(event)
+            threadsPeak = max(threadsPeak, threading.active_count())
+        injected = time.time()
+
+        while self._numPending() > 0 and time.time() - injected < timeout:
+            if not self._thread.is_alive():
+                break
+            time.sleep(0.01)
+            threadsPeak = max(threadsPeak, threading.active_count())
+        end = time.time()
+        gc.collect()
+
+        kinds = defaultdict(int)
+        for event in events:
+            kinds[event['type']] += 1
+        with self._lock:
+            latency = dict((kind, {'replies': len(v),
+                                   'p50': _percentile(v, 50),
+                                   'p99': _percentile(v, 99),
+                                   'max': max(v)})
+                           for kind,v in self._latencies.items() if v)
+            unanswered = sum(len(v) for v in self._pending.values())
+            unmatched = dict(self._unmatched)
+        return {'events': dict(kinds),
+                'seconds': end - start,
+                'injectSeconds': injected - start,
+                'eventsPerSecond': len(events) / max(end - start, 1e-9),
+                'latency': latency,
+                'unanswered': unanswered,
+                'unmatchedReplies': unmatched,
+                'requests': self.opener.stats.snapshot(),
+                'unhandledRequests': dict(self.fake.unhandled),
+                'rssStartKb': rssStart,
+                'rssEndKb': _rss(),
+                'threadsStart': threadsStart,
+                'threadsEnd': threading.active_count(),
+                'threadsPeak': threadsPeak,
+                'botAlive': self._thread.is_alive()}
+
+
+def formatReport(report):
+    """ Format a report dict as text. """
+    lines = []
+    numEvents = sum(report['events'].values())
+    lines.append("Events: {} ({})".format(
+            numEvents, ", ".join("{} {}".format(n, k) for k,n
+                                 in sorted(report['events'].items()))))
+    lines.append("Time: {:.2f} s ({:.2f} s posting); throughput {:.1f} "
+                 "events/s".format(report['seconds'],
+                                   report['injectSeconds'],
+                                   report['eventsPerSecond']))
+    lines.append("Reply latency (ms):")
+    for kind, l in sorted(report['latency'].items()):
+        lines.append("    {:<8} n={:<6} p50={:8.1f} p99={:8.1f} max={:8.1f}"
+                     .format(kind, l['replies'], 1000 * l['p50'],
+                             1000 * l['p99'], 1000 * l['max']))
+    lines.append("Unanswered events: {}; unmatched replies: {}"
+                 .format(report['unanswered'],
+                         sum(report['unmatchedReplies'].values())))
+    lines.append("Requests:")
+    for endpoint, s in sorted(report['requests'].items(),
+                              key=lambda x: -x[1]['requests']):
+        lines.append("    {:<28} {:>7} ({:.2f} per event)"
+                     .format(endpoint or "/", s['requests'],
+                             s['requests'] / float(max(numEvents, 1))))
+    for endpoint, n in sorted(report['unhandledRequests'].items()):
+        lines.append("    {:<28} {:>7} (not handled by the fake server)"
+                     .format(endpoint, n))
+    if report['rssStartKb'] is not None:
+        lines.append("Memory: RSS {} kB -> {} kB ({:+d} kB)"
+                     .format(report['rssStartKb'], report['rssEndKb'],
+                             report['rssEndKb'] - report['rssStartKb']))
+    lines.append("Threads: {} -> {} (peak {})"
+                 .format(report['threadsStart'], report['threadsEnd'],
+                         report['threadsPeak']))
+    if not report['botAlive']:
+        lines.append("WARNING: the bot stopped during the replay. "
+                     "See log/cwbot.log (run with --keep).")
+    return "\n".join(lines)
+
+
+def _parse():
+    p = argparse.ArgumentParser(
+            description="Replay chats and kmails through the bot, against "
+                        "a fake KoL server.")
+    p.add_argument('stream', nargs='?', default=None,
+                   help="stream file (default: a synthetic stream)")
+    p.add_argument('--modules', default=None, metavar='FILE',
+                   help="modules.ini to load (default: a small built-in "
+                        "configuration)")
+    p.add_argument('--events', type=int, default=120,
+                   help="number of synthetic events")
+    p.add_argument('--users', type=int, default=20,
+                   help="number of synthetic players")
+    p.add_argument('--rate', type=float, default=1.0,
+                   help="events per second, for events without a time")
+    p.add_argument('--speed', type=float, default=1.0,
+                   help="speed-up factor for events with a time")
+    p.add_argument('--poll', type=float, default=None, metavar='SECONDS',
+                   help="chat poll interval (default: from modules.ini)")
+    p.add_argument('--chat-throttle', type=float, default=None, 
+                   metavar='SECONDS', dest='chatThrottle',
+                   help="time between chats to the same channel or player "
+                        "(default: 1.75)")
+    p.add_argument('--request-rate', type=float, default=None, 
+                   metavar='PER_SECOND', dest='requestRate',
+                   help="request rate limit (default: 5)")
+    p.add_argument('--timeout', type=float, default=30, metavar='SECONDS',
+                   help="time to wait for replies after the last event")
+    p.add_argument('--engine', action='store_true',
+                   help="send chats with coroutines on a RequestEngine")
+    p.add_argument('--json', action='store_true',
+                   help="print the report as JSON")
+    p.add_argument('--keep', action='store_true',
+                   help="keep the temporary run folder")
+    return p.parse_args()
+
+
+def main():
+    parsed = _parse()
+    if parsed.stream is not None:
+        events = loadStream(parsed.stream)
+    else:
+        events = synthesize(parsed.events, parsed.users)
+    modulesFile = None
+    if parsed.modules is not None:
+        modulesFile = os.path.abspath(parsed.modules)
+    harness = ReplayHarness(modulesFile, parsed.poll, parsed.chatThrottle,
+                            parsed.requestRate, parsed.keep, parsed.engine)
+    harness.start()
+    try:
+        report = harness.replay(events, parsed.rate, parsed.speed,
+                                parsed.timeout)
+    finally:
+        harness.stop()
+    if parsed.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(formatReport(report))
+
+
+if __name__ == "__main__":
+    main()
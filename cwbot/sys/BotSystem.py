@@ -16,7 +16,7 @@ from cwbot.sys.heartbeatSubsystem import HeartbeatSubsystem
 from cwbot.common.InitData import InitData
 from kol.request.StatusRequest import StatusRequest
 from cwbot.kolextra.request.UserProfileRequest import UserProfileRequest
-from cwbot.util.tryRequest import tryRequest
+from cwbot.util.tryRequest import tryRequest, threadedRequestExecutor
 
 
 def _quoteConfig(cfg):
@@ -139,6 +139,7 @@ class BotSystem(EventSubsystem.EventCapable,
             txt = f.read()
         self._saveConfig(configFile, txt)
         self._chatDelay = c['system']['communication_interval']
+        threadedRequestExecutor().resize(c['system']['request_threads'])
         self._log.debug("{} loaded.".format(configFile))
         return txt
         
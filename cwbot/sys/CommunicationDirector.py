@@ -77,6 +77,8 @@ class CommunicationDirector(EventSubsystem.EventCapable,
             self._mailHandler.stop()
             raise
         self._mailDelay = config['mail_check_interval']
+        self._kmailCommitCount = config['kmail_commit_count']
+        self._kmailCommitSeconds = config['kmail_commit_ms'] / 1000.0
 
         # add random times to refreshes to prevent server hammering
         self._lastChatRefresh = time.time() + random.randint(0, 300)
@@ -138,20 +140,92 @@ class CommunicationDirector(EventSubsystem.EventCapable,
         # check for mail handler issues
         if self._mailHandler.exception.is_set():
             self._mailHandler.join()
-        # get new mail
-        newKmail = Kmail.fromPyKol(self._mailHandler.getNextKmail())
-        while newKmail is not None:
-            responses = self._processKmail(newKmail)
-            try:
-                # send responses to MailHandler
-                kmails = [r.kmail for r in responses]
-                self._mailHandler.respondToKmail(newKmail.info['id'],  
-                                                 map(Kmail.toPyKol, kmails))
-            except Exception as e:
+        # get new mail. Processed kmails are committed in groups (see
+        # _commitKmails). Items are reserved when a kmail is committed, so
+        # a kmail whose responses send items ends its group; otherwise, 
+        # the kmails after it would see the items as available. If a kmail
+        # fails, the kmails before it are committed with the state from 
+        # before it was processed, and it is processed again after a restart.
+        pending = []
+        stateBefore = None
+        groupStart = time.time()
+        try:
+            newKmail = Kmail.fromPyKol(self._mailHandler.getNextKmail())
+            while newKmail is not None:
+                if pending:
+                    stateBefore = self._kmailStateItems()
+                responses = self._processKmail(newKmail)
+                sendsItems = any(r.kmail.items for r in responses)
+                if sendsItems:
+                    self._checkItems(responses)
+                if not pending:
+                    groupStart = time.time()
+                pending.append((newKmail, responses))
+                stateBefore = None
+                if (sendsItems or len(pending) >= self._kmailCommitCount or
+                        time.time() - groupStart >= self._kmailCommitSeconds):
+                    group, pending = pending, []
+                    self._commitKmails(group)
+                newKmail = Kmail.fromPyKol(self._mailHandler.getNextKmail())
+        except:
+            self._commitKmails(pending, stateBefore)
+            raise
+        self._commitKmails(pending)
+            
+            
+    def _checkItems(self, responses):
+        """ Check that there are enough items to send the responses to a
+        kmail before it joins the group, so that if there are not, only 
+        that kmail fails instead of the whole group. """
+        try:
+            self._mailHandler.checkItems(
+                    map(Kmail.toPyKol, [r.kmail for r in responses]))
+        except Exception as e:
+            for r in responses:
+                r.manager.kmailFailed(r.module, r.kmail, e)
+            raise
+            
+            
+    def _kmailStateItems(self):
+        """ Get the module state rows that processing the uncommitted kmails
+        changed. """
+        stateItems = []
+        for m in self._managers:
+            items = m.manager.kmailStateItems()
+            if items is not None:
+                stateItems.extend(items)
+        return stateItems
+            
+            
+    def _commitKmails(self, pending, stateItems=None):
+        """ Send the responses to a group of processed kmails to the 
+        MailHandler, along with the module states that processing them 
+        changed, in a single transaction. Until then, the kmails stay in the
+        INBOX_RESPONDING state, so after a crash they are processed again
+        from the last committed state. pending is a list of 
+        (kmail, responses) tuples. If stateItems is given, it is committed
+        instead of the current state, which then stays uncommitted. """
+        if not pending:
+            return
+        managers = [m.manager for m in self._managers]
+        current = stateItems is None
+        if current:
+            stateItems = self._kmailStateItems()
+        try:
+            # send responses to MailHandler
+            self._mailHandler.respondToKmails(
+                [(kmail.info['id'], map(Kmail.toPyKol, 
+                                        [r.kmail for r in responses]))
+                 for kmail,responses in pending], 
+                stateItems)
+        except Exception as e:
+            for _kmail,responses in pending:
                 for r in responses:
                     r.manager.kmailFailed(r.module, r.kmail, e)
-                raise
-            newKmail = Kmail.fromPyKol(self._mailHandler.getNextKmail())
+            raise
+        if current:
+            for man in managers:
+                man.kmailStateCommitted()
 
 
     def _processChat(self, msgs):
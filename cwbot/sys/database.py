@@ -90,9 +90,7 @@ class Database(object):
         
         tableName = self._names['state']
         con = None
-        items = []
-        for modName,sDict in stateDict.items():
-            items.append((encode(sDict), managerName, modName))
+        items = self.encodeState(managerName, stateDict)
         try:
             con = sql.connect(self._filename, timeout=10, 
                               isolation_level="IMMEDIATE")
@@ -101,16 +99,30 @@ class Database(object):
                 if purge:
                     c.execute("DELETE FROM {} WHERE manager=?"
                               .format(tableName), (managerName,))
-                for item in items:
-                    c.execute("UPDATE {} SET state=? "
-                              "WHERE manager=? AND module=?"
-                              .format(tableName), item)
-                    if c.rowcount == 0:
-                        c.execute("INSERT INTO {}(state, manager, module) "
-                                  "VALUES(?,?,?)"
-                                  .format(tableName), item)
+                self.updateStateTableWithCursor(c, items)
         finally:
             _closeConnection(con)
+            
+            
+    def encodeState(self, managerName, stateDict):
+        """ Encode a state dict (in the same format as for updateStateTable)
+        into a list of rows for updateStateTableWithCursor. """
+        return [(encode(sDict), managerName, modName) 
+                for modName,sDict in stateDict.items()]
+    
+    
+    def updateStateTableWithCursor(self, cursor, stateItems):
+        """ Write rows from encodeState() using an existing cursor, so that
+        the state is committed in the same transaction as other changes. """
+        tableName = self._names['state']
+        for item in stateItems:
+            cursor.execute("UPDATE {} SET state=? "
+                           "WHERE manager=? AND module=?"
+                           .format(tableName), item)
+            if cursor.rowcount == 0:
+                cursor.execute("INSERT INTO {}(state, manager, module) "
+                               "VALUES(?,?,?)"
+                               .format(tableName), item)
     
     
     def loadStateTable(self, managerName):
@@ -18,10 +18,8 @@ from cwbot.common.exceptions import MessageError
 from cwbot.sys.database import encode, decode
 from cwbot.util.tryRequest import tryRequest
 from cwbot.kolextra.manager.MailboxManager import MailboxManager
-from kol.database.ItemDatabase import getItemFromId
-from cwbot.kolextra.request.GetDisplayCaseRequest import GetDisplayCaseRequest
-from cwbot.kolextra.request.TakeItemsFromDisplayCaseRequest import \
-                            TakeItemsFromDisplayCaseRequest 
+from cwbot.kolextra.manager.DisplayCaseManager import DisplayCaseManager
+from kol.database.ItemDatabase import getOrDiscoverItemFromId
 import kol.Error
 
 
@@ -283,45 +281,72 @@ class MailHandler(ExceptionThread):
         here, they will be sent. This is the correct function to use to ensure
         proper response in case of a power failure.
         """
+        self.respondToKmails([(kmailId, responses)])
+        
+        
+    def checkItems(self, responses):
+        """ Raise a MessageError if there are not enough unreserved items 
+        to send these kmails (in pyKol format). respondToKmails() checks 
+        again before it reserves the items. """
+        with self.__lock:
+            for response in responses:
+                self._checkItems(response)
+        
+        
+    def respondToKmails(self, kmailResponses, stateItems=None):
+        """ Respond to several kmails at once. kmailResponses is a list of
+        (kmailId, responses) tuples, as for respondToKmail(). stateItems are
+        module state rows (from Database.encodeState()) that are written in 
+        the same transaction, so that the state changed by processing these
+        kmails is saved if and only if the kmails are marked as processed. 
+        """
+        if stateItems is None:
+            stateItems = []
         with self.__lock:
-            if responses:
+            for _kmailId, responses in kmailResponses:
                 for response in responses:
                     self._checkItems(response)
             con = self._db.getDbConnection(isolation_level="IMMEDIATE")
             try:
                 with con:
                     c = con.cursor()
-                    c.execute("SELECT * FROM {} WHERE kmailId=? AND state=?"
-                              .format(self._name),
-                              (kmailId, self.INBOX_RESPONDING))
-                    row = c.fetchone()
-                    id_ = None
-                    if row is not None:
-                        id_ = row['id']
-                    # remove the inbox kmail (status=INBOX_RESPONDING)
-                    c.execute("DELETE FROM {} WHERE kmailId=? AND state=?"
-                              .format(self._name),
-                              (kmailId, self.INBOX_RESPONDING))
-                    if c.rowcount == 0:
-                        raise IndexError("No such kmail with id {}"
-                                         .format(kmailId))
-                    if not responses:
-                        self._log.debug("Silently processed kmail {}"
-                                        .format(id_))
-                        return
-                    
-                    # insert replies into database (status=OUTBOX_SENDING)
-                    self._log.debug("Kmail {} processed. Adding responses:"
-                                    .format(id_))
-                    for response in responses:
-                        deferMode = response.get('defer', False)
-                        insertState = (self.OUTBOX_SENDING if not deferMode
-                                       else self.OUTBOX_WITHHELD) 
-                        self._insertSplitKmail(c, insertState, 
-                                               response, reserveItems=True)
+                    for kmailId, responses in kmailResponses:
+                        self._respondWithCursor(c, kmailId, responses)
+                    self._db.updateStateTableWithCursor(c, stateItems)
                 self._event.set()
             finally:
                 con.close()
+                
+                
+    def _respondWithCursor(self, c, kmailId, responses):
+        c.execute("SELECT * FROM {} WHERE kmailId=? AND state=?"
+                  .format(self._name),
+                  (kmailId, self.INBOX_RESPONDING))
+        row = c.fetchone()
+        id_ = None
+        if row is not None:
+            id_ = row['id']
+        # remove the inbox kmail (status=INBOX_RESPONDING)
+        c.execute("DELETE FROM {} WHERE kmailId=? AND state=?"
+                  .format(self._name),
+                  (kmailId, self.INBOX_RESPONDING))
+        if c.rowcount == 0:
+            raise IndexError("No such kmail with id {}"
+                             .format(kmailId))
+        if not responses:
+            self._log.debug("Silently processed kmail {}"
+                            .format(id_))
+            return
+        
+        # insert replies into database (status=OUTBOX_SENDING)
+        self._log.debug("Kmail {} processed. Adding responses:"
+                        .format(id_))
+        for response in responses:
+            deferMode = response.get('defer', False)
+            insertState = (self.OUTBOX_SENDING if not deferMode
+                           else self.OUTBOX_WITHHELD) 
+            self._insertSplitKmail(c, insertState, 
+                                   response, reserveItems=True)
 
 
     def sendNonresponseKmail(self, message):
@@ -610,9 +635,7 @@ class MailHandler(ExceptionThread):
                            if diff < 0)
             if deficit:
                 # get items in display case
-                r2 = GetDisplayCaseRequest(self._s)
-                d2 = tryRequest(r2)
-                display = _itemsToDict(d2['items'])
+                display = DisplayCaseManager.forSession(self._s).displayCase()
                 difference = dict(
                     (iid, inv.get(iid, 0) + display.get(iid, 0) - qty)
                     for iid,qty in itemsOwed.items())
@@ -623,9 +646,10 @@ class MailHandler(ExceptionThread):
                 warningText = ("Warning: {} has an item deficit of: \n"
                                .format(self._props.userName))
                 for iid, d in deficit.items():
+                    item = getOrDiscoverItemFromId(iid, self._s)
                     warningText += ("\n{}: {}"
                                     .format(
-                                        d, getItemFromId(iid).get(
+                                        d, item.get(
                                             'name', "item ID {}".format(iid))))
                 if meatOwed > meat:
                     warningText += "\n{} meat".format(meatOwed-meat)
@@ -707,9 +731,8 @@ class MailHandler(ExceptionThread):
                 if inInventory < qty:
                     self._log.info("Short on item {}; taking from DC..."
                                    .format(iid))
-                    r = TakeItemsFromDisplayCaseRequest(
-                        self._s, [{'id': iid, 'quantity': qty - inInventory}])
-                    tryRequest(r)
+                    DisplayCaseManager.forSession(self._s).takeItems(
+                                                {iid: qty - inInventory})
             self._invMan.refreshInventory()
             inv = self._invMan.completeInventory()
 
@@ -1092,9 +1115,9 @@ class MailHandler(ExceptionThread):
         with InventoryLock.lock:
             self._invMan.refreshInventory()
             inv = self._invMan.inventory()
-            r = GetDisplayCaseRequest(self._s)
-            d = tryRequest(r)
-            inv = _itemsToDict(d['items'], inv)
+            display = DisplayCaseManager.forSession(self._s).displayCase()
+            for iid,qty in display.items():
+                inv[iid] = inv.get(iid, 0) + qty
             for iid,qty in items.items():
                 if inv.get(iid, 0) < qty:
                     raise MessageError("Not enough of item {} in inventory."
@@ -0,0 +1,156 @@
+import logging
+import threading
+import unittest
+from collections import namedtuple
+from cwbot.common.kmailContainer import Kmail, KmailResponse
+from cwbot.sys.CommunicationDirector import CommunicationDirector
+
+
+_Entry = namedtuple("_Entry", ["manager"])
+
+
+class _MailHandler(object):
+    """ Keeps the inbox and the committed state in memory, like the kmail
+    and state tables of the database. A kmail leaves the inbox only when it
+    is committed. """
+    def __init__(self, kmailIds, itemsAvailable=True):
+        self.inbox = list(kmailIds)
+        self._unread = list(kmailIds)
+        self.committed = []
+        self.savedState = {}
+        self.itemsAvailable = itemsAvailable
+        self.exception = threading.Event()
+
+    def getNextKmail(self):
+        if not self._unread:
+            return None
+        kmailId = self._unread.pop(0)
+        return {'id': kmailId, 'userId': 1, 'text': kmailId}
+
+    def checkItems(self, responses):
+        if not self.itemsAvailable:
+            raise Exception("Not enough items")
+
+    def respondToKmails(self, kmailResponses, stateItems=None):
+        ids = [kmailId for kmailId, _responses in kmailResponses]
+        self.committed.append(ids)
+        for kmailId in ids:
+            self.inbox.remove(kmailId)
+        self.savedState.update(stateItems or [])
+
+    def stop(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class _Manager(object):
+    """ Counts the kmails it has processed. A kmail with the text "crash"
+    raises after it has changed the count, and one with the text "send"
+    sends an item. """
+    def __init__(self, count=0):
+        self.count = count
+        self.dirty = False
+        self.failed = []
+
+    def parseKmail(self, message):
+        self.count += 1
+        self.dirty = True
+        if message.text.startswith("crash"):
+            raise Exception("Module error")
+        if message.text.startswith("send"):
+            return [KmailResponse(self, None, Kmail(1).addItem(1, 1))]
+        return []
+
+    def kmailStateItems(self):
+        if not self.dirty:
+            return None
+        return [("count", self.count)]
+
+    def kmailStateCommitted(self):
+        self.dirty = False
+
+    def kmailFailed(self, module, message, exception):
+        self.failed.append(message)
+
+
+class _Inventory(object):
+    def refreshInventory(self):
+        pass
+
+
+class _Chat(object):
+    def getNewChatMessages(self):
+        return []
+
+
+def _director(mailHandler, manager, commitCount=3):
+    """ A CommunicationDirector without a session, chat or configuration.
+    """
+    d = CommunicationDirector.__new__(CommunicationDirector)
+    d._log = logging.getLogger("testcomms")
+    d._log.propagate = False
+    d._c = _Chat()
+    d._inv = _Inventory()
+    d._mailHandler = mailHandler
+    d._managers = [_Entry(manager)]
+    d._kmailCommitCount = commitCount
+    d._kmailCommitSeconds = 1000
+    d._processChat = lambda msgs: None
+    return d
+
+
+class Test(unittest.TestCase):
+    """ Processed kmails are committed in groups, together with the module
+    state they changed. """
+
+    def testGroupCommit(self):
+        mail = _MailHandler(["a", "b", "c", "d", "e", "f", "g"])
+        manager = _Manager()
+        _director(mail, manager).processNewCommunications()
+        self.assertEqual(mail.committed,
+                         [["a", "b", "c"], ["d", "e", "f"], ["g"]])
+        self.assertEqual(mail.savedState, {"count": 7})
+        self.assertFalse(manager.dirty)
+
+    def testItemsEndGroup(self):
+        mail = _MailHandler(["a", "send", "b", "c"])
+        _director(mail, _Manager()).processNewCommunications()
+        self.assertEqual(mail.committed, [["a", "send"], ["b", "c"]])
+
+    def testFailedKmail(self):
+        mail = _MailHandler(["a", "b", "crash", "c"])
+        manager = _Manager()
+        d = _director(mail, manager, commitCount=10)
+        self.assertRaises(Exception, d.processNewCommunications)
+        # the kmails before the failure are committed without its effects
+        self.assertEqual(mail.committed, [["a", "b"]])
+        self.assertEqual(mail.savedState, {"count": 2})
+        self.assertEqual(mail.inbox, ["crash", "c"])
+        self.assertTrue(manager.dirty)
+
+    def testFailedItemCheck(self):
+        mail = _MailHandler(["a", "send"], itemsAvailable=False)
+        manager = _Manager()
+        d = _director(mail, manager)
+        self.assertRaises(Exception, d.processNewCommunications)
+        self.assertEqual(mail.committed, [["a"]])
+        self.assertEqual(mail.savedState, {"count": 1})
+        self.assertEqual(len(manager.failed), 1)
+
+    def testRestartAfterFailure(self):
+        mail = _MailHandler(["a", "b", "crash1", "c", "d"])
+        manager = _Manager()
+        d = _director(mail, manager)
+        self.assertRaises(Exception, d.processNewCommunications)
+        self.assertEqual(mail.committed, [["a", "b"]])
+        # after a restart, the state is loaded from the last commit and
+        # the uncommitted kmails are processed again
+        self.assertEqual(mail.inbox, ["crash1", "c", "d"])
+        restarted = _MailHandler(["retried", "c", "d"])
+        manager = _Manager(count=mail.savedState["count"])
+        _director(restarted, manager).processNewCommunications()
+        # each kmail is counted once
+        self.assertEqual(restarted.savedState, {"count": 5})
+        self.assertEqual(restarted.inbox, [])
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from cwbot.RunProperties import RunProperties
+
+
+_login = """username = TestBot
+password = secret
+"""
+
+_admins = """[groups]
+dungeon = dungeon_master, chatlog
+
+[admins]
+1000 = dungeon, fax
+2000 = fax
+"""
+
+
+class Test(unittest.TestCase):
+    """ Permissions are looked up in an immutable index built from
+    admin.ini. """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.loginFile = os.path.join(self.directory, "login.ini")
+        self.adminFile = os.path.join(self.directory, "admin.ini")
+        with open(self.loginFile, 'w') as f:
+            f.write(_login)
+        self.writeAdmins(_admins)
+        self.stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            self.props = RunProperties(False, self.loginFile, self.adminFile)
+        finally:
+            sys.stdout = self.stdout
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def writeAdmins(self, text):
+        with open(self.adminFile, 'w') as f:
+            f.write(text)
+
+    def testPermissions(self):
+        perms = self.props.getPermissions(1000)
+        self.assertIsInstance(perms, frozenset)
+        self.assertEqual(perms,
+                         frozenset(['dungeon_master', 'chatlog', 'fax', '*']))
+        self.assertEqual(self.props.getPermissions(2000),
+                         frozenset(['fax', '*']))
+        self.assertEqual(self.props.getPermissions(3000), frozenset())
+
+    def testAdmins(self):
+        # admin.ini always has the example administrator 0
+        self.assertEqual(self.props.getAdmins(), frozenset([0, 1000, 2000]))
+        self.assertEqual(self.props.getAdmins("FAX"), frozenset([1000, 2000]))
+        self.assertEqual(self.props.getAdmins("dungeon_master"),
+                         frozenset([1000]))
+        self.assertEqual(self.props.getAdmins("none"), frozenset())
+
+    def testRefresh(self):
+        perms = self.props.getPermissions(2000)
+        self.writeAdmins("[admins]\n2000 = chatlog\n")
+        sys.stdout = StringIO()
+        self.props.refresh()
+        sys.stdout = self.stdout
+        # sets that were handed out before the refresh do not change
+        self.assertEqual(perms, frozenset(['fax', '*']))
+        self.assertEqual(self.props.getPermissions(2000),
+                         frozenset(['chatlog', '*']))
+        self.assertEqual(self.props.getPermissions(1000), frozenset())
+        self.assertEqual(self.props.getAdmins(), frozenset([0, 2000]))
@@ -0,0 +1,106 @@
+import threading
+import time
+import unittest
+from kol.RequestScheduler import BACKGROUND, KMAIL
+from cwbot.util.tryRequest import RequestExecutor
+
+
+class _Request(object):
+    """ A request without a session. It fails the first numFailures times,
+    and waits for release (if given) before it returns. """
+    def __init__(self, name, log, numFailures=0, release=None):
+        self.name = name
+        self.log = log
+        self.numFailures = numFailures
+        self.release = release
+
+    def doRequest(self):
+        self.log.append(self.name)
+        if self.numFailures > 0:
+            self.numFailures -= 1
+            raise Exception("Request failed")
+        if self.release is not None:
+            self.release.wait(5)
+        return self.name
+
+
+class Test(unittest.TestCase):
+    """ The executor re-queues failed attempts instead of holding a worker,
+    and limits the workers each priority class can hold. """
+
+    def setUp(self):
+        self.log = []
+        self.results = []
+        self.done = threading.Event()
+        self.executor = RequestExecutor(name="TestExecutor")
+
+    def tearDown(self):
+        # let idle workers exit
+        self.executor.resize(1)
+
+    def callback(self, result):
+        self.results.append(result)
+        self.done.set()
+
+    def waitFor(self, condition):
+        end = time.time() + 5
+        while not condition() and time.time() < end:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def testRetryIsRequeued(self):
+        self.executor.resize(1)
+        self.executor.submit(_Request("retry", self.log, numFailures=2),
+                             self.callback, numTries=3, initialDelay=0.1)
+        self.waitFor(lambda: self.executor.snapshot()['delayed'] == 1)
+        # the only worker is free while the failed request waits to retry
+        other = threading.Event()
+        self.executor.submit(_Request("other", self.log),
+                             lambda _result: other.set())
+        self.assertTrue(other.wait(5))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.results, ["retry"])
+        self.assertEqual(self.log, ["retry", "other", "retry", "retry"])
+        s = self.executor.snapshot()
+        self.assertEqual((s['requests'], s['attempts'], s['retries'],
+                          s['failed']), (2, 4, 2, 0))
+
+    def testFailsEveryAttempt(self):
+        self.executor.submit(_Request("fail", self.log, numFailures=5),
+                             self.callback, numTries=2, initialDelay=0.01)
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.results, [None])
+        self.assertEqual(self.log, ["fail", "fail"])
+        self.assertEqual(self.executor.snapshot()['failed'], 1)
+
+    def testResize(self):
+        release = threading.Event()
+        self.executor.resize(3)
+        for i in range(3):
+            self.executor.submit(_Request(i, self.log, release=release),
+                                 priority=KMAIL)
+        self.waitFor(lambda: self.executor.snapshot()['active'] == 3)
+        self.assertEqual(self.executor.snapshot()['workers'], 3)
+        # extra workers exit after their current attempt
+        self.executor.resize(1)
+        self.assertEqual(self.executor.snapshot()['workers'], 3)
+        release.set()
+        self.waitFor(lambda: self.executor.snapshot()['workers'] == 1)
+        self.assertEqual(sorted(self.log), [0, 1, 2])
+        self.assertRaises(ValueError, self.executor.resize, 0)
+
+    def testClassLimit(self):
+        release = threading.Event()
+        self.assertEqual(self.executor.concurrency[BACKGROUND], 1)
+        for i in range(3):
+            self.executor.submit(_Request(i, self.log, release=release),
+                                 priority=BACKGROUND)
+        self.waitFor(lambda: self.executor.snapshot()['active'] == 1)
+        # background requests do not hold the other workers
+        self.executor.submit(_Request("kmail", self.log), self.callback,
+                             priority=KMAIL)
+        self.assertTrue(self.done.wait(5))
+        s = self.executor.snapshot()
+        self.assertEqual((s['active'], s['queued']), (1, 2))
+        release.set()
+        self.waitFor(lambda: len(self.log) == 4)
@@ -1,6 +1,11 @@
 import time
+import heapq
+import itertools
+from collections import defaultdict, deque
 import cwbot.util.DebugThreading as threading
 import kol.Error
+from kol.RequestEngine import Return
+from kol.RequestScheduler import RequestScheduler, defaultPriority
 import urllib2, urllib
 import httplib
 import logging
@@ -10,13 +15,34 @@ def emptyFunction():
     pass
 
 
+def _scheduleRequest(requestObj, session, priority):
+    scheduler = getattr(session, 'scheduler', None)
+    if scheduler is None:
+        return requestObj.doRequest()
+    return scheduler.run(requestObj, priority)
+
+
+def _doRequest(requestObj, priority):
+    session = getattr(requestObj, 'session', None)
+    coalescer = getattr(session, 'coalescer', None)
+    if coalescer is None:
+        return _scheduleRequest(requestObj, session, priority)
+    return coalescer.run(requestObj, 
+                         lambda: _scheduleRequest(requestObj, session, 
+                                                  priority))
+
+
 def tryRequest(requestObj, nothrow=False, numTries=3, initialDelay=1, 
-               scaleFactor=2):
+               scaleFactor=2, priority=None):
     """Try to execute a request a number of times before throwing, or 
-    optionally swallowing the error and returning None."""
+    optionally swallowing the error and returning None. Each attempt is
+    queued by the session's request scheduler with the given priority class
+    (see kol.RequestScheduler); if None, a default is chosen by request type.
+    The scheduler is not held while waiting between attempts. Identical
+    read-only requests may share a result (see kol.RequestCoalescer)."""
     for i in range(numTries):
         try:
-            result = requestObj.doRequest()
+            result = _doRequest(requestObj, priority)
             return result
         except (KeyboardInterrupt, SystemExit, SyntaxError):
             raise
@@ -30,28 +56,226 @@ def tryRequest(requestObj, nothrow=False, numTries=3, initialDelay=1,
             elif not nothrow:
                 raise
     return None
+
+
+def tryRequestAsync(requestObj, nothrow=False, numTries=3, initialDelay=1,
+                    scaleFactor=2, priority=None):
+    """A coroutine version of tryRequest, run by the session's
+    RequestEngine (see kol.RequestEngine). Each attempt is made on one of the
+    engine's I/O threads, through the scheduler and coalescer as with
+    tryRequest, but the delay between attempts does not hold a thread. 
+    Synchronous code can use engine.run(tryRequestAsync(...))."""
+    engine = requestObj.session.engine
+    if priority is None:
+        priority = defaultPriority(requestObj)
+    for i in range(numTries):
+        try:
+            result = yield engine.callInPool(_doRequest, (requestObj, priority),
+                                             priority)
+            raise Return(result)
+        except (KeyboardInterrupt, SystemExit, SyntaxError, Return):
+            raise
+        except Exception:
+            if i != numTries - 1:
+                yield engine.sleep(initialDelay * scaleFactor ** i)
+            elif not nothrow:
+                raise
+    raise Return(None)
     
     
-class ThreadedRequest(threading.Thread):
-    def __init__(self, request, callFunc, numTries, initialDelay, scaleFactor):
-        self._request = request
-        self._callFunc = callFunc
-        self._numTries = numTries
-        self._initialDelay = initialDelay
-        self._scaleFactor = scaleFactor
-        super(ThreadedRequest, self).__init__()
+class _RequestJob(object):
+    def __init__(self, requestObj, callFunc, numTries, initialDelay, 
+                 scaleFactor, priority):
+        self.request = requestObj
+        self.callFunc = callFunc
+        self.numTries = numTries
+        self.initialDelay = initialDelay
+        self.scaleFactor = scaleFactor
+        self.priority = priority
+        self.attempt = 0
+
+
+class RequestExecutor(object):
+    """A fixed number of worker threads that run requests for 
+    tryRequestThreaded. Each attempt takes a worker; a failed attempt is 
+    re-queued to run after its backoff delay, instead of holding a worker
+    while it sleeps. Queued requests are run in order of priority class 
+    (see kol.RequestScheduler). Workers are started with the first 
+    request.
+    
+    A worker still waits in the session's RequestScheduler for a slot, so
+    each priority class may only use as many workers as the scheduler lets
+    it run requests at once (RequestScheduler.concurrency); more would only
+    wait. With the default limits, background and dungeon requests hold at 
+    most three workers, and the rest are left for kmail and chat requests.
+    """
+    
+    concurrency = RequestScheduler.concurrency
+    
+    def __init__(self, numWorkers=4, name="RequestExecutor", 
+                 concurrency=None):
+        self._numWorkers = numWorkers
+        self._name = name
+        self.concurrency = dict(self.concurrency)
+        if concurrency is not None:
+            self.concurrency.update(concurrency)
+        self._cond = threading.Condition()
+        self._ready = defaultdict(deque) # priority -> jobs
+        self._delayed = [] # heap of (time, sequence, job)
+        self._sequence = itertools.count()
+        self._workers = 0
+        self._workerIds = itertools.count()
+        self._active = defaultdict(int) # priority -> running jobs
+        self._stats = {'requests': 0, 'attempts': 0, 'retries': 0, 
+                       'failed': 0}
+        self._log = logging.getLogger()
+        
+        
+    @property
+    def numWorkers(self):
+        return self._numWorkers
+    
+    
+    def resize(self, numWorkers):
+        """ Change the number of workers. Extra workers exit after
+        finishing their current attempt. """
+        if numWorkers < 1:
+            raise ValueError("An executor needs at least one worker.")
+        with self._cond:
+            self._numWorkers = numWorkers
+            self._cond.notify_all()
+            if self._workers > 0:
+                self._startWorkers()
+                
+                
+    def submit(self, requestObj, callFunc=emptyFunction, numTries=3, 
+               initialDelay=1, scaleFactor=2, priority=None):
+        """ Queue a request. callFunc is called with the result, or None
+        if every attempt failed. """
+        if priority is None:
+            priority = defaultPriority(requestObj)
+        job = _RequestJob(requestObj, callFunc, numTries, initialDelay, 
+                          scaleFactor, priority)
+        with self._cond:
+            self._stats['requests'] += 1
+            self._ready[priority].append(job)
+            self._startWorkers()
+            self._cond.notify_all()
+            
+            
+    def _startWorkers(self):
+        # must hold self._cond
+        while self._workers < self._numWorkers:
+            self._workers += 1
+            t = threading.Thread(target=self._work, 
+                                 name="{}-{}".format(self._name, 
+                                                     next(self._workerIds)))
+            t.daemon = True
+            t.start()
+            
+            
+    def _runnableJob(self):
+        """ Get the most urgent queued job whose priority class has a 
+        worker to spare, or None. Must hold self._cond. """
+        for priority in sorted(p for p,jobs in self._ready.items() if jobs):
+            limit = self.concurrency.get(priority, self._numWorkers)
+            if self._active[priority] < limit:
+                job = self._ready[priority].popleft()
+                self._active[priority] += 1
+                self._stats['attempts'] += 1
+                return job
+        return None
+            
+            
+    def _nextJob(self):
+        """ Wait for a job that is ready to run. Returns None if this 
+        worker should exit. """
+        with self._cond:
+            while True:
+                if self._workers > self._numWorkers:
+                    self._workers -= 1
+                    return None
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _t, _seq, job = heapq.heappop(self._delayed)
+                    self._ready[job.priority].append(job)
+                job = self._runnableJob()
+                if job is not None:
+                    return job
+                if self._delayed:
+                    self._cond.wait(self._delayed[0][0] - now)
+                else:
+                    self._cond.wait()
+                
+                
+    def _work(self):
+        while True:
+            job = self._nextJob()
+            if job is None:
+                return
+            try:
+                self._runJob(job)
+            finally:
+                with self._cond:
+                    self._active[job.priority] -= 1
+                    # a job of this class may be waiting for the worker
+                    self._cond.notify_all()
+                    
+                    
+    def _runJob(self, job):
+        try:
+            result = _doRequest(job.request, job.priority)
+        except (KeyboardInterrupt, SystemExit, SyntaxError):
+            raise
+        except Exception:
+            job.attempt += 1
+            if job.attempt < job.numTries:
+                delay = job.initialDelay * job.scaleFactor ** (job.attempt - 1)
+                with self._cond:
+                    self._stats['retries'] += 1
+                    heapq.heappush(self._delayed, (time.time() + delay, 
+                                                   next(self._sequence), job))
+                    self._cond.notify()
+                return
+            with self._cond:
+                self._stats['failed'] += 1
+            result = None
+        try:
+            job.callFunc(result)
+        except Exception:
+            self._log.exception("Error in callback for {}"
+                                .format(job.request.__class__.__name__))
+            
+            
+    def snapshot(self):
+        """ Get the executor's counters: the number of workers, the 
+        number running a request, the number of requests queued and 
+        waiting to be retried, and the totals of requests, attempts, 
+        retries and requests that failed every attempt. """
+        with self._cond:
+            result = dict(self._stats)
+            result.update({'workers': self._workers, 
+                           'maxWorkers': self._numWorkers,
+                           'active': sum(self._active.values()), 
+                           'queued': sum(len(jobs) for jobs 
+                                         in self._ready.values()),
+                           'delayed': len(self._delayed)})
+            return result
         
-    def run(self):
-        result = tryRequest(self._request, True, self._numTries, 
-                            self._initialDelay, self._scaleFactor)
-        self._callFunc(result)
+        
+_executor = RequestExecutor()
+
+
+def threadedRequestExecutor():
+    """Get the shared RequestExecutor used by tryRequestThreaded."""
+    return _executor
 
 
 def tryRequestThreaded(requestObj, callFunc=emptyFunction, numTries=3, 
-                       initialDelay=1, scaleFactor=2):
-    """Try to execute a request in a new thread, and call callFunc with 
-    the results (None if an exception occurred)"""
-    t = ThreadedRequest(requestObj, callFunc, numTries, 
-                        initialDelay, scaleFactor)
-    t.start()
+                       initialDelay=1, scaleFactor=2, priority=None):
+    """Try to execute a request on the shared RequestExecutor, and call 
+    callFunc with the results (None if an exception occurred). callFunc is
+    called from one of the executor's threads."""
+    _executor.submit(requestObj, callFunc, numTries, initialDelay, 
+                     scaleFactor, priority)
     
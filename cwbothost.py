@@ -0,0 +1,5 @@
+from cwbot.host import main
+
+
+if __name__ == "__main__":
+    main()
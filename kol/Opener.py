@@ -1,6 +1,9 @@
 import cookielib
 import urllib2
 import urllib
+import urlparse
+import threading
+import time
 import traceback
 
 try:
@@ -26,17 +29,94 @@ class StandardOpener(object):
         self.response = self.opener.open(url, urllib.urlencode(requestData))
         return Response(self.response.read(), self.response.geturl())
 
-class RequestsOpener(object):
-    "This class provides a generic wrapper around requests"
+class RequestStats(object):
+    "This class keeps request counts, latency and bytes read for each endpoint"
 
     def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, url, seconds, numBytes):
+        endpoint = urlparse.urlsplit(url).path.lstrip("/")
+        with self._lock:
+            s = self._stats.get(endpoint)
+            if s is None:
+                s = {"requests" : 0, "seconds" : 0.0, "maxSeconds" : 0.0, "bytes" : 0}
+                self._stats[endpoint] = s
+            s["requests"] += 1
+            s["seconds"] += seconds
+            s["maxSeconds"] = max(s["maxSeconds"], seconds)
+            s["bytes"] += numBytes
+
+    def snapshot(self):
+        "Returns a copy of the counters, as a dict of endpoint -> counters"
+        with self._lock:
+            return dict((k, dict(v)) for k,v in self._stats.items())
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+def _bytesRead(response):
+    # bytes read from the connection (compressed size if gzipped)
+    try:
+        return response.raw.tell()
+    except AttributeError:
+        return len(response.content)
+
+class RequestsOpener(object):
+    """This class provides a generic wrapper around requests. Connections
+    are kept alive in a pool. The pool is sized for cwbot's thread model:
+    the main thread, the mail handler, the heartbeat threads and up to
+    100 message threads may all make requests at the same time."""
+
+    poolConnections = 4     # number of hosts to keep a connection pool for
+    poolMaxSize = 110       # connections kept alive per host
+    poolBlock = False       # if True, never open more than poolMaxSize per host
+    timeout = (10, 60)      # (connect, read) timeouts in seconds
+
+    def __init__(self, poolConnections=None, poolMaxSize=None, poolBlock=None, timeout=None, compress=True):
+        if poolConnections is not None:
+            self.poolConnections = poolConnections
+        if poolMaxSize is not None:
+            self.poolMaxSize = poolMaxSize
+        if poolBlock is not None:
+            self.poolBlock = poolBlock
+        if timeout is not None:
+            self.timeout = timeout
         self.opener = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.poolConnections,
+                                                pool_maxsize=self.poolMaxSize,
+                                                pool_block=self.poolBlock)
+        self.opener.mount("http://", adapter)
+        self.opener.mount("https://", adapter)
+        if compress:
+            self.opener.headers["Accept-Encoding"] = "gzip, deflate"
+        else:
+            self.opener.headers["Accept-Encoding"] = "identity"
+        self.stats = RequestStats()
 
     def open(self, url, requestData):
 #        traceback.print_stack()
-        self.response = self.opener.post(url, data=requestData)
-        return Response(self.response.text, self.response.url)
+        t0 = time.time()
+        self.response = self.opener.post(url, data=requestData, timeout=self.timeout)
+        text = self.response.text
+        self.stats.record(url, time.time() - t0, _bytesRead(self.response))
+        return Response(text, self.response.url)
 
     def get(self, url, requestData):
-        self.response = self.opener.get(url, params=requestData)
-        return Response(self.response.text, self.response.url)
+        t0 = time.time()
+        self.response = self.opener.get(url, params=requestData, timeout=self.timeout)
+        text = self.response.text
+        self.stats.record(url, time.time() - t0, _bytesRead(self.response))
+        return Response(text, self.response.url)
+
+    def stream(self, url, requestData):
+        """Returns a streaming requests response. The caller reads the body
+        and must call record() when it is done, and close the response."""
+        self.response = self.opener.post(url, data=requestData, stream=True, timeout=self.timeout)
+        return self.response
+
+    def record(self, url, seconds, numBytes):
+        "Adds a request to the per-endpoint counters"
+        self.stats.record(url, seconds, numBytes)
@@ -0,0 +1,150 @@
+import copy
+import threading
+import time
+
+# Read-only request types that may be coalesced. For each type: the number of
+# seconds a result may be reused for, the request attributes (besides the URL
+# and form data) that affect the result, whether the cached result is
+# discarded whenever a mutating request is made, and whether the result is
+# handed to every caller as-is instead of copied. Callers must not modify such
+# results; the raid log is only read by the dungeon managers, which freeze it.
+readRequests = {
+    "StatusRequest" : (2.0, (), True, False),
+    "InventoryRequest" : (2.0, ("ignoreItemDatabase", "quantitiesOnly"), True, False),
+    "ClanRaidLogRequest" : (5.0, ("previousRuns",), False, True),
+}
+
+# Request types that do not change the character's state, so they do not
+# invalidate cached reads. GetMessagesRequest is not one of them: new kmails
+# mean that items and meat have arrived.
+nonMutatingRequests = set([
+    "GetChatMessagesRequest",
+    "OpenChatRequest",
+    "SendChatRequest",
+    "SaveMessagesRequest",
+    "DeleteMessagesRequest",
+    "UserProfileRequest",
+    "ClanLogPartialRequest",
+    "ClanDetailedMemberRequest",
+    "ClanWhitelistRequest",
+    "GetDisplayCaseRequest",
+    "CharpaneRequest",
+    "HomepageRequest",
+])
+
+class _Flight(object):
+    "A request that is in progress, shared by all callers that asked for it"
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.responseText = None
+        self.error = None
+        self.stale = False
+
+class RequestCoalescer(object):
+    """This class merges identical read-only requests. While a request is in
+    progress, other callers making the same request wait for it and share its
+    result instead of contacting the server. Results are also reused for a
+    short time afterwards (see readRequests). Each caller receives its own
+    copy of the result, so callers may modify it, unless readRequests says
+    that the result is not copied. Any request that may change the
+    character's state discards the cached results that it may affect.
+
+    A request whose result is shared is not performed, so its responseData is
+    set to the (copy of the) result, and its responseText to the text of the
+    request that was performed. A request with a true forceRefresh attribute
+    is always performed; its result replaces the cached one."""
+
+    def __init__(self, readRequests=readRequests, nonMutatingRequests=nonMutatingRequests):
+        self.readRequests = dict(readRequests)
+        self.nonMutatingRequests = set(nonMutatingRequests)
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._results = {}      # key -> (time, finished _Flight)
+        self.stats = {"requests" : 0, "shared" : 0, "cached" : 0}
+
+    def _key(self, requestObj, keyAttrs):
+        data = tuple(sorted(getattr(requestObj, "requestData", {}).items()))
+        attrs = tuple(getattr(requestObj, a, None) for a in keyAttrs)
+        return (requestObj.__class__.__name__, getattr(requestObj, "url", None), data, attrs)
+
+    def invalidate(self, volatileOnly=False):
+        """Discards cached results (if volatileOnly, only those affected by
+        mutating requests). Requests in progress may have started before the
+        state changed, so later callers do not share them."""
+        with self._lock:
+            for key in self._results.keys():
+                if not volatileOnly or self.readRequests[key[0]][2]:
+                    del self._results[key]
+            for key, flight in self._flights.items():
+                if not volatileOnly or self.readRequests[key[0]][2]:
+                    flight.stale = True
+                    del self._flights[key]
+
+    def run(self, requestObj, func):
+        """Gets the result of requestObj, calling func() to perform the request
+        if it cannot be shared with another caller."""
+        name = requestObj.__class__.__name__
+        policy = self.readRequests.get(name)
+        if policy is None:
+            if name in self.nonMutatingRequests:
+                return func()
+            # reads made while this request is in progress may or may not
+            # see its effects, so invalidate both before and after
+            self.invalidate(volatileOnly=True)
+            try:
+                return func()
+            finally:
+                self.invalidate(volatileOnly=True)
+
+        freshness, keyAttrs, _volatile, noCopy = policy
+        key = self._key(requestObj, keyAttrs)
+        refresh = getattr(requestObj, "forceRefresh", False)
+        with self._lock:
+            self.stats["requests"] += 1
+            cached = self._results.get(key)
+            if (not refresh and cached is not None 
+                    and time.time() - cached[0] <= freshness):
+                self.stats["cached"] += 1
+                return self._share(requestObj, cached[1], noCopy)
+            flight = self._flights.get(key)
+            leader = flight is None or refresh
+            if leader:
+                if flight is not None:
+                    # an older request is in progress; do not cache its result
+                    flight.stale = True
+                flight = _Flight()
+                self._flights[key] = flight
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._share(requestObj, flight, noCopy)
+
+        try:
+            result = func()
+            flight.result = result if noCopy else copy.deepcopy(result)
+            flight.responseText = getattr(requestObj, "responseText", None)
+            with self._lock:
+                if not flight.stale:
+                    self._results[key] = (time.time(), flight)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _share(self, requestObj, flight, noCopy):
+        "Gives requestObj the result of a finished flight, or a copy of it."
+        result = flight.result if noCopy else copy.deepcopy(flight.result)
+        requestObj.responseData = result
+        requestObj.responseText = flight.responseText
+        return result
@@ -0,0 +1,389 @@
+"""
+An event loop that runs requests as coroutines, so that work which spends most of its time
+waiting (for a throttle, a retry delay or a queue) does not need a thread of its own.
+
+There is no asyncio in Python 2, so coroutines are generators. A coroutine waits for a Future
+by yielding it; the yield expression evaluates to the Future's result, or raises its exception.
+A coroutine returns a value by raising Return(value). For example:
+
+    def fetchTwice(engine, request):
+        first = yield engine.callInPool(request.doRequest)
+        yield engine.sleep(1)
+        second = yield engine.callInPool(request.doRequest)
+        raise Return((first, second))
+
+All coroutines run on the engine's loop thread. Blocking calls -- including the HTTP requests
+themselves, since the requests library cannot be used without blocking -- are made on a fixed
+pool of I/O threads with callInPool(). Calls waiting for an I/O thread are started in order of
+priority (see kol.RequestScheduler), so chat is not stuck behind background requests.
+
+Synchronous code uses run() to run a coroutine and wait for its result, and coroutines use
+callInPool() to call synchronous code, so existing code keeps working as it is.
+
+The engine only runs code that is written as coroutines. In cwbot, that is chat sending (see
+AsyncMessageDispatcher, used with --request-engine). Chat and kmail polling, the mail handler
+and the heartbeat keep their own threads, and requests are still made with the blocking
+opener, one per I/O thread.
+"""
+
+from kol.util import Report
+
+from collections import deque
+import heapq
+import itertools
+import Queue
+import sys
+import threading
+import time
+import types
+
+class Return(Exception):
+    "Raised by a coroutine to return a value."
+
+    def __init__(self, value=None):
+        super(Return, self).__init__()
+        self.value = value
+
+class TimeoutError(Exception):
+    "Raised by Future.result() when the result is not ready in time."
+    pass
+
+class StoppedError(Exception):
+    "The exception of Futures for coroutines and calls that the engine abandoned when it stopped."
+    pass
+
+class Future(object):
+    """
+    The result of an operation that may not have finished yet. Callbacks added with
+    addDoneCallback() are called with the Future when it finishes, on the thread that finishes
+    it. A Future can be finished once; later results are ignored.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._done = False
+        self._result = None
+        self._excInfo = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def setResult(self, result):
+        self._finish(result, None)
+
+    def setException(self, excInfo):
+        "Finishes the Future with an exception, given as a sys.exc_info() tuple."
+        self._finish(None, excInfo)
+
+    def _finish(self, result, excInfo):
+        with self._cond:
+            if self._done:
+                return
+            self._result = result
+            self._excInfo = excInfo
+            self._done = True
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._cond.notify_all()
+        for callback in callbacks:
+            callback(self)
+
+    def addDoneCallback(self, callback):
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def exception(self):
+        "Returns the exception the Future finished with, or None."
+        if self._excInfo is None:
+            return None
+        return self._excInfo[1]
+
+    def result(self, timeout=None):
+        "Waits for the Future to finish, and returns its result or raises its exception."
+        with self._cond:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise TimeoutError("Timed out after %s seconds." % timeout)
+        if self._excInfo is not None:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]
+        return self._result
+
+class RequestEngine(object):
+    """
+    Runs coroutines on a single loop thread, and blocking calls on a pool of ioThreads threads.
+    The pool should have at least as many threads as the request scheduler lets requests run at
+    once, since calls made through the scheduler hold an I/O thread while they wait for it.
+    """
+
+    ioThreads = 10
+
+    def __init__(self, ioThreads=None, name="RequestEngine"):
+        if ioThreads is not None:
+            self.ioThreads = ioThreads
+        self.name = name
+        self._cond = threading.Condition(threading.Lock())
+        self._ready = deque()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._ioQueue = Queue.PriorityQueue()
+        self._threads = []
+        self._loopThread = None
+        self._running = False
+        self._stopped = False
+        self._coroutines = set()
+        self._statsLock = threading.Lock()
+        self._stats = {"coroutines" : 0, "running" : 0, "ioCalls" : 0, "ioActive" : 0}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._stopped = False
+        self._loopThread = threading.Thread(target=self._loop, name=self.name)
+        self._threads = [self._loopThread]
+        for i in range(self.ioThreads):
+            self._threads.append(threading.Thread(target=self._ioWorker, name="%s-io-%d" % (self.name, i)))
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the loop and the I/O threads. I/O calls that have already started are allowed to
+        finish. The Futures of calls that have not started and of coroutines that have not
+        finished raise StoppedError, as do those of calls and coroutines started afterwards.
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._stopped = True
+            self._cond.notify_all()
+        abandoned = []
+        while True:
+            try:
+                abandoned.append(self._ioQueue.get_nowait()[4])
+            except Queue.Empty:
+                break
+        for _ in range(self.ioThreads):
+            self._ioQueue.put((-1, next(self._sequence), None, None, None))
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout)
+        self._threads = []
+        with self._statsLock:
+            abandoned.extend(self._coroutines)
+        for future in abandoned:
+            self._abandon(future)
+
+    def _abandon(self, future):
+        future.setException((StoppedError, StoppedError("%s has stopped." % self.name), None))
+
+    def isLoopThread(self):
+        return threading.current_thread() is self._loopThread
+
+    def callSoon(self, func, *args):
+        "Calls func(*args) on the loop thread. May be called from any thread."
+        with self._cond:
+            self._ready.append((func, args))
+            self._cond.notify()
+
+    def callLater(self, seconds, func, *args):
+        "Calls func(*args) on the loop thread after the given number of seconds."
+        with self._cond:
+            heapq.heappush(self._timers, (time.time() + seconds, next(self._sequence), func, args))
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ready:
+                    if self._timers:
+                        delay = self._timers[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                if not self._running:
+                    return
+                now = time.time()
+                while self._timers and self._timers[0][0] <= now:
+                    _when, _seq, func, args = heapq.heappop(self._timers)
+                    self._ready.append((func, args))
+                calls = self._ready
+                self._ready = deque()
+            for func, args in calls:
+                try:
+                    func(*args)
+                except Exception as e:
+                    Report.error("request", "Error in %s callback." % self.name, e)
+
+    def spawn(self, coroutine):
+        """
+        Starts running a coroutine (a generator; see the module documentation) on the loop.
+        Returns a Future for the value it returns. May be called from any thread.
+        """
+        if not isinstance(coroutine, types.GeneratorType):
+            raise TypeError("%r is not a coroutine." % (coroutine,))
+        future = Future()
+        with self._statsLock:
+            stopped = self._stopped
+            if not stopped:
+                self._stats["coroutines"] += 1
+                self._stats["running"] += 1
+                self._coroutines.add(future)
+        if stopped:
+            self._abandon(future)
+            return future
+        future.addDoneCallback(self._coroutineDone)
+        self.callSoon(self._step, coroutine, future, None, None)
+        return future
+
+    def _coroutineDone(self, future):
+        with self._statsLock:
+            self._stats["running"] -= 1
+            self._coroutines.discard(future)
+
+    def _step(self, coroutine, future, value, excInfo):
+        try:
+            if excInfo is not None:
+                yielded = coroutine.throw(*excInfo)
+            else:
+                yielded = coroutine.send(value)
+        except StopIteration:
+            future.setResult(None)
+            return
+        except Return as r:
+            future.setResult(r.value)
+            return
+        except Exception:
+            future.setException(sys.exc_info())
+            return
+        if not isinstance(yielded, Future):
+            error = TypeError("Coroutines must yield Futures, not %r." % (yielded,))
+            self.callSoon(self._step, coroutine, future, None, (TypeError, error, None))
+            return
+        yielded.addDoneCallback(lambda f: self.callSoon(self._resume, coroutine, future, f))
+
+    def _resume(self, coroutine, future, waitedFor):
+        self._step(coroutine, future, waitedFor._result, waitedFor._excInfo)
+
+    def run(self, coroutine, timeout=None):
+        """
+        Runs a coroutine and waits for its result. This is how synchronous code calls
+        coroutines; it must not be called from the loop thread, which would wait for itself.
+        """
+        if self.isLoopThread():
+            raise RuntimeError("RequestEngine.run() cannot be called from a coroutine.")
+        return self.spawn(coroutine).result(timeout)
+
+    def sleep(self, seconds):
+        "Returns a Future that finishes after the given number of seconds."
+        future = Future()
+        self.callLater(seconds, future.setResult, None)
+        return future
+
+    def callInPool(self, func, args=(), priority=0):
+        """
+        Calls func(*args) on an I/O thread. Returns a Future for its result. Calls with a lower
+        priority number are started first.
+        """
+        future = Future()
+        with self._cond:
+            stopped = self._stopped
+            if not stopped:
+                self._ioQueue.put((priority, next(self._sequence), func, args, future))
+        if stopped:
+            self._abandon(future)
+        return future
+
+    def _ioWorker(self):
+        while True:
+            _priority, _seq, func, args, future = self._ioQueue.get()
+            if func is None:
+                return
+            with self._statsLock:
+                self._stats["ioCalls"] += 1
+                self._stats["ioActive"] += 1
+            result = None
+            excInfo = None
+            try:
+                result = func(*args)
+            except Exception:
+                excInfo = sys.exc_info()
+            with self._statsLock:
+                self._stats["ioActive"] -= 1
+            if excInfo is not None:
+                future.setException(excInfo)
+            else:
+                future.setResult(result)
+
+    def snapshot(self):
+        """
+        Returns a copy of the engine's counters: coroutines started and still running, I/O
+        calls made and running, and the number of calls waiting for an I/O thread.
+        """
+        with self._statsLock:
+            result = dict(self._stats)
+        result["ioWaiting"] = self._ioQueue.qsize()
+        with self._cond:
+            result["timers"] = len(self._timers)
+        return result
+
+class AsyncQueue(object):
+    """
+    A FIFO queue for coroutines: get() returns a Future instead of blocking. put() may be
+    called from any thread.
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._items = deque()
+        self._getters = deque()
+
+    def put(self, item):
+        with self._lock:
+            if not self._getters:
+                self._items.append(item)
+                return
+            getter = self._getters.popleft()
+        getter.setResult(item)
+
+    def get(self, timeout=None):
+        """
+        Returns a Future for the next item. If timeout is given and no item arrives in time, the
+        Future raises Queue.Empty.
+        """
+        future = Future()
+        with self._lock:
+            if not self._items:
+                self._getters.append(future)
+                if timeout is not None:
+                    self._engine.callLater(timeout, self._expire, future)
+                return future
+            item = self._items.popleft()
+        future.setResult(item)
+        return future
+
+    def _expire(self, future):
+        with self._lock:
+            try:
+                self._getters.remove(future)
+            except ValueError:
+                return
+        future.setException((Queue.Empty, Queue.Empty(), None))
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
+
+    def empty(self):
+        return self.qsize() == 0
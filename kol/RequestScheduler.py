@@ -0,0 +1,158 @@
+import threading
+import time
+
+# Priority classes, from most to least urgent.
+CHAT = 0
+KMAIL = 1
+DUNGEON = 2
+BACKGROUND = 3
+
+priorityNames = {CHAT : "chat", KMAIL : "kmail", DUNGEON : "dungeon", BACKGROUND : "background"}
+
+# Priority used for a request when the caller does not give one. Requests not
+# listed here are usually made in reply to a kmail or a chat command.
+_defaultPriorities = {
+    "GetChatMessagesRequest" : CHAT,
+    "SendChatRequest" : CHAT,
+    "OpenChatRequest" : CHAT,
+    "ClanRaidLogRequest" : DUNGEON,
+}
+
+def defaultPriority(requestObj):
+    "Returns the priority class used for a request if none is specified"
+    return _defaultPriorities.get(requestObj.__class__.__name__, KMAIL)
+
+class RequestScheduler(object):
+    """This class coordinates the requests made by a session. Before a request
+    is sent, it must acquire a slot for its priority class. A slot is granted
+    when the class is below its concurrency cap, no more urgent class is waiting
+    for a slot it could use, and a token is available in the global token
+    bucket, which limits the overall request rate. The time spent waiting for a
+    slot is recorded for each class.
+
+    Some requests take a lock in doRequest(), so a thread holding such a lock
+    could wait for a slot that is held by a thread waiting for the lock. Such
+    requests name the lock in their 'lock' attribute, and run() takes it
+    before the slot, so that a slot is never held while waiting for the lock.
+    The lock must be reentrant, since doRequest() takes it again. As a last
+    resort against locks that are not declared, a request that has waited
+    longer than maxWait seconds ignores the concurrency caps (it still needs
+    a token)."""
+
+    rate = 5.0              # tokens added to the bucket per second
+    burst = 10              # maximum number of tokens in the bucket
+    maxWait = 30            # seconds before a request ignores concurrency caps
+    concurrency = {CHAT : 2, KMAIL : 4, DUNGEON : 2, BACKGROUND : 1}
+
+    def __init__(self, rate=None, burst=None, concurrency=None, maxWait=None):
+        if rate is not None:
+            self.rate = rate
+        if burst is not None:
+            self.burst = burst
+        if maxWait is not None:
+            self.maxWait = maxWait
+        self.concurrency = dict(self.concurrency)
+        if concurrency is not None:
+            self.concurrency.update(concurrency)
+
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._tokens = float(self.burst)
+        self._lastRefill = time.time()
+        self._active = dict((p, 0) for p in self.concurrency)
+        self._waiting = dict((p, 0) for p in self.concurrency)
+        self._stats = {}
+        self.reset()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._lastRefill) * self.rate)
+        self._lastRefill = now
+
+    def _canUseSlot(self, priority):
+        return self._active[priority] < self.concurrency[priority]
+
+    def _moreUrgentWaiting(self, priority):
+        for p in self._waiting:
+            if p < priority and self._waiting[p] > 0 and self._canUseSlot(p):
+                return True
+        return False
+
+    def acquire(self, priority):
+        "Blocks until a slot is available for the given priority class"
+        start = time.time()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._refill()
+                    remaining = start + self.maxWait - time.time()
+                    if remaining <= 0 or (self._canUseSlot(priority) and
+                                          not self._moreUrgentWaiting(priority)):
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            self._active[priority] += 1
+                            break
+                        self._cond.wait((1 - self._tokens) / self.rate)
+                    else:
+                        self._cond.wait(remaining)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+            waited = time.time() - start
+            s = self._stats[priority]
+            s["requests"] += 1
+            if waited >= self.maxWait:
+                s["overdue"] += 1
+            s["queueSeconds"] += waited
+            s["maxQueueSeconds"] = max(s["maxQueueSeconds"], waited)
+
+    def release(self, priority):
+        with self._cond:
+            self._active[priority] -= 1
+            self._cond.notify_all()
+
+    def run(self, requestObj, priority=None):
+        """Performs requestObj.doRequest() once a slot is available. Requests
+        made while the current thread already holds a slot (for example, by a
+        request that makes other requests) are not scheduled again. If the
+        request has a lock attribute, the lock is held while waiting for the
+        slot and during the request."""
+        if getattr(self._local, "holding", False):
+            return requestObj.doRequest()
+        if priority is None:
+            priority = defaultPriority(requestObj)
+        lock = getattr(requestObj, "lock", None)
+        if lock is None:
+            return self._run(requestObj, priority)
+        with lock:
+            return self._run(requestObj, priority)
+
+    def _run(self, requestObj, priority):
+        self.acquire(priority)
+        self._local.holding = True
+        try:
+            return requestObj.doRequest()
+        finally:
+            self._local.holding = False
+            self.release(priority)
+
+    def snapshot(self):
+        """Returns a copy of the queue-time counters, as a dict of priority
+        class name -> counters. The number of requests currently running and
+        waiting in each class is also included."""
+        with self._cond:
+            result = {}
+            for p, s in self._stats.items():
+                s = dict(s)
+                s["active"] = self._active[p]
+                s["waiting"] = self._waiting[p]
+                result[priorityNames.get(p, p)] = s
+            return result
+
+    def reset(self):
+        with self._cond:
+            self._stats = dict((p, {"requests" : 0, "queueSeconds" : 0.0,
+                                    "maxQueueSeconds" : 0.0, "overdue" : 0})
+                               for p in self.concurrency)
@@ -10,13 +10,33 @@ import cookielib
 import hashlib
 import requests # requests library is required
 from Opener import RequestsOpener as Opener
+from RequestScheduler import RequestScheduler
+from RequestCoalescer import RequestCoalescer
 
 
 class Session(object):
     "This class represents a user's session with The Kingdom of Loathing."
 
-    def __init__(self):
-        self.opener = Opener()
+    def __init__(self, opener=None, scheduler=None, coalescer=None, engine=None):
+        """
+        Creates a session. By default, requests are made with a pooled
+        RequestsOpener. Another opener (for example, one that talks to a local
+        stub server) may be supplied instead. Requests made with
+        cwbot.util.tryRequest are queued by the session's RequestScheduler,
+        and identical read-only requests are merged by its RequestCoalescer.
+        If a started RequestEngine is given, requests can also be made from
+        coroutines (see kol.RequestEngine).
+        """
+        if opener is None:
+            opener = Opener()
+        self.opener = opener
+        if scheduler is None:
+            scheduler = RequestScheduler()
+        self.scheduler = scheduler
+        if coalescer is None:
+            coalescer = RequestCoalescer()
+        self.coalescer = coalescer
+        self.engine = engine
             
         self.isConnected = False
         self.userId = None
@@ -2,9 +2,24 @@
 This module provides a standard way of registering and executing filter hooks.
 """
 
+import bisect
+import threading
+import time
+
 # A mapping from eventName to an array of filters.
 __filters = {}
 
+# A mapping from eventName to (realEventName, filters), where filters is the flattened list of
+# every filter that executeFiltersForEvent runs for that event, in order. This is cleared
+# whenever a filter is registered.
+__chains = {}
+
+# A mapping from filter to a dict with the number of times it ran and the total seconds spent.
+__stats = {}
+
+__lock = threading.Lock()
+__statsLock = threading.Lock()
+
 # Return codes that can be set by filters.
 ABORT = 0
 CONTINUE = 1
@@ -16,18 +31,44 @@ def registerFilterForEvent(filter, eventName, loadOrder=10):
     are executed in when more than one filter is registered for a single event. The filters
     with the lowest loadOrder will be executed first.
     """
-    if eventName in __filters:
-        filtersForEvent = __filters[eventName]
-        i = 0
-        while i < len(filtersForEvent):
-            if loadOrder >= filtersForEvent[i][1]:
-                i += 1
-            else:
+    with __lock:
+        if eventName in __filters:
+            filtersForEvent = __filters[eventName]
+            i = bisect.bisect_right([f[1] for f in filtersForEvent], loadOrder)
+            filtersForEvent.insert(i, (filter, loadOrder))
+        else:
+            __filters[eventName] = [(filter, loadOrder)]
+        __chains.clear()
+
+def getFilterChain(eventName):
+    """
+    Returns (realEventName, filters) for an event. An event such as "botProcessKmail:myBot"
+    runs the filters for "botProcessKmail:myBot" and then those for "botProcessKmail". The
+    chain is computed once for each event name and cached.
+    """
+    chain = __chains.get(eventName)
+    if chain is not None:
+        return chain
+
+    with __lock:
+        index = eventName.find(':')
+        if index < 0:
+            realEventName = eventName
+        else:
+            realEventName = eventName[:index]
+
+        filters = []
+        name = eventName
+        while True:
+            if name in __filters:
+                filters.extend(f[0] for f in __filters[name])
+            if name == realEventName:
                 break
+            name = name[:name.rfind(':')]
 
-        filtersForEvent.insert(i, (filter, loadOrder))
-    else:
-        __filters[eventName] = [(filter, loadOrder)]
+        chain = (realEventName, tuple(filters))
+        __chains[eventName] = chain
+        return chain
 
 def executeFiltersForEvent(eventName, context=None, **kwargs):
     """
@@ -39,27 +80,35 @@ def executeFiltersForEvent(eventName, context=None, **kwargs):
     if context == None:
         context = {}
 
-    index = eventName.find(':')
-    if index < 0:
-        realEventName = eventName
-    else:
-        realEventName = eventName[:index]
+    realEventName, filters = getFilterChain(eventName)
 
     returnCode = CONTINUE
-    keepGoing = True
-    while keepGoing:
-        if eventName in __filters:
-            for filter in __filters[eventName]:
-                returnCode = filter[0].doFilter(realEventName, context, **kwargs)
-                if returnCode != CONTINUE:
-                    keepGoing = False
-                    break
-
-        if eventName == realEventName:
-            keepGoing = False
-        else:
-            index = eventName.rfind(':')
-            if index >= 0:
-                eventName = eventName[:index]
+    for filter in filters:
+        start = time.time()
+        try:
+            returnCode = filter.doFilter(realEventName, context, **kwargs)
+        finally:
+            seconds = time.time() - start
+            with __statsLock:
+                stats = __stats.get(filter)
+                if stats is None:
+                    stats = __stats[filter] = {"calls" : 0, "seconds" : 0.0}
+                stats["calls"] += 1
+                stats["seconds"] += seconds
+        if returnCode != CONTINUE:
+            break
 
     return returnCode
+
+def getFilterStats():
+    "Returns a copy of the timing counters, as a dict of filter name -> counters."
+    result = {}
+    with __statsLock:
+        for filter, stats in __stats.items():
+            name = getattr(filter, "__name__", repr(filter))
+            result[name] = dict(stats)
+    return result
+
+def resetFilterStats():
+    with __statsLock:
+        __stats.clear()
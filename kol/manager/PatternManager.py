@@ -3,13 +3,37 @@ The purpose of this class is to provide a one-stop-shop for getting and storing
 regular expression patterns. I have found that often patterns can be shared across different
 request types, so it makes sense to have a central location to store them instead of storing
 copies in each class.
+
+Patterns are compiled the first time they are requested, or all at once by precompileAll().
+Looking up a pattern that has already been compiled does not take a lock, so it is safe and
+cheap to call getOrCompilePattern from any thread.
+
+For profiling, enableProfiling() makes getOrCompilePattern return patterns that count how
+often they are looked up and used, and how long their matching takes. The counters are read
+with getStatistics(). Patterns that callers looked up before profiling was enabled are not
+counted.
 """
 
 from kol.data import Patterns
 
 import re
+import threading
+import time
 
 __compiledPatterns = {}
+__profiledPatterns = {}
+__lock = threading.Lock()
+__profiling = False
+
+def _compile(patternId):
+    if patternId not in Patterns.patterns:
+        raise KeyError("Pattern '%s' not found." % patternId)
+    pattern = Patterns.patterns[patternId]
+    if type(pattern) == str:
+        return re.compile(pattern)
+    elif type(pattern) == tuple:
+        return re.compile(pattern[0], pattern[1])
+    raise TypeError("Unexpected type found for pattern '%s'" % patternId)
 
 def getOrCompilePattern(patternId):
     """
@@ -17,17 +41,128 @@ def getOrCompilePattern(patternId):
     method will compile the regular expression and then store it so that it does not need
     to be compiled again.
     """
-    if patternId in __compiledPatterns:
-        return __compiledPatterns[patternId]
-
-    if patternId in Patterns.patterns:
-        pattern = Patterns.patterns[patternId]
-        if type(pattern) == str:
-            __compiledPatterns[patternId] = re.compile(pattern)
-        elif type(pattern) == tuple:
-            __compiledPatterns[patternId] = re.compile(pattern[0], pattern[1])
-        else:
-            raise TypeError("Unexpected type found for pattern '%s'" % patternId)
-        return __compiledPatterns[patternId]
-
-    raise KeyError("Pattern '%s' not found." % patternId)
+    if not __profiling:
+        try:
+            return __compiledPatterns[patternId]
+        except KeyError:
+            return _getCompiledPattern(patternId)
+    return _getProfiledPattern(patternId)
+
+def _getCompiledPattern(patternId):
+    pattern = __compiledPatterns.get(patternId)
+    if pattern is not None:
+        return pattern
+    with __lock:
+        pattern = __compiledPatterns.get(patternId)
+        if pattern is None:
+            pattern = _compile(patternId)
+            __compiledPatterns[patternId] = pattern
+        return pattern
+
+def precompileAll():
+    "Compiles every pattern in kol.data.Patterns. Returns the number of patterns."
+    for patternId in Patterns.patterns:
+        _getCompiledPattern(patternId)
+    return len(Patterns.patterns)
+
+class ProfiledPattern(object):
+    """
+    A compiled pattern that counts lookups and calls, and the time spent matching. Other
+    attributes (pattern, flags, groupindex...) are those of the compiled pattern.
+    """
+
+    def __init__(self, patternId, regex):
+        self.patternId = patternId
+        self.regex = regex
+        self.lookups = 0
+        self.calls = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.regex, name)
+
+    def _record(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+
+    def _timed(self, method, args, kwargs):
+        t0 = time.time()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._record(time.time() - t0)
+
+    def search(self, *args, **kwargs):
+        return self._timed(self.regex.search, args, kwargs)
+
+    def match(self, *args, **kwargs):
+        return self._timed(self.regex.match, args, kwargs)
+
+    def findall(self, *args, **kwargs):
+        return self._timed(self.regex.findall, args, kwargs)
+
+    def split(self, *args, **kwargs):
+        return self._timed(self.regex.split, args, kwargs)
+
+    def sub(self, *args, **kwargs):
+        return self._timed(self.regex.sub, args, kwargs)
+
+    def subn(self, *args, **kwargs):
+        return self._timed(self.regex.subn, args, kwargs)
+
+    def finditer(self, *args, **kwargs):
+        # the time spent finding each match is counted as the caller iterates
+        t0 = time.time()
+        iterator = self.regex.finditer(*args, **kwargs)
+        seconds = time.time() - t0
+        try:
+            while True:
+                t0 = time.time()
+                try:
+                    match = iterator.next()
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.time() - t0
+                yield match
+        finally:
+            self._record(seconds)
+
+def _getProfiledPattern(patternId):
+    pattern = __profiledPatterns.get(patternId)
+    if pattern is None:
+        regex = _getCompiledPattern(patternId)
+        with __lock:
+            pattern = __profiledPatterns.setdefault(patternId, ProfiledPattern(patternId, regex))
+    with pattern._lock:
+        pattern.lookups += 1
+    return pattern
+
+def enableProfiling(enabled=True):
+    "Turns profiling of pattern lookups and matching on or off."
+    global __profiling
+    __profiling = enabled
+
+def getStatistics():
+    """
+    Returns a dict of patternId -> {"lookups", "calls", "seconds"} for the patterns that have
+    been looked up while profiling was enabled.
+    """
+    with __lock:
+        patterns = __profiledPatterns.values()
+    result = {}
+    for p in patterns:
+        with p._lock:
+            result[p.patternId] = {"lookups" : p.lookups, "calls" : p.calls, "seconds" : p.seconds}
+    return result
+
+def resetStatistics():
+    with __lock:
+        patterns = __profiledPatterns.values()
+    for p in patterns:
+        with p._lock:
+            p.lookups = 0
+            p.calls = 0
+            p.seconds = 0.0
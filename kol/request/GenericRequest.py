@@ -1,10 +1,39 @@
 import kol.Error as Error
 from kol.util import Report
 
+import random
+
+# Response bodies are logged at the DEBUG level. By default every body is
+# logged in full; to keep logging affordable, bodies can be cut off after
+# responseLogMaxLength characters, and only a fraction (responseLogSampleRate)
+# of them logged at all.
+responseLogMaxLength = None
+responseLogSampleRate = 1.0
+
+def setResponseLogging(maxLength=None, sampleRate=1.0):
+    "Sets the length limit (None for no limit) and sample rate of logged response bodies."
+    global responseLogMaxLength, responseLogSampleRate
+    responseLogMaxLength = maxLength
+    responseLogSampleRate = sampleRate
+
+def reportResponseText(responseText):
+    "Logs a response body, subject to the limits set with setResponseLogging."
+    if not Report.isEnabled("request", Report.DEBUG):
+        return
+    if random.random() >= responseLogSampleRate:
+        return
+    if responseLogMaxLength is not None and len(responseText) > responseLogMaxLength:
+        responseText = "%s... (%d more characters)" % (responseText[:responseLogMaxLength], len(responseText) - responseLogMaxLength)
+    Report.debug("request", "Response Text: %s", args=(responseText,))
+
 
 class GenericRequest(object):
     "A generic request to a Kingdom of Loathing server."
 
+    # A reentrant lock that doRequest() takes, if any. The request scheduler
+    # takes it before waiting for a slot (see kol.RequestScheduler).
+    lock = None
+
     def __init__(self, session):
         self.session = session
         self.requestData = {}
@@ -19,15 +48,15 @@ class GenericRequest(object):
         """
 
         if self.get:
-            Report.debug("request", "Requesting %s via GET".format(self.url))
+            Report.debug("request", "Requesting %s via GET", args=(self.url,))
             self.response = self.session.opener.get(self.url, self.requestData)
         else:
-            Report.debug("request", "Requesting %s via POST".format(self.url))
+            Report.debug("request", "Requesting %s via POST", args=(self.url,))
             self.response = self.session.opener.open(self.url, self.requestData)
         self.responseText = self.response.text
 
-        Report.debug("request", "Received response: %s" % self.url)
-        Report.debug("request", "Response Text: %s" % self.responseText)
+        Report.debug("request", "Received response: %s", args=(self.url,))
+        reportResponseText(self.responseText)
 
         if self.response.url.find("/maint.php") >= 0:
             self.session.isConnected = False
@@ -44,6 +73,6 @@ class GenericRequest(object):
         if self.skipParseResponse == False and hasattr(self, "parseResponse"):
             self.parseResponse()
             if len(self.responseData) > 0:
-                Report.debug("request", "Parsed response data: %s" % self.responseData)
+                Report.debug("request", "Parsed response data: %s", args=(self.responseData,))
 
         return self.responseData
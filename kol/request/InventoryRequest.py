@@ -2,23 +2,34 @@ from ApiRequest import ApiRequest
 from kol.database import ItemDatabase
 
 class InventoryRequest(ApiRequest):
-    "This class is used to get a list of items in the user's inventory."
+    """
+    This class is used to get a list of items in the user's inventory.
 
-    def __init__(self, session, which=None):
+    If quantitiesOnly is True, the item database is not consulted at all, and
+    the response contains only a "quantities" dict of item ID -> quantity.
+    Callers that need item metadata can look up the IDs they are interested
+    in with ItemDatabase.getOrDiscoverItemFromId.
+    """
+
+    def __init__(self, session, which=None, quantitiesOnly=False):
         super(InventoryRequest, self).__init__(session)
         self.requestData["what"] = "inventory"
         self.ignoreItemDatabase = False
+        self.quantitiesOnly = quantitiesOnly
 
     def parseResponse(self):
         super(InventoryRequest, self).parseResponse()
 
+        if self.quantitiesOnly:
+            self.responseData["quantities"] = dict((int(itemId), int(quantity)) for itemId, quantity in self.jsonData.iteritems())
+            return
+
         items = []
         for itemId, quantity in self.jsonData.iteritems():
             if self.ignoreItemDatabase:
                 item = {}
                 item["id"] = int(itemId)
                 item["quantity"] = int(quantity)
-                items.append(item)
             else:
                 item = ItemDatabase.getOrDiscoverItemFromId(int(itemId), self.session)
                 item["quantity"] = int(quantity)
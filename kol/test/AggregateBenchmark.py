@@ -0,0 +1,84 @@
+"""
+Measures how the Hobopolis modules' raid log aggregates are evaluated, offline. A synthetic raid
+log is built whose events match the db-match values that the modules' aggregateQueries look for.
+Three ways of answering the queries are timed:
+
+    scan      -- each query scans the events with eventDbMatch, as the modules did before they
+                 declared their queries
+    aggregate -- the events are indexed in an EventList and all queries are evaluated together
+    chats     -- a number of dungeon chats arrive between raid log refreshes; the log is indexed
+                 once per refresh and each chat only asks the EventList for cached results
+
+Usage: python -m kol.test.AggregateBenchmark [--events N] [--chats N] [--repeat N]
+"""
+
+from cwbot.common.eventList import EventList
+from cwbot.modules.BaseDungeonModule import eventDbMatch
+from cwbot.modules.hobopolis import AhbgModule, BurnbarrelModule, CageModule, ExposureModule, \
+                                    HeapModule, PldModule, SewerModule, TownModule
+
+import argparse
+import random
+import timeit
+
+MODULES = [AhbgModule.AhbgModule, BurnbarrelModule.BurnbarrelModule, CageModule.CageModule,
+           ExposureModule.ExposureModule, HeapModule.HeapModule, PldModule.PldModule,
+           SewerModule.SewerModule, TownModule.TownModule]
+
+def makeEvents(queries, numEvents, rng):
+    "Returns events whose db-matches are the items the queries look for, and some unrelated ones."
+    items = set(item for q in queries if not q.matchesText for m in q.match for item in m)
+    dbMatches = [dict([item]) for item in items] + [{"code" : "other%d" % i} for i in range(40)]
+    return [{"event" : "event %d" % i, "turns" : rng.randint(1, 5), "userId" : i % 50,
+             "db-match" : rng.choice(dbMatches)} for i in range(numEvents)]
+
+def scan(events, queries):
+    results = {}
+    for q in queries:
+        if q.matchesText:
+            continue
+        matching = eventDbMatch(events, *[dict(m) for m in q.match])
+        if q.__class__.__name__ == "AnyEvent":
+            results[q] = any(True for _ in matching)
+        else:
+            results[q] = sum(e["turns"] for e in matching)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the evaluation of dungeon module aggregates.")
+    parser.add_argument("--events", type=int, default=5000, help="events in the raid log")
+    parser.add_argument("--chats", type=int, default=10, help="dungeon chats per raid log refresh")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    queries = [q for m in MODULES for q in m.aggregateQueries.values()]
+    events = makeEvents(queries, args.events, random.Random(args.seed))
+    scanned = scan(events, queries)
+    aggregated = EventList(events).aggregate(queries)
+    for q, result in scanned.items():
+        if aggregated[q] != result:
+            raise AssertionError("The aggregate of %r differs from the scan." % (q,))
+
+    def aggregate():
+        EventList(events).aggregate(queries)
+
+    def chats():
+        eventList = EventList(events)
+        eventList.aggregate(queries)
+        for _ in range(args.chats):
+            for m in MODULES:
+                eventList.aggregate(m.aggregateQueries.values())
+
+    def scanChats():
+        for _ in range(args.chats + 1):
+            scan(events, queries)
+
+    print "%d events, %d queries from %d modules" % (len(events), len(queries), len(MODULES))
+    for name, func in [("scan", lambda: scan(events, queries)), ("aggregate", aggregate),
+                       ("scan, %d chats" % args.chats, scanChats), ("chats", chats)]:
+        seconds = min(timeit.repeat(func, number=args.repeat, repeat=3)) / args.repeat
+        print "%-16s %8.2f ms" % (name + ":", seconds * 1000)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Replays a synthetic Dreadsylvania instance through cwbot's DreadTimelineModule, offline. Kills
+and noncombats are made by random players in random order; whenever an area's kill count
+passes a multiple of 50, a snapshot is taken from the raid log as it is at that point, as the
+module does when the dungeon log is refreshed. At the end, the timeline is built from the
+snapshots.
+
+Reports the time spent building snapshots and the timeline, and the size of the module state
+(the saved snapshots) in the compact delta format. The size of the same snapshots in the old
+full-event format is also shown, computed by expanding the deltas. The script also runs against
+revisions of the module from before snapshots were stored as deltas, for comparison.
+
+Usage: python -m kol.test.DreadBenchmark [--kills N] [--players N] [--seed N]
+"""
+
+from cwbot.database import database
+from cwbot.modules.dread import DreadTimelineModule as dread
+
+from collections import defaultdict
+import argparse
+import json
+import os
+import random
+import re
+import time
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(database.__file__)), "data")
+
+AREAS = ["The Woods", "The Village", "The Castle"]
+KILLS = {"The Woods" : ["defeated hot werewolf", "defeated cold bugbear"],
+         "The Village" : ["defeated spooky ghost", "defeated sleaze zombie"],
+         "The Castle" : ["defeated stench skeleton", "defeated hot vampire"]}
+
+class _Module(dread.DreadTimelineModule):
+    "A DreadTimelineModule without a manager, with an empty state."
+
+    requiredCapabilities = dread.DreadTimelineModule.requiredCapabilities
+    _name = dread.DreadTimelineModule._name
+
+    def __init__(self, db):
+        self._db = db
+        self._snapshots = []
+        if hasattr(dread, "_dbKey"):
+            self._dbByKey = dict((dread._dbKey(dbm), dbm) for dbm in db)
+            self._totals = defaultdict(int)
+
+    def __del__(self):
+        # the module was never registered with an event subsystem
+        pass
+
+    def debugLog(self, text):
+        pass
+
+    def addSnapshot(self, events):
+        snapshot = self._getNewEvents(events)
+        self._snapshots.append(snapshot)
+        if hasattr(self, "_addToTotals"):
+            self._addToTotals(snapshot)
+
+    def fullSnapshots(self):
+        "Returns the snapshots in the full-event format."
+        if hasattr(self, "_expandSnapshot"):
+            return [self._expandSnapshot(s) for s in self._snapshots]
+        return self._snapshots
+
+def _dbMatcher(db):
+    cache = {}
+    def match(category, event):
+        key = (category, event)
+        if key not in cache:
+            cache[key] = {}
+            for dbm in db:
+                if dbm["category"].strip() == category and re.search(dbm["regex"], event):
+                    cache[key] = dbm
+                    break
+        return cache[key]
+    return match
+
+def makeActions(db, numKills, rng):
+    "Returns a shuffled list of (area, event text): numKills kills per area and 3 of each noncombat."
+    actions = []
+    for area in AREAS:
+        for _ in range(numKills):
+            actions.append((area, rng.choice(KILLS[area])))
+    for dbm in db:
+        if dbm["zone"] != "(combat)":
+            for _ in range(3):
+                actions.append((dbm["category"].strip(), dbm["regex"].replace("\\s+", " ")))
+    rng.shuffle(actions)
+    return actions
+
+def replay(db, actions, numPlayers, rng):
+    """
+    Replays the actions through a new module. Returns (module, final events, seconds spent
+    building snapshots).
+    """
+    module = _Module(db)
+    match = _dbMatcher(db)
+    players = [1000 + i for i in range(numPlayers)]
+    turns = defaultdict(int)
+    kills = [0, 0, 0]
+    lastComplete = [0, 0, 0]
+    seconds = 0.0
+    events = []
+    for area, text in actions:
+        turns[(area, rng.choice(players), text)] += 1
+        if area in AREAS and text in KILLS[area]:
+            kills[AREAS.index(area)] += 1
+        rounded = [(k // 50) * 50 for k in kills]
+        if rounded > lastComplete:
+            lastComplete = rounded
+            events = _events(turns, match)
+            t0 = time.time()
+            module.addSnapshot(events)
+            seconds += time.time() - t0
+    return module, _events(turns, match), seconds
+
+def _events(turns, match):
+    return [{"category" : area, "userId" : uid, "userName" : "Player%d" % uid, "event" : text,
+             "turns" : n, "db-match" : match(area, text)}
+            for (area, uid, text), n in turns.items()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a synthetic Dreadsylvania instance through DreadTimelineModule.")
+    parser.add_argument("--kills", type=int, default=1000, help="kills per area")
+    parser.add_argument("--players", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    db = database.csvDatabase("dread.csv", DATA_DIRECTORY)
+    rng = random.Random(args.seed)
+    actions = makeActions(db, args.kills, rng)
+    module, events, snapshotSeconds = replay(db, actions, args.players, rng)
+
+    t0 = time.time()
+    names = dict((e["userId"], "P%d" % e["userId"]) for e in events)
+    timeline = module._eventTimeline(events, names)
+    timelineSeconds = time.time() - t0
+
+    compactSize = len(json.dumps(module._snapshots))
+    fullSize = len(json.dumps(module.fullSnapshots()))
+    print "%d actions by %d players, %d snapshots, %d timeline entries" % (len(actions), args.players, len(module._snapshots), len(timeline))
+    print "snapshots: %.3f s total, %.2f ms each" % (snapshotSeconds, snapshotSeconds / max(len(module._snapshots), 1) * 1000)
+    print "timeline:  %.3f s" % timelineSeconds
+    print "state: %d bytes saved, %d bytes in the full-event format" % (compactSize, fullSize)
+
+if __name__ == "__main__":
+    main()
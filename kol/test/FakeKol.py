@@ -0,0 +1,427 @@
+from kol.Opener import Response, RequestStats
+
+import cgi
+import json
+import os
+import random
+import threading
+import time
+import urllib
+import urlparse
+from collections import deque
+
+class InjectedFault(IOError):
+    "Raised by FakeKol.handle when a fault injected with setErrorRate() occurs."
+
+    def __init__(self, kind, url):
+        super(InjectedFault, self).__init__("Injected %s for %s" % (kind, url))
+        self.kind = kind
+        self.url = url
+
+ERROR_PAGE = "<html><head><title>500 Internal Server Error</title></head><body><h1>Internal Server Error</h1></body></html>"
+MAINTENANCE_PAGE = "<html><body><center><b>The Kingdom of Loathing is undergoing nightly maintenance.</b></center></body></html>"
+
+class FakeKol(object):
+    """
+    This class is an in-process stand-in for the Kingdom of Loathing servers. It keeps just
+    enough game state (players, chat, the bot's inbox and inventory) to log in, open chat,
+    read and send chat messages and kmails, and look up player profiles. Test code posts chats
+    and kmails with postChat(), postPrivate() and sendKmail(). Everything the bot sends is
+    passed to the functions in self.listeners as listener(kind, target, text), where kind is
+    "chat", "private" or "kmail".
+
+    Requests are handled by the function in self.handlers for the page that was requested
+    (e.g. "api.php"), which is called as handler(params) and returns the response text, or a
+    (text, url) tuple to redirect. Other handlers may be added or replaced. Requests for pages
+    without a handler receive an empty page and are counted in self.unhandled.
+
+    Recorded pages may be served instead with addFixture() or loadFixtures(); a fixture takes
+    precedence over the handler for its page. For load testing, setLatency() delays responses
+    and setErrorRate() makes a fraction of the requests fail. Injected faults are counted by
+    kind in self.faults.
+    """
+
+    serverURL = "http://fakekol/"
+
+    def __init__(self, userId=1000000, userName="FakeBot", clanId=1, clanName="Fake Clan"):
+        self.userId = userId
+        self.userName = userName
+        self.clanId = clanId
+        self.clanName = clanName
+        self.pwd = "0123456789abcdef0123456789abcdef"
+        self.rollover = int(time.time()) + 86400
+        self.meat = 1000000
+        self.inventory = {}
+        self.players = {userId : (userName, True)}
+        self.listeners = []
+        self.unhandled = {}
+        self.faults = {}
+        self.random = random.Random(0)
+
+        self._lock = threading.RLock()
+        self._loggedIn = False
+        self._currentChannel = "clan"
+        self._listening = set()
+        self._chatLines = deque()       # (sequence number, line)
+        self._chatSeq = int(time.time())
+        self._inbox = {}
+        self._nextMessageId = 1
+        self._fixtures = {}             # page -> list of (params, text)
+        self._latency = {}              # page (None for all pages) -> (seconds, jitter)
+        self._errorRates = {}           # page (None for all pages) -> (rate, kind)
+
+        self.handlers = {
+            "" : self._homepage,
+            "main.php" : self._homepage,
+            "login.php" : self._login,
+            "logout.php" : self._logout,
+            "maint.php" : self._maintenance,
+            "charpane.php" : self._charpane,
+            "api.php" : self._api,
+            "lchat.php" : self._openChat,
+            "newchatmessages.php" : self._newChatMessages,
+            "submitnewchat.php" : self._submitChat,
+            "messages.php" : self._messages,
+            "sendmessage.php" : self._sendMessage,
+            "showplayer.php" : self._showPlayer,
+            "clan_detailedroster.php" : self._clanRoster,
+            "clan_whitelist.php" : self._clanWhitelist,
+        }
+
+    def addPlayer(self, userId, userName, inClan=True):
+        with self._lock:
+            self.players[userId] = (userName, inClan)
+
+    def _playerName(self, userId):
+        return self.players.get(userId, ("Player%s" % userId, False))[0]
+
+    def _findPlayer(self, nameOrId):
+        "Returns the user ID of a player, given a name or a user ID"
+        try:
+            return int(nameOrId)
+        except ValueError:
+            pass
+        nameOrId = nameOrId.replace("_", " ").lower()
+        for userId, (userName, _inClan) in self.players.items():
+            if userName.lower() == nameOrId:
+                return userId
+        return None
+
+    def _addChatLine(self, line):
+        with self._lock:
+            self._chatSeq += 1
+            self._chatLines.append((self._chatSeq, line))
+
+    def postChat(self, userId, text, channel=None):
+        "Posts a chat from a player to a channel (by default, the bot's current channel)"
+        with self._lock:
+            if channel is None:
+                channel = self._currentChannel
+            line = '<b><a target="mainpane" href="showplayer.php?who=%s"><font color="black">%s</font></a></b>: %s' % (userId, self._playerName(userId), cgi.escape(text))
+            if channel != self._currentChannel:
+                line = '<font color="green">[%s]</font> %s' % (channel, line)
+            self._addChatLine(line)
+
+    def postPrivate(self, userId, text):
+        "Sends a private message from a player to the bot"
+        with self._lock:
+            self._addChatLine('<a target="mainpane" href="showplayer.php?who=%s"><font color="blue"><b>%s (private):</b></font></a> <font color="blue">%s</font>' % (userId, self._playerName(userId), cgi.escape(text)))
+
+    def sendKmail(self, userId, text, meat=0):
+        "Sends a kmail from a player to the bot, and notifies the bot in chat. Returns the kmail ID."
+        with self._lock:
+            messageId = self._nextMessageId
+            self._nextMessageId += 1
+            self._inbox[messageId] = {"id" : messageId, "userId" : userId, "text" : text, "meat" : meat, "date" : time.time()}
+            self._addChatLine('<a target="mainpane" href="messages.php"><font color="green">New message received from <a target="mainpane" href=\'showplayer.php?who=%s\'><font color="green">%s</font></a>.</font></a>' % (userId, self._playerName(userId)))
+            return messageId
+
+    def inboxSize(self):
+        with self._lock:
+            return len(self._inbox)
+
+    def _notify(self, kind, target, text):
+        for listener in list(self.listeners):
+            listener(kind, target, text)
+
+    def addFixture(self, page, text, **params):
+        """
+        Serves text for requests of the given page whose parameters include all of params.
+        If several fixtures match a request, the one with the most parameters is used.
+        """
+        with self._lock:
+            fixtures = self._fixtures.setdefault(page, [])
+            fixtures.append((params, text))
+            fixtures.sort(key=lambda f: -len(f[0]))
+
+    def loadFixtures(self, directory):
+        """
+        Adds a fixture for each file in a directory. The file name is the page, optionally
+        followed by comma-separated parameters, and an extension that is ignored. For example,
+        "clan_raidlogs.php.html" is served for clan_raidlogs.php, and
+        "api.php,what=inventory.json" for api.php?what=inventory. Returns the number of
+        fixtures that were loaded.
+        """
+        numLoaded = 0
+        for fileName in sorted(os.listdir(directory)):
+            path = os.path.join(directory, fileName)
+            if not os.path.isfile(path):
+                continue
+            parts = os.path.splitext(fileName)[0].split(",")
+            params = dict(p.split("=", 1) for p in parts[1:])
+            with open(path, "rb") as f:
+                self.addFixture(parts[0], f.read(), **params)
+            numLoaded += 1
+        return numLoaded
+
+    def setLatency(self, seconds, jitter=0, page=None):
+        "Delays responses by seconds, plus a random amount of up to jitter seconds."
+        with self._lock:
+            self._latency[page] = (seconds, jitter)
+
+    def setErrorRate(self, rate, kind="error", page=None):
+        """
+        Makes a fraction of the requests fail. The kind of failure is one of:
+             error -- the server returns an error page (a 500 response over HTTP)
+        disconnect -- the connection is dropped without a response
+        maintenance -- the request is redirected to maint.php
+        """
+        if kind not in ["error", "disconnect", "maintenance"]:
+            raise ValueError("Unknown fault kind: %s" % kind)
+        with self._lock:
+            self._errorRates[page] = (rate, kind)
+
+    def _fixture(self, page, params):
+        for fixtureParams, text in self._fixtures.get(page, []):
+            if all(params.get(k) == v for k,v in fixtureParams.iteritems()):
+                return text
+        return None
+
+    def _injectFaults(self, page, url):
+        with self._lock:
+            seconds, jitter = self._latency.get(page, self._latency.get(None, (0, 0)))
+            if jitter:
+                seconds += self.random.uniform(0, jitter)
+            rate, kind = self._errorRates.get(page, self._errorRates.get(None, (0, None)))
+            if page == "maint.php" or self.random.random() >= rate:
+                kind = None
+            else:
+                self.faults[kind] = self.faults.get(kind, 0) + 1
+        if seconds > 0:
+            time.sleep(seconds)
+        if kind == "maintenance":
+            return (MAINTENANCE_PAGE, self.serverURL + "maint.php")
+        if kind is not None:
+            raise InjectedFault(kind, url)
+        return None
+
+    def handle(self, url, requestData):
+        """
+        Handles a request for the given URL and form data. Returns a (text, url) tuple with the
+        response text and the URL of the response. Raises an InjectedFault if an "error" or
+        "disconnect" fault is injected.
+        """
+        split = urlparse.urlsplit(url)
+        page = split.path.lstrip("/")
+        params = dict(urlparse.parse_qsl(split.query, keep_blank_values=True))
+        params.update(requestData or {})
+        fault = self._injectFaults(page, url)
+        if fault is not None:
+            return fault
+        with self._lock:
+            fixture = self._fixture(page, params)
+        if fixture is not None:
+            return (fixture, url)
+        handler = self.handlers.get(page)
+        if handler is None:
+            with self._lock:
+                self.unhandled[page] = self.unhandled.get(page, 0) + 1
+            return ("", url)
+        result = handler(params)
+        if isinstance(result, tuple):
+            return result
+        return (result, url)
+
+    def _homepage(self, params):
+        return ('<input type=hidden name=challenge value="0123456789abcdef">', self.serverURL + "login.php?loginid=0123456789abcdef")
+
+    def _login(self, params):
+        with self._lock:
+            self._loggedIn = True
+        return '<html><frameset id="rootset"></frameset></html>'
+
+    def _logout(self, params):
+        with self._lock:
+            self._loggedIn = False
+        return ""
+
+    def _maintenance(self, params):
+        return MAINTENANCE_PAGE
+
+    def _charpane(self, params):
+        return ('<script>var pwdhash = "%s"; var playerid = %s;</script><a target="mainpane" href="charsheet.php"><b>%s</b></a>' % (self.pwd, self.userId, self.userName))
+
+    def _api(self, params):
+        what = params.get("what")
+        if what == "status":
+            with self._lock:
+                return json.dumps({"pwd" : self.pwd, "name" : self.userName, "playerid" : str(self.userId), "rollover" : str(self.rollover), "meat" : str(self.meat), "hp" : "100", "maxhp" : "100", "mp" : "100", "maxmp" : "100", "level" : "13", "hardcore" : "0", "roninleft" : "0", "casual" : "0", "freedralph" : "0", "adventures" : "100", "drunk" : "0", "full" : "0", "spleen" : "0", "effects" : {}})
+        if what == "inventory":
+            with self._lock:
+                return json.dumps(dict((str(k), str(v)) for k,v in self.inventory.items()))
+        if what == "events":
+            return json.dumps([])
+        return json.dumps("Unknown api request: %s" % what)
+
+    def _openChat(self, params):
+        with self._lock:
+            return '<font color="green">Currently in channel: %s</font>' % self._currentChannel
+
+    def _newChatMessages(self, params):
+        lastTime = int(params.get("lasttime") or 0)
+        with self._lock:
+            # There is only one reader, so lines it has already seen may be discarded.
+            while self._chatLines and self._chatLines[0][0] <= lastTime:
+                self._chatLines.popleft()
+            lines = [line for seq,line in self._chatLines if seq > lastTime]
+            return "<br>".join(lines) + "<br><!--lastseen:%s-->" % self._chatSeq
+
+    def _submitChat(self, params):
+        text = params.get("graf", "").strip()
+        words = text.split(" ")
+        command = words[0].lower() if text.startswith("/") else None
+        with self._lock:
+            if command in ["/channel", "/c", "/switch", "/s"] and len(words) > 1:
+                self._currentChannel = words[1]
+                self._listening.discard(words[1])
+                return '<font color=green>You are now talking in channel: %s.<p><p>A fake channel.</font>' % words[1]
+            if command in ["/listen", "/l"]:
+                if len(words) == 1:
+                    others = "".join("&nbsp;&nbsp;%s<br>" % c for c in sorted(self._listening))
+                    return '<font color=green>Currently listening to channels:<br>&nbsp;&nbsp;<b>%s</b><br>%s</font>' % (self._currentChannel, others)
+                if words[1] in self._listening:
+                    self._listening.discard(words[1])
+                    return '<font color=green>No longer listening to channel: %s</font>' % words[1]
+                self._listening.add(words[1])
+                return '<font color=green>Now listening to channel: %s</font>' % words[1]
+            if command in ["/msg", "/whisper", "/w", "/tell"] and len(words) > 2:
+                userId = self._findPlayer(words[1])
+                message = " ".join(words[2:])
+                self._notify("private", userId, message)
+                return '<font color="blue"><b>private to <a class=nounder target="mainpane" href="showplayer.php?who=%s"><font color="blue">%s</font></a></b>: %s</font></br>' % (userId, self._playerName(userId), message)
+            channel = self._currentChannel
+            if command in ["/me", "/em"]:
+                message = " ".join(words[1:])
+            elif command is not None and (command[1:] == self._currentChannel or command[1:] in self._listening):
+                channel = command[1:]
+                message = " ".join(words[1:])
+                if len(words) > 1 and words[1] in ["/me", "/em"]:
+                    message = " ".join(words[2:])
+            elif command is not None:
+                # other chat commands (/who, /friends, ...) are ignored
+                return ""
+            else:
+                message = text
+            self._notify("chat", channel, message)
+            return '<b><a target="mainpane" href="showplayer.php?who=%s"><font color="black">%s</font></a></b>: %s' % (self.userId, self.userName, message)
+
+    def _renderKmail(self, message):
+        date = time.strftime("%A, %B %d, %Y, %I:%M%p", time.localtime(message["date"]))
+        text = cgi.escape(message["text"]).replace("\n", "<br>")
+        if message["meat"]:
+            text += '<center><table><tr><td><img src="http://images.kingdomofloathing.com/itemimages/meat.gif" height=30 width=30 alt="Meat"></td><td valign=center>You gain %s Meat.</td></tr></table></center>' % message["meat"]
+        return '<tr><td valign=top><input type=checkbox name="sel%s"></td><td valign=top><b>From</b> <a href="showplayer.php?who=%s">%s</a><br><b>Date:</b>%s</b><blockquote>%s</blockquote></td></tr>' % (message["id"], message["userId"], self._playerName(message["userId"]), date, text)
+
+    def _messages(self, params):
+        box = params.get("box", "Inbox")
+        with self._lock:
+            if params.get("the_action") in ["delete", "save"]:
+                if box == "Inbox":
+                    for key in params.keys():
+                        if key.startswith("sel"):
+                            self._inbox.pop(int(key[3:]), None)
+                return "<table></table>"
+            if box != "Inbox":
+                return "<table></table>"
+            begin = int(params.get("begin") or 1)
+            messages = [self._inbox[k] for k in sorted(self._inbox)][(begin - 1) * 100 : begin * 100]
+            return "<table>%s</table>" % "".join(self._renderKmail(m) for m in messages)
+
+    def _sendMessage(self, params):
+        userId = self._findPlayer(str(params.get("towho")))
+        with self._lock:
+            self.meat -= int(params.get("sendmeat") or 0)
+        self._notify("kmail", userId, params.get("message", ""))
+        return "<table><tr><td><center>Message sent.</center></td></tr></table>"
+
+    def _showPlayer(self, params):
+        userId = int(params.get("who", 0))
+        with self._lock:
+            userName, inClan = self.players.get(userId, ("Player%s" % userId, False))
+        clan = ""
+        if inClan:
+            clan = 'Clan: <b><a class=nounder href="showclan.php?whichclan=%s">%s</a></b><br>' % (self.clanId, self.clanName)
+        return '<table><tr><td valign="center"><b>%s</b> (#%s)<br>%s</td></tr></table>' % (userName, userId, clan)
+
+    def _clanRoster(self, params):
+        with self._lock:
+            rows = "".join('<tr><td><a href="showplayer.php?who=%s"><b>%s</b></a></td><td>Normal Member</td><td>0</td></tr>' % (userId, userName) for userId, (userName, inClan) in sorted(self.players.items()) if inClan)
+        return "<table>%s</table>" % rows
+
+    def _clanWhitelist(self, params):
+        return "<table></table>"
+
+
+class _StreamResponse(object):
+    "The part of a streaming requests response that GenericPartialRequest uses"
+
+    def __init__(self, text, url):
+        self.text = text
+        self.url = url
+        self.headers = {"content-length" : str(len(text))}
+        self.raw = None
+
+    def iter_content(self, chunkSize):
+        for i in xrange(0, len(self.text), chunkSize):
+            yield self.text[i:i + chunkSize]
+
+    def close(self):
+        pass
+
+class FakeKolOpener(object):
+    """
+    This class is an opener (see kol.Opener) that sends requests to a FakeKol instead of the
+    network. Pass it to a Session to run a session against the fake server. Requests are
+    counted per endpoint in self.stats, as with the RequestsOpener. An injected "error" fault
+    returns an error page and a "disconnect" fault raises the InjectedFault.
+    """
+
+    def __init__(self, fakeKol):
+        self.fakeKol = fakeKol
+        self.stats = RequestStats()
+
+    def _handle(self, url, requestData):
+        try:
+            return self.fakeKol.handle(url, requestData)
+        except InjectedFault as e:
+            if e.kind == "error":
+                return (ERROR_PAGE, url)
+            raise
+
+    def open(self, url, requestData):
+        t0 = time.time()
+        text, responseUrl = self._handle(url, requestData)
+        self.stats.record(url, time.time() - t0, len(text))
+        return Response(text, responseUrl)
+
+    def get(self, url, requestData):
+        if requestData:
+            url += ("&" if "?" in url else "?") + urllib.urlencode(requestData)
+        return self.open(url, {})
+
+    def stream(self, url, requestData):
+        text, responseUrl = self._handle(url, requestData)
+        return _StreamResponse(text, responseUrl)
+
+    def record(self, url, seconds, numBytes):
+        self.stats.record(url, seconds, numBytes)
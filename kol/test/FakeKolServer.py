@@ -0,0 +1,112 @@
+from kol.test.FakeKol import FakeKol, InjectedFault, ERROR_PAGE
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+import SocketServer
+import argparse
+import threading
+import time
+import urlparse
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class FakeKolRequestHandler(BaseHTTPRequestHandler):
+    """
+    Passes each GET or POST request to the server's FakeKol. Responses whose URL differs from
+    the requested URL are sent as redirects. Injected "error" faults are sent as a 500
+    response, and injected "disconnect" faults close the connection without a response.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._handle({})
+
+    def do_POST(self):
+        length = int(self.headers.getheader("content-length") or 0)
+        data = dict(urlparse.parse_qsl(self.rfile.read(length), keep_blank_values=True))
+        self._handle(data)
+
+    def _handle(self, requestData):
+        fakeKol = self.server.fakeKol
+        url = fakeKol.serverURL + self.path.lstrip("/")
+        try:
+            text, responseUrl = fakeKol.handle(url, requestData)
+        except InjectedFault as e:
+            if e.kind == "disconnect":
+                self.close_connection = 1
+                return
+            self._send(500, ERROR_PAGE)
+            return
+        if responseUrl != url:
+            self._send(302, "", {"Location" : responseUrl})
+        else:
+            self._send(200, text)
+
+    def _send(self, status, text, headers=None):
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(text)))
+        for k,v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeKolServer(threading.Thread):
+    """
+    This class serves a FakeKol over HTTP on the local machine, so that sessions using a real
+    opener (and connection pool) can be load tested offline. The FakeKol's serverURL is set
+    to the address of the server. If port is 0, a free port is chosen; the port that is used
+    is in self.port once the server has been created.
+    """
+
+    def __init__(self, fakeKol=None, port=0, host="127.0.0.1"):
+        super(FakeKolServer, self).__init__()
+        self.daemon = True
+        if fakeKol is None:
+            fakeKol = FakeKol()
+        self.fakeKol = fakeKol
+        self.server = _ThreadingHTTPServer((host, port), FakeKolRequestHandler)
+        self.server.fakeKol = fakeKol
+        self.port = self.server.server_address[1]
+        fakeKol.serverURL = "http://%s:%s/" % (host, self.port)
+
+    def run(self):
+        self.server.serve_forever(poll_interval=0.1)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Kingdom of Loathing server.")
+    parser.add_argument("--port", type=int, default=8558)
+    parser.add_argument("--fixtures", metavar="DIR", help="serve the recorded pages in DIR")
+    parser.add_argument("--latency", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--jitter", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--error-rate", type=float, default=0, dest="errorRate")
+    parser.add_argument("--error-kind", default="error", dest="errorKind", choices=["error", "disconnect", "maintenance"])
+    args = parser.parse_args()
+
+    fakeKol = FakeKol()
+    if args.fixtures:
+        print "Loaded %d fixtures." % fakeKol.loadFixtures(args.fixtures)
+    fakeKol.setLatency(args.latency, args.jitter)
+    fakeKol.setErrorRate(args.errorRate, args.errorKind)
+    server = FakeKolServer(fakeKol, args.port)
+    server.start()
+    print "Serving %s" % fakeKol.serverURL
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+    print "Faults injected: %s" % fakeKol.faults
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures how fast InventoryRequest parses an inventory, offline, with and without quantitiesOnly.
+The inventory is an api.php response that holds the given number of items from the item database,
+three of each. Without quantitiesOnly, every item is looked up in the item database; with it, only
+the item IDs and quantities are read.
+
+Usage: python -m kol.test.InventoryBenchmark [--items N] [--repeat N]
+"""
+
+from kol.data import Items
+from kol.database import ItemDatabase
+from kol.request.InventoryRequest import InventoryRequest
+
+import argparse
+import json
+import time
+
+class _Session(object):
+    serverURL = "http://127.0.0.1/"
+    pwd = "0"
+
+def parse(text, repeat, **kwargs):
+    "Parses the inventory repeat times. Returns (responseData, milliseconds per parse)."
+    t0 = time.time()
+    for _ in range(repeat):
+        request = InventoryRequest(_Session(), **kwargs)
+        request.responseText = text
+        request.responseData = {}
+        request.parseResponse()
+    return request.responseData, (time.time() - t0) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare InventoryRequest parsing with and without quantitiesOnly.")
+    parser.add_argument("--items", type=int, default=2000, help="distinct items in the inventory")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    ItemDatabase.init()
+    ids = [item["id"] for item in Items.items][:args.items]
+    text = json.dumps(dict((str(iid), 3) for iid in ids))
+
+    full, fullMs = parse(text, args.repeat)
+    quantities, quantitiesMs = parse(text, args.repeat, quantitiesOnly=True)
+    if dict((item["id"], item["quantity"]) for item in full["items"]) != quantities["quantities"]:
+        raise AssertionError("The two parses found different quantities.")
+
+    print "%d items, %d bytes" % (len(ids), len(text))
+    print "full:           %7.2f ms per parse" % fullMs
+    print "quantitiesOnly: %7.2f ms per parse" % quantitiesMs
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Measures how fast each request class parses its page, offline. Every request class in kol.request
+(and cwbot.kolextra.request, if cwbot is available) is constructed with placeholder arguments, its
+page is fetched once from a FakeKol (which serves the recorded pages in kol/test/fixtures), and
+parseResponse() is timed over that page. Classes that fail to parse their page are listed with the
+reason. Classes that cannot be constructed, or that have no recorded page, are unsupported: they are
+not counted in the totals, and --all lists them.
+
+With --fetch, each class that parsed its page is also requested that many times, end to end,
+through the session's opener and request scheduler. Failed attempts are retried. Combined with
+--latency and --error-rate, this shows how the request path behaves under a slow or unreliable
+server. With --http, the requests are made over HTTP to a FakeKolServer with the default
+RequestsOpener instead of calling the FakeKol directly.
+
+Usage: python -m kol.test.ParseBenchmark [--filter NAME] [--fetch N] [--http] ...
+"""
+
+from kol.Session import Session
+from kol.RequestScheduler import RequestScheduler
+from kol.test.FakeKol import FakeKol, FakeKolOpener
+
+import argparse
+import inspect
+import os
+import pkgutil
+import sys
+import threading
+import time
+import timeit
+
+FIXTURE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Placeholder values for constructor arguments, by argument name.
+ARGUMENTS = {
+    "item" : 1, "itemId" : 1, "itemid1" : 1, "itemid2" : 2, "foodId" : 1, "boozeId" : 1,
+    "items" : [{"id" : 1, "quantity" : 1}], "itemList" : [1], "quantity" : 1, "qty" : 1,
+    "howMany" : 1, "meat" : 1, "numTurns" : 1, "numturns" : 1, "turns" : 1, "numTimes" : 1,
+    "player" : 2000000, "playerId" : 2000000, "userId" : 2000000, "uid" : 2000000,
+    "targetPlayerNameOrId" : 2000000, "towhom" : 2000000, "level" : 1, "title" : "Title",
+    "skillId" : 1, "effectId" : 1, "tradeid" : 1, "tradetype" : 1, "storeId" : 1, "price" : 1,
+    "searchQuery" : "seal", "queryString" : "Player", "locationId" : 1, "choiceId" : 1,
+    "choiceNumber" : 1, "action" : "attack", "slot" : 1, "cafe" : 1, "store" : "m", "page" : 1,
+    "whichBarrel" : 1, "whichsong" : 1, "whichshop" : "shop", "hotdogId" : 1, "outfitNum" : 1,
+    "isCustom" : False, "descId" : 868780591, "loginChallenge" : "0123456789abcdef",
+    "text" : "hello", "url" : "main.php", "messagesToDelete" : [1],
+    "message" : {"userId" : 2000000, "text" : "hello", "meat" : 0, "items" : []},
+}
+
+# Request classes that cannot be benchmarked in a logged-in session, with the reason.
+UNSUPPORTED = {
+    "kol.request.ApiRequest" : "base class of the api.php requests",
+    "kol.request.HomepageRequest" : "only requested before logging in",
+}
+
+def requestClasses():
+    "Returns a sorted list of (module name, class) for every request class that parses its response."
+    packages = []
+    import kol.request
+    packages.append(kol.request)
+    try:
+        import cwbot.kolextra.request
+        packages.append(cwbot.kolextra.request)
+    except ImportError:
+        pass
+
+    classes = []
+    for package in packages:
+        for _loader, moduleName, _isPackage in pkgutil.iter_modules(package.__path__):
+            fullName = "%s.%s" % (package.__name__, moduleName)
+            try:
+                __import__(fullName)
+            except Exception:
+                continue
+            module = sys.modules[fullName]
+            cls = getattr(module, moduleName, None)
+            if inspect.isclass(cls) and hasattr(cls, "doRequest") and hasattr(cls, "parseResponse"):
+                classes.append((fullName, cls))
+    return sorted(classes)
+
+def makeRequest(cls, session):
+    "Constructs a request with placeholder arguments. Raises a KeyError for unknown arguments."
+    spec = inspect.getargspec(cls.__init__)
+    numRequired = len(spec.args) - len(spec.defaults or ())
+    args = [ARGUMENTS[name] for name in spec.args[2:numRequired]]
+    return cls(session, *args)
+
+def makeSession(fakeKol, opener, rate):
+    session = Session(opener=opener, scheduler=RequestScheduler(rate=rate, burst=rate))
+    session.serverURL = fakeKol.serverURL
+    session.userId = fakeKol.userId
+    session.userName = fakeKol.userName
+    session.pwd = fakeKol.pwd
+    session.isConnected = True
+    return session
+
+def _describe(e):
+    return ("%s: %s" % (type(e).__name__, e)).splitlines()[0][:70]
+
+def benchmarkParse(session, classes, minTime):
+    """
+    Fetches the page of each class once and times parseResponse() over it. Returns a list of
+    (name, request, bytes, seconds per parse), a list of (name, reason) for classes that failed
+    to parse their page, and a list of (name, reason) for unsupported classes.
+    """
+    results = []
+    failures = []
+    unsupported = []
+    for name, cls in classes:
+        if name in UNSUPPORTED:
+            unsupported.append((name, UNSUPPORTED[name]))
+            continue
+        try:
+            request = makeRequest(cls, session)
+        except KeyError as e:
+            unsupported.append((name, "no placeholder for argument %s" % e))
+            continue
+        except Exception as e:
+            unsupported.append((name, "constructor: %s" % _describe(e)))
+            continue
+        error = None
+        try:
+            request.skipParseResponse = True
+            request.doRequest()
+            request.responseData = {}
+            request.parseResponse()
+        except Exception as e:
+            error = e
+        finally:
+            session.isConnected = True
+        if not getattr(request, "responseText", None):
+            unsupported.append((name, "no recorded page"))
+            continue
+        if error is not None:
+            failures.append((name, _describe(error)))
+            continue
+
+        def parse():
+            request.responseData = {}
+            request.parseResponse()
+
+        number = 1
+        while True:
+            seconds = timeit.timeit(parse, number=number)
+            if seconds >= minTime or number >= 100000:
+                break
+            number *= 10
+        results.append((name, request, len(request.responseText), seconds / number))
+    return results, failures, unsupported
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def benchmarkFetch(session, classes, count, numThreads, tries):
+    """
+    Makes count requests of each class from numThreads threads, retrying each failed attempt
+    up to tries times. Returns a dict of counters.
+    """
+    work = [cls for _name, cls in classes for _ in range(count)]
+    lock = threading.Lock()
+    stats = {"requests" : 0, "attempts" : 0, "failed" : 0, "errors" : {}, "latencies" : []}
+
+    def worker():
+        while True:
+            with lock:
+                if not work:
+                    return
+                cls = work.pop()
+            t0 = time.time()
+            ok = False
+            for _ in range(tries):
+                with lock:
+                    stats["attempts"] += 1
+                try:
+                    session.scheduler.run(makeRequest(cls, session))
+                    ok = True
+                    break
+                except Exception as e:
+                    session.isConnected = True
+                    with lock:
+                        kind = type(e).__name__
+                        stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+            with lock:
+                stats["requests"] += 1
+                stats["latencies"].append(time.time() - t0)
+                if not ok:
+                    stats["failed"] += 1
+
+    t0 = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(numThreads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats["seconds"] = time.time() - t0
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing of every request class against recorded pages.")
+    parser.add_argument("--fixtures", default=FIXTURE_DIRECTORY, metavar="DIR")
+    parser.add_argument("--filter", default="", metavar="NAME", help="only benchmark classes whose name contains NAME")
+    parser.add_argument("--min-time", type=float, default=0.05, dest="minTime", metavar="SECONDS", help="time each parser for at least this long")
+    parser.add_argument("--all", action="store_true", help="also list the unsupported classes")
+    parser.add_argument("--fetch", type=int, default=0, metavar="N", help="also make N full requests of each class")
+    parser.add_argument("--http", action="store_true", help="make the --fetch requests over HTTP")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--tries", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=1000.0, help="request scheduler rate for --fetch")
+    parser.add_argument("--latency", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--jitter", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--error-rate", type=float, default=0, dest="errorRate")
+    parser.add_argument("--error-kind", default="error", dest="errorKind", choices=["error", "disconnect", "maintenance"])
+    args = parser.parse_args()
+
+    fakeKol = FakeKol()
+    numFixtures = fakeKol.loadFixtures(args.fixtures)
+    session = makeSession(fakeKol, FakeKolOpener(fakeKol), args.rate)
+    classes = [(name, cls) for name, cls in requestClasses() if args.filter in name]
+
+    results, failures, unsupported = benchmarkParse(session, classes, args.minTime)
+    print "%d request classes with a recorded page (%d fixtures): %d parsed it, %d failed. %d unsupported classes are not counted." % (len(results) + len(failures), numFixtures, len(results), len(failures), len(unsupported))
+    print
+    print "%-58s %9s %11s %10s" % ("request class", "bytes", "us/parse", "parses/s")
+    for name, _request, size, seconds in sorted(results, key=lambda r: -r[3]):
+        print "%-58s %9d %11.1f %10.0f" % (name, size, seconds * 1e6, 1 / seconds)
+    if failures:
+        print
+        print "Failed to parse their page:"
+        for name, reason in failures:
+            print "%-58s %s" % (name, reason)
+    if args.all and unsupported:
+        print
+        print "Unsupported:"
+        for name, reason in unsupported:
+            print "%-58s %s" % (name, reason)
+
+    if args.fetch <= 0:
+        return
+    server = None
+    if args.http:
+        from kol.Opener import RequestsOpener
+        from kol.test.FakeKolServer import FakeKolServer
+        server = FakeKolServer(fakeKol)
+        server.start()
+        session = makeSession(fakeKol, RequestsOpener(), args.rate)
+    fakeKol.setLatency(args.latency, args.jitter)
+    fakeKol.setErrorRate(args.errorRate, args.errorKind)
+    fetchClasses = [(name, type(request)) for name, request, _size, _seconds in results]
+    stats = benchmarkFetch(session, fetchClasses, args.fetch, args.threads, args.tries)
+    if server is not None:
+        server.stop()
+
+    latencies = stats["latencies"]
+    print
+    print "%d requests (%d attempts) in %.2f s over %s: %.0f requests/s" % (stats["requests"], stats["attempts"], stats["seconds"], "HTTP" if args.http else "the FakeKolOpener", stats["requests"] / stats["seconds"])
+    print "latency p50 %.1f ms, p95 %.1f ms, max %.1f ms" % (_percentile(latencies, 0.5) * 1000, _percentile(latencies, 0.95) * 1000, max(latencies or [0]) * 1000)
+    print "failed after %d tries: %d; faults injected: %s; errors seen: %s" % (args.tries, stats["failed"], fakeKol.faults, stats["errors"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Reports the most expensive patterns in kol.data.Patterns over a corpus of recorded pages (by
+default, kol/test/fixtures). Pattern profiling is enabled (see kol.manager.PatternManager) and
+every request class parses its page, as in kol.test.ParseBenchmark, so the counts and times
+show how the patterns are actually used. Each page that a request class fetches is parsed the
+same number of times.
+
+With --raw, every pattern is instead run with finditer over every page of the corpus. This
+finds patterns that are slow on pages they are not meant for, which matters for patterns that
+are searched for in many kinds of pages. Some patterns are only meant to be matched against a
+small part of a page, and are slow in this mode without being slow in use.
+
+Usage: python -m kol.test.PatternBenchmark [--raw] [--top N] [--fixtures DIR]
+"""
+
+from kol.data import Patterns
+from kol.manager import PatternManager
+from kol.test import ParseBenchmark
+from kol.test.FakeKol import FakeKol, FakeKolOpener
+
+import argparse
+import os
+import time
+
+def profileRequests(fixtures, repeat):
+    """
+    Parses the page of every request class that fetches a non-empty page repeat times.
+    Returns PatternManager.getStatistics().
+    """
+    PatternManager.enableProfiling()
+    try:
+        fakeKol = FakeKol()
+        fakeKol.loadFixtures(fixtures)
+        session = ParseBenchmark.makeSession(fakeKol, FakeKolOpener(fakeKol), 1000.0)
+        requests = []
+        for _name, cls in ParseBenchmark.requestClasses():
+            try:
+                request = ParseBenchmark.makeRequest(cls, session)
+                request.skipParseResponse = True
+                request.doRequest()
+                request.responseData = {}
+                request.parseResponse()
+            except Exception:
+                continue
+            if request.responseText:
+                requests.append(request)
+        PatternManager.resetStatistics()
+        for request in requests:
+            for _ in range(repeat):
+                request.responseData = {}
+                request.parseResponse()
+        return PatternManager.getStatistics()
+    finally:
+        PatternManager.enableProfiling(False)
+
+def profileRaw(fixtures, repeat):
+    "Runs every pattern over every page. Returns a dict in the format of getStatistics()."
+    pages = []
+    for fileName in sorted(os.listdir(fixtures)):
+        with open(os.path.join(fixtures, fileName), "rb") as f:
+            pages.append(f.read())
+    stats = {}
+    for patternId in Patterns.patterns:
+        regex = PatternManager.getOrCompilePattern(patternId)
+        t0 = time.time()
+        for _ in range(repeat):
+            for page in pages:
+                for _match in regex.finditer(page):
+                    pass
+        stats[patternId] = {"lookups" : 1, "calls" : repeat * len(pages), "seconds" : time.time() - t0}
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the most expensive pyKol patterns over a corpus of pages.")
+    parser.add_argument("--fixtures", default=ParseBenchmark.FIXTURE_DIRECTORY, metavar="DIR")
+    parser.add_argument("--raw", action="store_true", help="run every pattern over every page")
+    parser.add_argument("--top", type=int, default=25, metavar="N", help="report the N most expensive patterns")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the corpus")
+    args = parser.parse_args()
+
+    if args.raw:
+        stats = profileRaw(args.fixtures, args.repeat)
+    else:
+        stats = profileRequests(args.fixtures, args.repeat)
+    total = sum(s["seconds"] for s in stats.values()) or 1.0
+    print "%d patterns used, %.3f s matching." % (len([s for s in stats.values() if s["calls"]]), total)
+    print
+    print "%-34s %10s %10s %10s %9s %7s" % ("pattern", "lookups", "calls", "seconds", "us/call", "share")
+    ranked = sorted(stats.items(), key=lambda item: -item[1]["seconds"])
+    for patternId, s in ranked[:args.top]:
+        perCall = s["seconds"] / s["calls"] * 1e6 if s["calls"] else 0.0
+        print "%-34s %10d %10d %10.4f %9.1f %6.1f%%" % (patternId[:34], s["lookups"], s["calls"], s["seconds"], perCall, 100 * s["seconds"] / total)
+
+if __name__ == "__main__":
+    main()
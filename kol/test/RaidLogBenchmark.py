@@ -0,0 +1,73 @@
+"""
+Measures how much of the clan raid log page cwbot's ClanRaidLogRequest downloads and parses,
+offline. A synthetic raid log (the current dungeons, followed by a long table of previous runs)
+is served by a FakeKol, and the request is made end to end, both with previousRuns=True, which
+downloads and parses the whole page, and with the default previousRuns=False, which stops
+streaming once the table of previous runs is reached. The events parsed either way are checked to
+be the same.
+
+Usage: python -m kol.test.RaidLogBenchmark [--players N] [--runs N] [--repeat N]
+"""
+
+from kol.test import ParseBenchmark
+from kol.test.FakeKol import FakeKol, FakeKolOpener
+from cwbot.kolextra.request.ClanRaidLogRequest import ClanRaidLogRequest
+
+import argparse
+import random
+import time
+
+CATEGORIES = ["Sewers", "Town Square", "The Heap", "Burnbarrel Blvd.", "Exposure Esplanade",
+              "The Purple Light District", "The Ancient Hobo Burial Ground", "Miscellaneous"]
+
+def makePage(numPlayers, numRuns, rng):
+    "Returns (page, length of the current dungeons part of the page)."
+    current = "<b>Current Clan Dungeons:</b><br>hoid:1234<br>"
+    for category in CATEGORIES:
+        lines = ["Player%d (#%d) defeated  Normal hobo (%d turns)" % (i, 1000 + i, rng.randint(1, 40))
+                 for i in range(numPlayers)]
+        current += "<b>%s:</b><blockquote>%s</blockquote>" % (category, "<br>".join(lines))
+    current += "<b>Loot Distribution:</b><blockquote>"
+    current += "".join("<br>Dist (#1) distributed <b>Hodgman's whatsit</b> to Player%d (#%d)<br>" % (i, 1000 + i)
+                       for i in range(numPlayers))
+    current += "</blockquote>"
+    rows = ['<tr><td class="small">January 1, 2013&nbsp;&nbsp;</td><td class="small">January 3, 2013&nbsp;&nbsp;</td>'
+            '<td class="small">Hobopolis&nbsp;&nbsp;</td><td class="small">12,345</td>'
+            '<td class="tiny">[<a href="clan_raidlogs.php?viewlog=%d">view logs</a>]</td></tr>' % i
+            for i in range(numRuns)]
+    previous = "<b>Previous Clan Dungeon Runs:</b><table>%s</table>" % "".join(rows)
+    return current + previous, len(current)
+
+def fetch(session, previousRuns, repeat):
+    "Makes the request repeat times. Returns (last request, seconds per request)."
+    t0 = time.time()
+    for _ in range(repeat):
+        request = ClanRaidLogRequest(session, previousRuns=previousRuns)
+        request.doRequest()
+    return request, (time.time() - t0) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and streamed downloads of the clan raid log.")
+    parser.add_argument("--players", type=int, default=60, help="events per raid log category")
+    parser.add_argument("--runs", type=int, default=600, help="rows in the table of previous runs")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    page, currentLength = makePage(args.players, args.runs, random.Random(args.seed))
+    fakeKol = FakeKol()
+    fakeKol.addFixture("clan_raidlogs.php", page)
+    session = ParseBenchmark.makeSession(fakeKol, FakeKolOpener(fakeKol), 1000000.0)
+
+    full, fullSeconds = fetch(session, True, args.repeat)
+    streamed, streamedSeconds = fetch(session, False, args.repeat)
+    for key in ["events", "lootDistributed", "hoid"]:
+        if full.responseData[key] != streamed.responseData[key]:
+            raise AssertionError("The streamed request parsed a different '%s'." % key)
+
+    print "page: %d bytes, current dungeons %d bytes; %d events, %d previous runs" % (len(page), currentLength, len(full.responseData["events"]), len(full.responseData["previousRuns"]))
+    print "previousRuns=True:  %7.2f ms, %d bytes received" % (fullSeconds * 1000, full.bytesReceived)
+    print "previousRuns=False: %7.2f ms, %d bytes received, %d bytes saved" % (streamedSeconds * 1000, streamed.bytesReceived, streamed.bytesSaved)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures the logging overhead of a request, offline. A request whose page is a large response
+body is made repeatedly through an opener that returns the page at once, with request logging
+configured in several ways: disabled (the default in cwbot), enabled at the DEBUG level with full
+response bodies, and enabled with the body length limit and sample rate of
+GenericRequest.setResponseLogging(). Enabled logs are written to a temporary directory.
+
+Usage: python -m kol.test.ReportBenchmark [--size N] [--number N]
+"""
+
+from kol.Opener import Response
+from kol.request import GenericRequest
+from kol.util import Report
+
+import argparse
+import shutil
+import tempfile
+import timeit
+
+class _Opener(object):
+    def __init__(self, text):
+        self.text = text
+
+    def open(self, url, requestData):
+        return Response(self.text, url)
+
+class _Session(object):
+    isConnected = True
+
+    def __init__(self, opener):
+        self.opener = opener
+
+class _Request(GenericRequest.GenericRequest):
+    def __init__(self, session):
+        super(_Request, self).__init__(session)
+        self.url = "http://127.0.0.1/api.php"
+
+    def parseResponse(self):
+        self.responseData = dict(("k%d" % i, range(20)) for i in range(300))
+
+def timeRequests(session, number):
+    "Returns the mean time of a request, in microseconds."
+    return timeit.timeit(lambda: _Request(session).doRequest(), number=number) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the logging overhead of pyKol requests.")
+    parser.add_argument("--size", type=int, default=200000, help="response body length")
+    parser.add_argument("--number", type=int, default=2000, help="requests per configuration")
+    args = parser.parse_args()
+
+    session = _Session(_Opener(u"<html>" + u"x" * args.size))
+    directory = tempfile.mkdtemp()
+    try:
+        Report.setOutputSections([])
+        print "%-38s %8.1f us per request" % ("logging disabled:", timeRequests(session, args.number))
+        Report.registerLog(directory, "request", ["request"], Report.DEBUG)
+        configurations = [("full bodies", None, 1.0),
+                          ("bodies cut at 4096 chars", 4096, 1.0),
+                          ("full bodies, 10% sampled", None, 0.1)]
+        for name, maxLength, sampleRate in configurations:
+            GenericRequest.setResponseLogging(maxLength, sampleRate)
+            print "%-38s %8.1f us per request" % ("DEBUG log, %s:" % name, timeRequests(session, args.number))
+    finally:
+        GenericRequest.setResponseLogging()
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@ import TestItemDatabase
 import TestBountyHunter
 import TestLogin
 import TestLogout
+import TestRequestsOpener
+import TestRequestScheduler
+import TestRequestCoalescer
+import TestFilterManager
+import TestRequestEngine
+import TestPatternManager
 from kol.util import Report
 
 import sys
@@ -21,6 +27,15 @@ def main(argv=sys.argv):
     suite.addTest(TestGetItemDescriptionRequest.Main())
     suite.addTest(TestBountyHunter.Main())
     suite.addTest(TestLogout.Main())
+
+    # Add the tests that do not need to log in.
+    loader = unittest.TestLoader()
+    suite.addTest(loader.loadTestsFromModule(TestRequestsOpener))
+    suite.addTest(loader.loadTestsFromModule(TestRequestScheduler))
+    suite.addTest(loader.loadTestsFromModule(TestRequestCoalescer))
+    suite.addTest(loader.loadTestsFromModule(TestFilterManager))
+    suite.addTest(loader.loadTestsFromModule(TestRequestEngine))
+    suite.addTest(loader.loadTestsFromModule(TestPatternManager))
     
     # Run the test suite.
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,100 @@
+from kol.manager import FilterManager
+
+import itertools
+import unittest
+
+_eventIds = itertools.count()
+
+class _Filter(object):
+    "Records the events it runs for in a shared list and returns a fixed code."
+
+    def __init__(self, name, calls, returnCode=FilterManager.CONTINUE):
+        self.__name__ = name
+        self.calls = calls
+        self.returnCode = returnCode
+
+    def doFilter(self, eventName, context, **kwargs):
+        self.calls.append((self.__name__, eventName))
+        context.setdefault("seen", []).append(self.__name__)
+        return self.returnCode
+
+class Main(unittest.TestCase):
+    "Tests the FilterManager. No login is needed."
+
+    def setUp(self):
+        # filters cannot be unregistered, so each test uses its own event names
+        self.event = "testEvent%d" % next(_eventIds)
+        self.calls = []
+
+    def register(self, name, eventName, loadOrder=10, returnCode=FilterManager.CONTINUE):
+        f = _Filter(name, self.calls, returnCode)
+        FilterManager.registerFilterForEvent(f, eventName, loadOrder)
+        return f
+
+    def names(self):
+        return [c[0] for c in self.calls]
+
+    def testLoadOrder(self):
+        self.register("b", self.event, 5)
+        self.register("c", self.event, 10)
+        self.register("a", self.event, 1)
+        self.register("d", self.event, 5)
+        FilterManager.executeFiltersForEvent(self.event)
+        self.assertEqual(self.names(), ["a", "b", "d", "c"])
+
+    def testContextAndReturnCode(self):
+        self.register("a", self.event)
+        self.register("b", self.event)
+        context = {}
+        self.assertEqual(FilterManager.executeFiltersForEvent(self.event, context), FilterManager.CONTINUE)
+        self.assertEqual(context["seen"], ["a", "b"])
+
+    def testBotSpecificChain(self):
+        self.register("all", self.event)
+        self.register("bot", self.event + ":myBot")
+        self.register("other", self.event + ":otherBot")
+        self.register("sub", self.event + ":myBot:sub")
+        FilterManager.executeFiltersForEvent(self.event + ":myBot:sub")
+        # the most specific filters run first, and every filter sees the real event name
+        self.assertEqual(self.calls, [("sub", self.event), ("bot", self.event), ("all", self.event)])
+        realEventName, filters = FilterManager.getFilterChain(self.event + ":myBot")
+        self.assertEqual(realEventName, self.event)
+        self.assertEqual([f.__name__ for f in filters], ["bot", "all"])
+
+    def testChainIsCachedUntilRegistration(self):
+        self.register("a", self.event)
+        chain = FilterManager.getFilterChain(self.event)
+        self.assertIs(FilterManager.getFilterChain(self.event), chain)
+        # registering a filter for any event clears the cache
+        self.register("b", self.event + ":myBot")
+        self.assertIsNot(FilterManager.getFilterChain(self.event), chain)
+        FilterManager.executeFiltersForEvent(self.event + ":myBot")
+        self.assertEqual(self.names(), ["b", "a"])
+
+    def testAbortAndFinished(self):
+        self.register("a", self.event, 1)
+        self.register("abort", self.event, 2, FilterManager.ABORT)
+        self.register("c", self.event, 3)
+        self.assertEqual(FilterManager.executeFiltersForEvent(self.event), FilterManager.ABORT)
+        self.assertEqual(self.names(), ["a", "abort"])
+
+        event = self.event + "Finished"
+        self.register("finished", event, 1, FilterManager.FINISHED)
+        self.register("d", event, 2)
+        self.assertEqual(FilterManager.executeFiltersForEvent(event), FilterManager.FINISHED)
+        self.assertEqual(self.names(), ["a", "abort", "finished"])
+
+    def testNoFilters(self):
+        self.assertEqual(FilterManager.getFilterChain(self.event + ":myBot"), (self.event, ()))
+        self.assertEqual(FilterManager.executeFiltersForEvent(self.event), FilterManager.CONTINUE)
+
+    def testStats(self):
+        name = "stats%s" % self.event
+        self.register(name, self.event)
+        for _ in range(3):
+            FilterManager.executeFiltersForEvent(self.event)
+        stats = FilterManager.getFilterStats()[name]
+        self.assertEqual(stats["calls"], 3)
+        self.assertTrue(stats["seconds"] >= 0)
+        FilterManager.resetFilterStats()
+        self.assertNotIn(name, FilterManager.getFilterStats())
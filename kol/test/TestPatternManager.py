@@ -0,0 +1,107 @@
+from kol.data import Patterns
+from kol.manager import PatternManager
+
+import threading
+import time
+import unittest
+
+class Main(unittest.TestCase):
+    "Tests the PatternManager's compiled pattern cache and profiling. No login is needed."
+
+    patternId = "testPatternManagerNumber"
+
+    def setUp(self):
+        Patterns.patterns[self.patternId] = r'([0-9]+)'
+
+    def tearDown(self):
+        PatternManager.enableProfiling(False)
+        del Patterns.patterns[self.patternId]
+        getattr(PatternManager, "__compiledPatterns").pop(self.patternId, None)
+        getattr(PatternManager, "__profiledPatterns").pop(self.patternId, None)
+
+    def testConcurrentLookups(self):
+        originalCompile = PatternManager._compile
+        compiled = []
+
+        def slowCompile(patternId):
+            compiled.append(patternId)
+            time.sleep(0.05)
+            return originalCompile(patternId)
+
+        start = threading.Event()
+        results = []
+
+        def lookup():
+            start.wait(5)
+            results.append(PatternManager.getOrCompilePattern(self.patternId))
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        PatternManager._compile = slowCompile
+        try:
+            for t in threads:
+                t.start()
+            start.set()
+            for t in threads:
+                t.join(5)
+        finally:
+            PatternManager._compile = originalCompile
+        self.assertEqual(compiled, [self.patternId])
+        self.assertEqual(len(results), 8)
+        for pattern in results:
+            self.assertIs(pattern, results[0])
+
+    def testConcurrentProfiledLookups(self):
+        PatternManager.enableProfiling()
+        start = threading.Event()
+        results = []
+
+        def lookup():
+            start.wait(5)
+            results.append(PatternManager.getOrCompilePattern(self.patternId))
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(results), 8)
+        for pattern in results:
+            self.assertIs(pattern, results[0])
+        self.assertEqual(PatternManager.getStatistics()[self.patternId]["lookups"], 8)
+
+    def testPrecompileAll(self):
+        self.assertEqual(PatternManager.precompileAll(), len(Patterns.patterns))
+        compiledPatterns = getattr(PatternManager, "__compiledPatterns")
+        self.assertTrue(set(Patterns.patterns) <= set(compiledPatterns))
+        self.assertIs(PatternManager.getOrCompilePattern(self.patternId), compiledPatterns[self.patternId])
+        self.assertRaises(KeyError, PatternManager.getOrCompilePattern, "testPatternManagerMissing")
+
+    def testProfiling(self):
+        PatternManager.enableProfiling()
+        pattern = PatternManager.getOrCompilePattern(self.patternId)
+        self.assertIs(PatternManager.getOrCompilePattern(self.patternId), pattern)
+        self.assertEqual(pattern.pattern, r'([0-9]+)')
+        self.assertEqual(pattern.search("a 12 b").group(1), "12")
+        self.assertEqual(pattern.findall("1 2 3"), ["1", "2", "3"])
+        stats = PatternManager.getStatistics()[self.patternId]
+        self.assertEqual((stats["lookups"], stats["calls"]), (2, 2))
+
+        # finditer is counted once, when the caller has finished iterating
+        matches = pattern.finditer("1 2 3")
+        self.assertEqual(matches.next().group(1), "1")
+        self.assertEqual(PatternManager.getStatistics()[self.patternId]["calls"], 2)
+        self.assertEqual([m.group(1) for m in matches], ["2", "3"])
+        self.assertEqual(PatternManager.getStatistics()[self.patternId]["calls"], 3)
+
+        # patterns looked up while profiling is off are not counted
+        PatternManager.enableProfiling(False)
+        PatternManager.getOrCompilePattern(self.patternId).search("4")
+        self.assertEqual(PatternManager.getStatistics()[self.patternId]["lookups"], 2)
+
+    def testResetStatistics(self):
+        PatternManager.enableProfiling()
+        PatternManager.getOrCompilePattern(self.patternId).match("1")
+        PatternManager.resetStatistics()
+        stats = PatternManager.getStatistics()[self.patternId]
+        self.assertEqual(stats, {"lookups" : 0, "calls" : 0, "seconds" : 0.0})
@@ -0,0 +1,154 @@
+from kol.RequestCoalescer import RequestCoalescer
+
+import threading
+import time
+import unittest
+
+class InventoryRequest(object):
+    "Stands in for the real InventoryRequest; the coalescer matches requests by class name."
+
+    url = "http://127.0.0.1/api.php"
+
+    def __init__(self, server, quantitiesOnly=False):
+        self.server = server
+        self.requestData = {"what" : "inventory"}
+        self.quantitiesOnly = quantitiesOnly
+        self.ignoreItemDatabase = False
+
+    def doRequest(self):
+        self.server.requests += 1
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.responseText = "inventory %d" % self.server.requests
+        self.responseData = {"items" : dict(self.server.items)}
+        return self.responseData
+
+class GetMessagesRequest(object):
+    url = "http://127.0.0.1/messages.php"
+
+    def __init__(self, server):
+        self.server = server
+
+    def doRequest(self):
+        self.server.items[2] = 1
+        return {"kmails" : []}
+
+class SendChatRequest(GetMessagesRequest):
+    def doRequest(self):
+        return {}
+
+class _Server(object):
+    def __init__(self):
+        self.requests = 0
+        self.delay = 0
+        self.items = {1 : 5}
+
+class Main(unittest.TestCase):
+    "Tests the RequestCoalescer offline. No login is needed."
+
+    def setUp(self):
+        self.server = _Server()
+        self.coalescer = RequestCoalescer()
+
+    def _run(self, request):
+        return self.coalescer.run(request, request.doRequest)
+
+    def testCachedResultIsCopied(self):
+        first = self._run(InventoryRequest(self.server))
+        first["items"][1] = 100
+        request = InventoryRequest(self.server)
+        second = self._run(request)
+        self.assertEqual(second, {"items" : {1 : 5}})
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(self.coalescer.stats["cached"], 1)
+        # the request that was not performed still has its response
+        self.assertIs(request.responseData, second)
+        self.assertEqual(request.responseText, "inventory 1")
+
+    def testKeyAttributes(self):
+        self._run(InventoryRequest(self.server))
+        self._run(InventoryRequest(self.server, quantitiesOnly=True))
+        self.assertEqual(self.server.requests, 2)
+
+    def testConcurrentRequestsShareOneFlight(self):
+        self.server.delay = 0.1
+        requests = [InventoryRequest(self.server) for _ in range(5)]
+        results = []
+        threads = [threading.Thread(target=lambda r=r: results.append(self._run(r))) for r in requests]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(self.coalescer.stats["shared"], 4)
+        for r in requests:
+            self.assertEqual(r.responseText, "inventory 1")
+            self.assertEqual(r.responseData, {"items" : {1 : 5}})
+
+    def testNonMutatingRequestKeepsCache(self):
+        self._run(InventoryRequest(self.server))
+        self._run(SendChatRequest(self.server))
+        self._run(InventoryRequest(self.server))
+        self.assertEqual(self.server.requests, 1)
+
+    def testGetMessagesInvalidates(self):
+        self._run(InventoryRequest(self.server))
+        self._run(GetMessagesRequest(self.server))
+        result = self._run(InventoryRequest(self.server))
+        self.assertEqual(result, {"items" : {1 : 5, 2 : 1}})
+        self.assertEqual(self.server.requests, 2)
+
+    def testMutationDuringFlightIsNotCached(self):
+        self.server.delay = 0.1
+        t = threading.Thread(target=self._run, args=(InventoryRequest(self.server),))
+        t.start()
+        time.sleep(0.02)
+        self._run(GetMessagesRequest(self.server))
+        t.join(5)
+        self.server.delay = 0
+        result = self._run(InventoryRequest(self.server))
+        self.assertEqual(result["items"][2], 1)
+        self.assertEqual(self.server.requests, 2)
+
+    def testForceRefresh(self):
+        self._run(InventoryRequest(self.server))
+        self.server.items[1] = 7
+        request = InventoryRequest(self.server)
+        request.forceRefresh = True
+        self.assertEqual(self._run(request), {"items" : {1 : 7}})
+        # the refreshed result replaces the cached one
+        self.assertEqual(self._run(InventoryRequest(self.server)), {"items" : {1 : 7}})
+        self.assertEqual(self.server.requests, 2)
+
+    def testErrorIsShared(self):
+        class Failing(InventoryRequest):
+            def doRequest(self):
+                time.sleep(0.1)
+                raise IOError("failed")
+        Failing.__name__ = "InventoryRequest"
+        errors = []
+        def run(r):
+            try:
+                self._run(r)
+            except IOError as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run, args=(Failing(self.server),)) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(len(errors), 3)
+        # failures are not cached
+        self.assertEqual(self._run(InventoryRequest(self.server)), {"items" : {1 : 5}})
+
+    def testRaidLogIsNotCopied(self):
+        class ClanRaidLogRequest(InventoryRequest):
+            previousRuns = False
+        first = self._run(ClanRaidLogRequest(self.server))
+        second = self._run(ClanRaidLogRequest(self.server))
+        self.assertIs(first, second)
+        request = ClanRaidLogRequest(self.server)
+        request.forceRefresh = True
+        self.assertIsNot(self._run(request), first)
+        self.assertEqual(self.server.requests, 2)
@@ -0,0 +1,187 @@
+from kol.RequestEngine import AsyncQueue, Future, RequestEngine, Return, StoppedError, TimeoutError
+
+import Queue
+import sys
+import threading
+import time
+import unittest
+
+def _error(message):
+    try:
+        raise ValueError(message)
+    except ValueError:
+        return sys.exc_info()
+
+class TestFuture(unittest.TestCase):
+    "Tests Future. No login is needed."
+
+    def testResult(self):
+        future = Future()
+        calls = []
+        future.addDoneCallback(calls.append)
+        self.assertFalse(future.done())
+        future.setResult(1)
+        # a Future is finished once
+        future.setResult(2)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 1)
+        self.assertIsNone(future.exception())
+        self.assertEqual(calls, [future])
+        # callbacks added after the Future finishes are called at once
+        future.addDoneCallback(calls.append)
+        self.assertEqual(calls, [future, future])
+
+    def testException(self):
+        future = Future()
+        future.setException(_error("failed"))
+        self.assertIsInstance(future.exception(), ValueError)
+        self.assertRaises(ValueError, future.result)
+
+    def testTimeout(self):
+        future = Future()
+        self.assertRaises(TimeoutError, future.result, 0.01)
+
+    def testResultFromAnotherThread(self):
+        future = Future()
+        threading.Timer(0.01, future.setResult, ("done",)).start()
+        self.assertEqual(future.result(5), "done")
+
+class Main(unittest.TestCase):
+    "Tests the RequestEngine and AsyncQueue. No login is needed."
+
+    def setUp(self):
+        self.engine = RequestEngine(ioThreads=2)
+        self.engine.start()
+
+    def tearDown(self):
+        self.engine.stop(5)
+
+    def testSpawnAndRun(self):
+        engine = self.engine
+        threads = []
+
+        def child(value):
+            threads.append(threading.current_thread())
+            yield engine.sleep(0.01)
+            raise Return(value * 2)
+
+        def parent():
+            first = yield engine.spawn(child(1))
+            second = yield engine.callInPool(lambda: 10)
+            raise Return(first + second)
+
+        self.assertEqual(engine.run(parent(), 5), 12)
+        self.assertEqual(threads, [engine._loopThread])
+        self.assertEqual(engine.spawn(child(3)).result(5), 6)
+        self.assertRaises(TypeError, engine.spawn, lambda: None)
+
+    def testExceptions(self):
+        engine = self.engine
+
+        def failing():
+            yield engine.callInPool(lambda: 1 // 0)
+
+        def catching():
+            try:
+                yield engine.spawn(failing())
+            except ZeroDivisionError:
+                raise Return("caught")
+
+        self.assertEqual(engine.run(catching(), 5), "caught")
+        self.assertRaises(ZeroDivisionError, engine.run, failing(), 5)
+
+        def yieldsValue():
+            yield 1
+
+        self.assertRaises(TypeError, engine.run, yieldsValue(), 5)
+
+    def testRunFromLoopThread(self):
+        engine = self.engine
+
+        def nested():
+            engine.run(engine.sleep(0))
+            yield engine.sleep(0)
+
+        self.assertRaises(RuntimeError, engine.run, nested(), 5)
+
+    def testCallInPoolPriority(self):
+        engine = self.engine
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        # occupy both I/O threads, so that the calls below wait in the queue
+        blocked = [engine.callInPool(block) for _ in range(2)]
+        started.wait(5)
+        time.sleep(0.05)
+        futures = [engine.callInPool(order.append, (p,), p) for p in [3, 1, 2]]
+        release.set()
+        for f in blocked + futures:
+            f.result(5)
+        self.assertEqual(order, [1, 2, 3])
+
+    def testQueue(self):
+        engine = self.engine
+        queue = AsyncQueue(engine)
+        queue.put("first")
+        self.assertEqual(queue.qsize(), 1)
+
+        def consume():
+            first = yield queue.get()
+            second = yield queue.get()
+            raise Return((first, second))
+
+        future = engine.spawn(consume())
+        time.sleep(0.05)
+        self.assertFalse(future.done())
+        queue.put("second")
+        self.assertEqual(future.result(5), ("first", "second"))
+        self.assertTrue(queue.empty())
+
+    def testQueueTimeout(self):
+        engine = self.engine
+        queue = AsyncQueue(engine)
+
+        def consume():
+            try:
+                yield queue.get(timeout=0.05)
+            except Queue.Empty:
+                raise Return("empty")
+
+        t0 = time.time()
+        self.assertEqual(engine.run(consume(), 5), "empty")
+        self.assertTrue(time.time() - t0 >= 0.04)
+        # an item put after the timeout is kept for the next get()
+        queue.put("late")
+        self.assertEqual(queue.qsize(), 1)
+        self.assertEqual(queue.get(timeout=0.05).result(5), "late")
+
+    def testStopFailsPendingWork(self):
+        engine = self.engine
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+            return "finished"
+
+        def waiting():
+            yield engine.sleep(60)
+
+        blocked = [engine.callInPool(block) for _ in range(2)]
+        started.wait(5)
+        queued = engine.callInPool(lambda: "queued")
+        coroutine = engine.spawn(waiting())
+        threading.Timer(0.05, release.set).start()
+        engine.stop(5)
+        # calls that had started finish; the others are abandoned
+        self.assertEqual([f.result(5) for f in blocked], ["finished", "finished"])
+        self.assertRaises(StoppedError, queued.result, 5)
+        self.assertRaises(StoppedError, coroutine.result, 5)
+        self.assertRaises(StoppedError, engine.callInPool(lambda: 1).result, 5)
+        self.assertRaises(StoppedError, engine.spawn(waiting()).result, 5)
@@ -0,0 +1,151 @@
+from kol import RequestScheduler as rs
+
+import threading
+import time
+import unittest
+
+class _Request(object):
+    "A request that records how many requests are running at once."
+
+    lock = None
+
+    def __init__(self, counter, seconds=0, nested=None, scheduler=None):
+        self.counter = counter
+        self.seconds = seconds
+        self.nested = nested
+        self.scheduler = scheduler
+
+    def doRequest(self):
+        with self.counter:
+            if self.lock is not None:
+                with self.lock:
+                    return self._request()
+            return self._request()
+
+    def _request(self):
+        if self.seconds:
+            time.sleep(self.seconds)
+        if self.nested is not None:
+            return self.scheduler.run(self.nested, rs.BACKGROUND)
+        return "done"
+
+class _Counter(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = 0
+        self.maxRunning = 0
+        self.count = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.running += 1
+            self.count += 1
+            self.maxRunning = max(self.maxRunning, self.running)
+
+    def __exit__(self, *args):
+        with self._lock:
+            self.running -= 1
+
+def _runAll(scheduler, requests, priority):
+    threads = [threading.Thread(target=scheduler.run, args=(r, priority)) for r in requests]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+class Main(unittest.TestCase):
+    "Tests the RequestScheduler offline. No login is needed."
+
+    def testTokenBucket(self):
+        scheduler = rs.RequestScheduler(rate=20, burst=2)
+        counter = _Counter()
+        t0 = time.time()
+        for _ in range(2):
+            scheduler.run(_Request(counter))
+        self.assertTrue(time.time() - t0 < 0.05)
+        for _ in range(4):
+            scheduler.run(_Request(counter))
+        # four more tokens at 20 per second
+        self.assertTrue(time.time() - t0 >= 0.19)
+        self.assertEqual(counter.count, 6)
+        self.assertEqual(scheduler.snapshot()["kmail"]["requests"], 6)
+
+    def testConcurrencyCaps(self):
+        scheduler = rs.RequestScheduler(rate=1000, burst=1000, concurrency={rs.BACKGROUND : 1, rs.KMAIL : 3})
+        background = _Counter()
+        kmail = _Counter()
+        _runAll(scheduler, [_Request(background, 0.02) for _ in range(5)], rs.BACKGROUND)
+        _runAll(scheduler, [_Request(kmail, 0.05) for _ in range(9)], rs.KMAIL)
+        self.assertEqual(background.maxRunning, 1)
+        self.assertEqual(kmail.maxRunning, 3)
+        snapshot = scheduler.snapshot()
+        self.assertEqual(snapshot["background"]["requests"], 5)
+        self.assertEqual(snapshot["background"]["active"], 0)
+        self.assertTrue(snapshot["background"]["maxQueueSeconds"] > 0)
+
+    def testMaxWait(self):
+        scheduler = rs.RequestScheduler(rate=1000, burst=1000, concurrency={rs.BACKGROUND : 0}, maxWait=0.1)
+        counter = _Counter()
+        self.assertEqual(scheduler.run(_Request(counter), rs.BACKGROUND), "done")
+        self.assertEqual(scheduler.snapshot()["background"]["overdue"], 1)
+
+    def testNestedRequestIsNotScheduled(self):
+        scheduler = rs.RequestScheduler(rate=1000, burst=1000, concurrency={rs.BACKGROUND : 1}, maxWait=5)
+        counter = _Counter()
+        inner = _Request(counter)
+        outer = _Request(counter, nested=inner, scheduler=scheduler)
+        t0 = time.time()
+        self.assertEqual(scheduler.run(outer, rs.BACKGROUND), "done")
+        self.assertTrue(time.time() - t0 < 1)
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(scheduler.snapshot()["background"]["requests"], 1)
+
+    def testLockIsTakenBeforeSlot(self):
+        # a thread holding the lock waits for the only slot, while another
+        # request needs the lock; the lock must not be waited for with the slot held
+        scheduler = rs.RequestScheduler(rate=1000, burst=1000, concurrency={rs.KMAIL : 1}, maxWait=5)
+        lock = threading.RLock()
+        counter = _Counter()
+        locked = _Request(counter)
+        locked.lock = lock
+        plain = _Request(counter)
+        holding = threading.Event()
+        def holdLock():
+            with lock:
+                holding.set()
+                time.sleep(0.1)
+                scheduler.run(plain, rs.KMAIL)
+        t0 = time.time()
+        t = threading.Thread(target=holdLock)
+        t.start()
+        holding.wait()
+        scheduler.run(locked, rs.KMAIL)
+        t.join(10)
+        self.assertTrue(time.time() - t0 < 1)
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(scheduler.snapshot()["kmail"]["overdue"], 0)
+
+    def testClassesHaveSeparateSlots(self):
+        scheduler = rs.RequestScheduler(rate=1000, burst=1000, concurrency={rs.KMAIL : 1, rs.CHAT : 1})
+        order = []
+        release = threading.Event()
+        class Blocking(object):
+            def doRequest(self):
+                release.wait(5)
+        class Recording(object):
+            def __init__(self, name):
+                self.name = name
+            def doRequest(self):
+                order.append(self.name)
+        # while a kmail request waits for the only kmail slot, chat is not held up
+        blocker = threading.Thread(target=scheduler.run, args=(Blocking(), rs.KMAIL))
+        blocker.start()
+        time.sleep(0.05)
+        waiting = threading.Thread(target=scheduler.run, args=(Recording("kmail"), rs.KMAIL))
+        waiting.start()
+        time.sleep(0.05)
+        scheduler.run(Recording("chat"), rs.CHAT)
+        release.set()
+        blocker.join(5)
+        waiting.join(5)
+        self.assertEqual(order, ["chat", "kmail"])
@@ -0,0 +1,81 @@
+from kol.Opener import RequestsOpener, RequestStats
+from kol.test.FakeKolServer import FakeKolServer
+
+import threading
+import unittest
+
+class Main(unittest.TestCase):
+    "Tests the RequestsOpener against a FakeKolServer. No login is needed."
+
+    def setUp(self):
+        self.server = FakeKolServer()
+        self.server.fakeKol.addFixture("page.php", "x" * 1000)
+        self.connections = 0
+        accept = self.server.server.get_request
+        def countingAccept():
+            self.connections += 1
+            return accept()
+        self.server.server.get_request = countingAccept
+        self.server.start()
+        self.url = self.server.fakeKol.serverURL + "page.php"
+
+    def tearDown(self):
+        self.server.stop()
+
+    def testStats(self):
+        opener = RequestsOpener(compress=False)
+        opener.open(self.url, {"a" : 1})
+        opener.get(self.url, {"b" : 2})
+        opener.get(self.server.fakeKol.serverURL + "missing.php", {})
+        stats = opener.stats.snapshot()
+        self.assertEqual(sorted(stats.keys()), ["missing.php", "page.php"])
+        self.assertEqual(stats["page.php"]["requests"], 2)
+        self.assertEqual(stats["page.php"]["bytes"], 2000)
+        self.assertTrue(stats["page.php"]["maxSeconds"] <= stats["page.php"]["seconds"])
+        stats["page.php"]["requests"] = 100
+        self.assertEqual(opener.stats.snapshot()["page.php"]["requests"], 2)
+        opener.stats.reset()
+        self.assertEqual(opener.stats.snapshot(), {})
+
+    def testStreamIsRecorded(self):
+        opener = RequestsOpener()
+        response = opener.stream(self.url, {})
+        try:
+            numBytes = sum(len(chunk) for chunk in response.iter_content(100))
+        finally:
+            response.close()
+        opener.record(self.url, 0.5, numBytes)
+        self.assertEqual(opener.stats.snapshot()["page.php"], {"requests" : 1, "seconds" : 0.5, "maxSeconds" : 0.5, "bytes" : 1000})
+
+    def testConnectionsAreReused(self):
+        opener = RequestsOpener()
+        for _ in range(10):
+            self.assertEqual(opener.open(self.url, {}).text, "x" * 1000)
+        self.assertEqual(self.connections, 1)
+
+    def testPoolSize(self):
+        opener = RequestsOpener(poolMaxSize=3)
+        pool = opener.opener.get_adapter(self.url).poolmanager.connection_from_url(self.url)
+        self.assertEqual(pool.pool.maxsize, 3)
+        self.assertFalse(pool.block)
+
+        # concurrent requests open more connections, which are then kept for reuse
+        threads = [threading.Thread(target=opener.open, args=(self.url, {})) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        connections = self.connections
+        for _ in range(5):
+            opener.open(self.url, {})
+        self.assertEqual(self.connections, connections)
+        self.assertEqual(opener.stats.snapshot()["page.php"]["requests"], 8)
+
+class TestRequestStats(unittest.TestCase):
+    def testRecordByEndpoint(self):
+        stats = RequestStats()
+        stats.record("http://127.0.0.1/a.php?x=1", 1.0, 10)
+        stats.record("http://127.0.0.1/a.php", 3.0, 20)
+        stats.record("http://127.0.0.1/b.php", 2.0, 5)
+        self.assertEqual(stats.snapshot(), {"a.php" : {"requests" : 2, "seconds" : 4.0, "maxSeconds" : 3.0, "bytes" : 30},
+                                            "b.php" : {"requests" : 1, "seconds" : 2.0, "maxSeconds" : 2.0, "bytes" : 5}})
@@ -17,20 +17,50 @@ __logs = []
 __logCurrentDate = None
 __includeThreadName = False
 
+# Cache of the highest level that is printed or logged for each section. It
+# is cleared whenever the output sections, output level or logs change.
+__sectionLevels = {}
+
+def _resetSectionLevels():
+    global __sectionLevels
+    __sectionLevels = {}
+
+def _sectionLevel(section):
+    level = __sectionLevels.get(section)
+    if level is None:
+        level = 0
+        if "*" in __outputSections or section in __outputSections:
+            level = __outputLevel
+        for log in __logs:
+            s = log["sections"]
+            if "*" in s or section in s:
+                level = max(level, log["level"])
+        __sectionLevels[section] = level
+    return level
+
+def isEnabled(section, level):
+    """Returns True if a message with this section and level would be
+    printed or logged. Use this to skip building expensive messages."""
+    return level <= _sectionLevel(section)
+
 def addOutputSection(sectionName):
     __outputSections.append(sectionName)
+    _resetSectionLevels()
 
 def removeOutputSection(sectionName):
     if sectionName in __outputSections:
         __outputSections.remove(sectionName)
+    _resetSectionLevels()
 
 def setOutputSections(arr):
     global __outputSections
-    __outputSections = arr
+    __outputSections = list(arr)
+    _resetSectionLevels()
 
 def setOutputLevel(level):
     global __outputLevel
     __outputLevel = level
+    _resetSectionLevels()
 
 def setIncludeThreadName(includeThreadName):
     global __includeThreadName
@@ -46,10 +76,24 @@ def registerLog(directory, fileName, sections=["*"], level=INFO):
             os.mkdir(directory)
 
     __logs.append(log)
+    _resetSectionLevels()
 
-def report(section, level, message, exception=None):
+def report(section, level, message, exception=None, args=None):
+    """Print and/or log a message. Formatting is deferred until the
+    message is known to be needed: if args is given, the message is
+    formatted as message % args, and if message is callable, it is called
+    to get the message text."""
     global __logCurrentDate
 
+    # Fast path: nothing to do for this section and level.
+    if level > _sectionLevel(section):
+        return
+
+    if callable(message):
+        message = message()
+    if args is not None:
+        message = message % args
+
     # Do we need to roll the logs over?
     currentDate = time.strftime("%Y-%m-%d")
     if currentDate != __logCurrentDate:
@@ -104,23 +148,23 @@ def report(section, level, message, exception=None):
                     log["file"].write(traceback.format_exc())
                 log["file"].flush()
 
-def fatal(section, message, exception=None):
-    report(section, FATAL, message, exception)
+def fatal(section, message, exception=None, args=None):
+    report(section, FATAL, message, exception, args)
 
-def alert(section, message, exception=None):
-    report(section, ALERT, message, exception)
+def alert(section, message, exception=None, args=None):
+    report(section, ALERT, message, exception, args)
 
-def error(section, message, exception=None):
-    report(section, ERROR, message, exception)
+def error(section, message, exception=None, args=None):
+    report(section, ERROR, message, exception, args)
 
-def warning(section, message, exception=None):
-    report(section, WARNING, message, exception)
+def warning(section, message, exception=None, args=None):
+    report(section, WARNING, message, exception, args)
 
-def info(section, message, exception=None):
-    report(section, INFO, message, exception)
+def info(section, message, exception=None, args=None):
+    report(section, INFO, message, exception, args)
 
-def trace(section, message, exception=None):
-    report(section, TRACE, message, exception)
+def trace(section, message, exception=None, args=None):
+    report(section, TRACE, message, exception, args)
 
-def debug(section, message, exception=None):
-    report(section, DEBUG, message, exception)
+def debug(section, message, exception=None, args=None):
+    report(section, DEBUG, message, exception, args)